@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for the downloader engine and the Tk app.
+
+Everything runs against a local stand-in for YouTube (fake_youtube), so results do not
+depend on the network and can be compared between runs:
+
+    python -m benchmarks --json before.json
+    python -m benchmarks --json after.json --compare before.json
+"""
@@ -0,0 +1,66 @@
+"""
+Command line entry point: python -m benchmarks [options]. Run from the repository root.
+"""
+import argparse
+import json
+import sys
+
+from youtube_downloader.policy import parse_size
+from youtube_downloader.throttle import parse_rate
+
+from .suite import SCENARIOS, compare, run
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark metadata lookups, downloads and the GUI against a local fake YouTube.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated scenarios to run (default: {','.join(SCENARIOS)})")
+    parser.add_argument("--videos", type=int, default=200, help="playlist length (default: 200)")
+    parser.add_argument("--page-size", type=int, default=100, help="playlist videos per page (default: 100)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds before each watch page/player/playlist response (default: 0.05)")
+    parser.add_argument("--media-size", type=parse_size, default="8M", help="720p stream size (default: 8M)")
+    parser.add_argument("--media-latency", type=float, default=0.02,
+                        help="seconds before the first media byte of each request (default: 0.02)")
+    parser.add_argument("--media-rate", type=parse_rate, default=None,
+                        help="per-connection media bandwidth such as 5M (default: unlimited)")
+    parser.add_argument("--downloads", type=int, default=8, help="videos in the playlist download scenario (default: 8)")
+    parser.add_argument("--single-size", type=parse_size, default="64M",
+                        help="stream size in the single download scenario (default: 64M, i.e. segmented)")
+    parser.add_argument("--jobs", type=int, default=4, help="concurrent playlist downloads (default: 4)")
+    parser.add_argument("--segments", type=int, default=4, help="connections per large download (default: 4)")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="concurrent metadata lookups (default: 8)")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON to PATH ('-' for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print the change of every metric against an earlier --json report")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    config = parser.parse_args(argv)
+    scenarios = [name.strip() for name in config.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    output, baseline = config.json, config.compare
+    del config.json, config.compare # Only the workload settings go into the report
+
+    report = run(config, scenarios, log=lambda message: print(message, file=sys.stderr))
+    text = json.dumps(report, indent=2)
+    if output == "-":
+        print(text)
+    elif output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text, file=sys.stderr)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            lines = compare(json.load(f), report)
+        print("\n".join(lines), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
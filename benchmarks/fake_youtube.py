@@ -0,0 +1,273 @@
+"""
+Local stand-in for YouTube used by the benchmarks: an HTTP server with synthetic watch
+pages, player responses, paginated playlists and range-capable media, plus drop-in
+replacements for pytubefix's YouTube/Playlist that read from it.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import youtube_downloader.core as core
+from youtube_downloader.streams import playlist_id_from_url, quality_number, video_id_from_url
+
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+# (itag, mime type, codecs, quality label, audio bitrate, progressive, size as a fraction of media_size)
+FORMATS = [
+    (22, "video/mp4", "avc1.64001F, mp4a.40.2", "720p", "192kbps", True, 1.0),
+    (18, "video/mp4", "avc1.42001E, mp4a.40.2", "360p", "96kbps", True, 1 / 3),
+    (137, "video/mp4", "avc1.640028", "1080p", None, False, 2.0),
+    (140, "audio/mp4", "mp4a.40.2", None, "128kbps", False, 1 / 5),
+]
+
+
+class FakeYouTubeServer(ThreadingHTTPServer):
+    """
+    Serves, on 127.0.0.1 and a free port:
+
+        /watch?v=ID                 HTML watch page embedding ytInitialPlayerResponse
+        /youtubei/v1/player?v=ID    player response JSON (videoDetails + streamingData)
+        /playlist?list=ID&page=N    one page of a playlist: {title, videoIds, next}
+        /media/ID/ITAG              media bytes; honours Range headers (206)
+
+    Every metadata response is delayed by latency seconds and media responses by
+    media_latency before the first byte; media_rate (bytes per second per connection,
+    None for unlimited) paces the body. playlist_length videos are listed page_size
+    per page. Counters in self.requests tell how many requests of each kind were served.
+    """
+    daemon_threads = True
+
+    def __init__(self, media_size=8 * 1024 * 1024, latency=0.05, media_latency=0.02, media_rate=None,
+                 playlist_length=200, page_size=100):
+        super().__init__(("127.0.0.1", 0), FakeYouTubeHandler)
+        self.media_size = media_size
+        self.latency = latency
+        self.media_latency = media_latency
+        self.media_rate = media_rate
+        self.playlist_length = playlist_length
+        self.page_size = page_size
+        self.requests = {"watch": 0, "player": 0, "playlist": 0, "media": 0}
+        self.media_bytes = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, kind, media_bytes=0):
+        with self._lock:
+            self.requests[kind] += 1
+            self.media_bytes += media_bytes
+
+    def player_response(self, video_id):
+        formats, adaptive = [], []
+        for itag, mime, codecs, label, abr, progressive, share in FORMATS:
+            fmt = {"itag": itag, "url": f"{self.base_url}/media/{video_id}/{itag}",
+                   "mimeType": f'{mime}; codecs="{codecs}"', "contentLength": str(int(self.media_size * share)),
+                   "bitrate": 1_000_000}
+            if label:
+                fmt.update(qualityLabel=label, fps=30)
+            if abr:
+                fmt["averageBitrate"] = int(abr[:-4]) * 1000
+            (formats if progressive else adaptive).append(fmt)
+        return {"videoDetails": {"videoId": video_id, "title": f"Benchmark video {video_id}", "lengthSeconds": "212"},
+                "streamingData": {"formats": formats, "adaptiveFormats": adaptive}}
+
+    def media_length(self, itag):
+        return next(int(self.media_size * share) for fmt_itag, *_, share in FORMATS if fmt_itag == itag)
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real servers
+    disable_nagle_algorithm = True # As real servers do; otherwise every reused connection stalls on delayed ACKs
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        server = self.server
+        if url.path.startswith("/media/"):
+            return self.send_media(url.path)
+        time.sleep(server.latency)
+        if url.path == "/watch":
+            server.count("watch")
+            player = json.dumps(server.player_response(query["v"]))
+            body = f"<html><body><script>var ytInitialPlayerResponse = {player};</script></body></html>"
+            return self.send_body(body.encode(), "text/html")
+        if url.path == "/youtubei/v1/player":
+            server.count("player")
+            return self.send_body(json.dumps(server.player_response(query["v"])).encode(), "application/json")
+        if url.path == "/playlist":
+            server.count("playlist")
+            page = int(query.get("page", 0))
+            start = page * server.page_size
+            end = min(start + server.page_size, server.playlist_length)
+            listing = {"title": f"Benchmark playlist {query['list']}",
+                       "videoIds": [f"v{index:010d}" for index in range(start, end)],
+                       "next": page + 1 if end < server.playlist_length else None}
+            return self.send_body(json.dumps(listing).encode(), "application/json")
+        self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_media(self, path):
+        server = self.server
+        _, _, video_id, itag = path.split("/")
+        size = server.media_length(int(itag))
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2) or size - 1), size - 1)
+        time.sleep(server.media_latency)
+        server.count("media", end - start + 1)
+        self.send_response(206 if match else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        pattern = hashlib.sha256(f"{video_id}/{itag}".encode()).digest() * (MEDIA_CHUNK_SIZE // 32)
+        offset = start
+        while offset <= end:
+            length = min(MEDIA_CHUNK_SIZE - offset % MEDIA_CHUNK_SIZE, end - offset + 1)
+            chunk_start = offset % MEDIA_CHUNK_SIZE
+            self.wfile.write(pattern[chunk_start:chunk_start + length])
+            offset += length
+            if server.media_rate:
+                time.sleep(length / server.media_rate)
+
+
+# --- Client side: what pytubefix's YouTube and Playlist are replaced with ---
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+class FakeStream:
+    """The subset of pytubefix.Stream the downloader uses."""
+    def __init__(self, yt, fmt):
+        mime, _, codecs = fmt["mimeType"].partition("; codecs=")
+        codecs = [codec.strip() for codec in codecs.strip('"').split(",")]
+        self._yt = yt
+        self.itag = fmt["itag"]
+        self.url = fmt["url"]
+        self.mime_type = mime
+        self.type, self.subtype = mime.split("/")
+        self.filesize = int(fmt["contentLength"])
+        self.resolution = fmt.get("qualityLabel")
+        self.fps = fmt.get("fps")
+        self.includes_video_track = self.type == "video"
+        self.includes_audio_track = self.type == "audio" or len(codecs) > 1
+        self.is_progressive = self.includes_video_track and self.includes_audio_track
+        self.video_codec = codecs[0] if self.includes_video_track else None
+        self.audio_codec = codecs[-1] if self.includes_audio_track else None
+        self.abr = f"{fmt['averageBitrate'] // 1000}kbps" if "averageBitrate" in fmt else None
+
+    def download(self, output_path=None, filename=None):
+        """Sequential download, like pytubefix's own fallback."""
+        with urllib.request.urlopen(self.url, timeout=30) as response, \
+                open(os.path.join(output_path or ".", filename), "wb") as f:
+            remaining = self.filesize
+            while chunk := response.read(MEDIA_CHUNK_SIZE):
+                f.write(chunk)
+                remaining -= len(chunk)
+                if self._yt.on_progress:
+                    self._yt.on_progress(self, chunk, remaining)
+
+
+class FakeStreamQuery(list):
+    def get_by_itag(self, itag):
+        return next((stream for stream in self if stream.itag == int(itag)), None)
+
+    def filter(self, progressive=None, file_extension=None, only_audio=None):
+        return FakeStreamQuery(stream for stream in self
+                               if (progressive is None or stream.is_progressive == progressive)
+                               and (file_extension is None or stream.subtype == file_extension)
+                               and (not only_audio or stream.type == "audio"))
+
+    def order_by(self, attribute):
+        return FakeStreamQuery(sorted(self, key=lambda stream: quality_number(getattr(stream, attribute))))
+
+    def desc(self):
+        return FakeStreamQuery(reversed(self))
+
+    def first(self):
+        return self[0] if self else None
+
+
+class FakeYouTube:
+    """pytubefix.YouTube stand-in: fetches the watch page and the player response (two round trips)."""
+    base_url = None # Set by installed()
+
+    def __init__(self, url, on_progress_callback=None):
+        self.video_id = video_id_from_url(url) or url.rsplit("=", 1)[-1]
+        self.on_progress = on_progress_callback
+        _get(f"{self.base_url}/watch?v={self.video_id}")
+        player = json.loads(_get(f"{self.base_url}/youtubei/v1/player?v={self.video_id}"))
+        self.title = player["videoDetails"]["title"]
+        self.length = int(player["videoDetails"]["lengthSeconds"])
+        data = player["streamingData"]
+        self.streams = FakeStreamQuery(FakeStream(self, fmt) for fmt in data["formats"] + data["adaptiveFormats"])
+
+    def register_on_progress_callback(self, callback):
+        self.on_progress = callback
+
+
+class FakePlaylist:
+    """pytubefix.Playlist stand-in with lazily fetched pages."""
+    base_url = None # Set by installed()
+
+    def __init__(self, url):
+        self.playlist_id = playlist_id_from_url(url)
+        self._first_page = json.loads(_get(f"{self.base_url}/playlist?list={self.playlist_id}&page=0"))
+        self.title = self._first_page["title"]
+
+    def url_generator(self):
+        page = self._first_page
+        while True:
+            for video_id in page["videoIds"]:
+                yield f"https://www.youtube.com/watch?v={video_id}"
+            if page["next"] is None:
+                return
+            page = json.loads(_get(f"{self.base_url}/playlist?list={self.playlist_id}&page={page['next']}"))
+
+    @property
+    def video_urls(self):
+        return list(self.url_generator())
+
+
+@contextmanager
+def installed(server):
+    """Points the downloader engine at server instead of YouTube for the duration of the block."""
+    saved = core.YouTube, core.Playlist
+    FakeYouTube.base_url = FakePlaylist.base_url = server.base_url
+    core.YouTube, core.Playlist = FakeYouTube, FakePlaylist
+    try:
+        yield server
+    finally:
+        core.YouTube, core.Playlist = saved
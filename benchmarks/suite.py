@@ -0,0 +1,248 @@
+"""
+Benchmark scenarios, each run against a FakeYouTubeServer with a fresh engine
+(in-memory metadata cache and download index, so runs do not affect each other).
+"""
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from youtube_downloader import httppool
+from youtube_downloader.cache import MetadataCache
+from youtube_downloader.core import DownloaderEngine
+from youtube_downloader.index import DownloadIndex
+from youtube_downloader.integrity import MANIFEST_NAME
+from youtube_downloader.progress import ProgressTracker
+
+from .fake_youtube import FakeYouTubeServer, installed
+
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLbenchmark"
+SCENARIOS = ("metadata", "playlist_download", "single_download", "gui")
+# The Tk lag probe asks to run every LAG_PROBE_MS; any extra delay is event-loop lag.
+LAG_PROBE_MS = 10
+GUI_TIMEOUT = 300 # Seconds the GUI scenario may take before it is abandoned
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where it can't be read (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, kilobytes on Linux
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def summarize(values):
+    """mean/p50/p95/max of a list of seconds, rounded for the report."""
+    if not values:
+        return None
+    return {"mean": round(statistics.fmean(values), 6), "p50": round(percentile(values, 0.5), 6),
+            "p95": round(percentile(values, 0.95), 6), "max": round(max(values), 6)}
+
+
+class FirstByteTracker(ProgressTracker):
+    """ProgressTracker that also records when each download first reported data (time.perf_counter())."""
+    def reset(self):
+        super().reset()
+        self.first_byte = {}
+
+    def update(self, key, downloaded_bytes, total_bytes):
+        if downloaded_bytes and key not in self.first_byte:
+            self.first_byte[key] = time.perf_counter()
+        super().update(key, downloaded_bytes, total_bytes)
+
+
+def make_engine(config):
+    engine = DownloaderEngine(cache=MetadataCache(":memory:"), index=DownloadIndex(":memory:"))
+    engine.ffmpeg = None # Same stream choices whether or not ffmpeg is installed
+    engine.reuse_downloads = False
+    engine.progress = FirstByteTracker()
+    engine.download_workers = config.jobs
+    engine.download_segments = config.segments
+    engine.playlist_fetch_workers = config.fetch_workers
+    return engine
+
+
+def requests_since(server, before):
+    return {kind: count - before[kind] for kind, count in server.requests.items()}
+
+
+def bench_metadata(server, config):
+    """Resolves the whole playlist twice: cold (empty metadata cache) and warm."""
+    engine = make_engine(config)
+    results = {}
+    try:
+        for phase in ("cold", "warm"):
+            before = dict(server.requests)
+            first_entry = []
+            start = time.perf_counter()
+            playlist = engine.fetch_playlist(PLAYLIST_URL, lambda *entry: first_entry or first_entry.append(time.perf_counter()))
+            elapsed = time.perf_counter() - start
+            resolved = sum(1 for video_url, _ in playlist["entries"] if video_url)
+            results[phase] = {"videos": resolved, "seconds": round(elapsed, 4),
+                              "videos_per_second": round(resolved / elapsed, 2),
+                              "first_entry_seconds": round(first_entry[0] - start, 4) if first_entry else None,
+                              "requests": requests_since(server, before)}
+    finally:
+        engine.close()
+    return results
+
+
+def bench_playlist_download(server, config):
+    """Downloads config.downloads playlist videos at 720p through DownloadScheduler."""
+    engine = make_engine(config)
+    started = {}
+    engine.subscribe(lambda event, data: started.setdefault(data["job"].number, time.perf_counter())
+                     if event == "job" else None)
+    videos = [(f"https://www.youtube.com/watch?v=v{index:010d}", f"Benchmark video {index}")
+              for index in range(config.downloads)]
+    before = dict(server.requests)
+    with tempfile.TemporaryDirectory(prefix="ytdl-bench-") as out_dir:
+        try:
+            start = time.perf_counter()
+            jobs = engine.download_playlist(videos, 22, "720p", out_dir)
+            elapsed = time.perf_counter() - start
+        finally:
+            engine.close()
+        downloaded = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir)
+                         if name != MANIFEST_NAME) # Only the videos, not the checksums written next to them
+    ttfb = [engine.progress.first_byte[job.number] - started[job.number]
+            for job in jobs if job.number in engine.progress.first_byte and job.number in started]
+    return {"videos": len(jobs), "succeeded": sum(1 for job in jobs if job.status == "done"),
+            "bytes": downloaded, "seconds": round(elapsed, 4),
+            "throughput_mb_per_second": round(downloaded / elapsed / (1024 * 1024), 2),
+            "time_to_first_byte_seconds": summarize(ttfb), "requests": requests_since(server, before)}
+
+
+def bench_single_download(config):
+    """Downloads one large video (segmented when it is over the threshold) from its own server."""
+    server = FakeYouTubeServer(media_size=config.single_size, latency=config.latency,
+                               media_latency=config.media_latency, media_rate=config.media_rate).start()
+    engine = make_engine(config)
+    url = "https://www.youtube.com/watch?v=vsingle0000"
+    try:
+        with installed(server), tempfile.TemporaryDirectory(prefix="ytdl-bench-") as out_dir:
+            start = time.perf_counter()
+            file_path = engine.download_video(url, 22, out_dir)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(file_path)
+    finally:
+        engine.close()
+        server.stop()
+    first_byte = engine.progress.first_byte.get(url)
+    return {"bytes": size, "seconds": round(elapsed, 4), "segments": config.segments,
+            "throughput_mb_per_second": round(size / elapsed / (1024 * 1024), 2),
+            # From calling download_video, so it includes the stream lookup (2 round trips)
+            "time_to_first_byte_seconds": round(first_byte - start, 4) if first_byte else None,
+            "requests": dict(server.requests)}
+
+
+def bench_gui(server, config):
+    """
+    Loads the playlist into the Tk app (fetch_stream_options streaming rows into the
+    PlaylistView) while a probe measures how late the event loop runs its callbacks.
+    """
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e: # No tkinter, or no display
+        return {"skipped": f"Tk is not available: {e}"}
+    from youtube_downloader.gui import YouTubeDownloaderApp
+
+    root.withdraw()
+    engine = make_engine(config)
+    app = YouTubeDownloaderApp(root, engine)
+    app.download_type.set("playlist")
+    app.update_ui_for_type()
+    app.url_entry.insert(0, PLAYLIST_URL)
+    lags = []
+    result = {}
+    interval = LAG_PROBE_MS / 1000
+
+    def probe(expected):
+        now = time.perf_counter()
+        lags.append(max(0.0, now - expected))
+        root.after(LAG_PROBE_MS, probe, now + interval)
+
+    def check():
+        elapsed = time.perf_counter() - start
+        thread = app.fetch_thread
+        loaded = thread is not None and not thread.is_alive() and len(app.playlist_view) == len(app.playlist_videos_info)
+        if loaded or elapsed > GUI_TIMEOUT:
+            result.update(videos=len(app.playlist_view), seconds_to_list=round(elapsed, 4), timed_out=not loaded)
+            root.quit()
+        else:
+            root.after(20, check)
+
+    start = time.perf_counter()
+    app.on_url_change()
+    root.after(LAG_PROBE_MS, probe, start + interval)
+    root.after(20, check)
+    try:
+        root.mainloop()
+    finally:
+        app.cancel_fetch()
+        root.destroy()
+        engine.close()
+    result["event_loop_lag_ms"] = {name: round(value * 1000, 2) for name, value in summarize(lags).items()} if lags else None
+    result["probes"] = len(lags)
+    return result
+
+
+def run(config, scenarios=SCENARIOS, log=print):
+    """Runs the given scenarios and returns the report (a JSON-serializable dict)."""
+    httppool.install() # Like the app's entry points, so the fake's metadata requests are pooled too
+    report = {"format": 1,
+              "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "config": dict(vars(config)),
+              "results": {}}
+    server = FakeYouTubeServer(media_size=config.media_size, latency=config.latency, media_latency=config.media_latency,
+                               media_rate=config.media_rate, playlist_length=config.videos,
+                               page_size=config.page_size).start()
+    try:
+        with installed(server):
+            for name in scenarios:
+                log(f"Running '{name}'...")
+                if name == "single_download":
+                    result = bench_single_download(config)
+                else:
+                    result = {"metadata": bench_metadata, "playlist_download": bench_playlist_download,
+                              "gui": bench_gui}[name](server, config)
+                result["peak_rss_bytes"] = peak_rss_bytes() # High-water mark of the process so far
+                report["results"][name] = result
+    finally:
+        server.stop()
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+
+def flatten(results, prefix=""):
+    """{'a': {'b': 1}} -> {'a.b': 1}, keeping numeric leaves only."""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def compare(baseline, report):
+    """Returns lines comparing every numeric result of report with baseline (both run() reports)."""
+    old, new = flatten(baseline["results"]), flatten(report["results"])
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        change = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else "n/a"
+        lines.append(f"{name:<60} {old[name]:>14g} -> {new[name]:<14g} {change}")
+    return lines
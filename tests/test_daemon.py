@@ -0,0 +1,56 @@
+"""
+DownloadDaemon against the local stand-in for YouTube used by the benchmarks. Needs
+pytubefix, which the engine imports.
+"""
+import importlib.util
+import shutil
+import tempfile
+import time
+import unittest
+
+HAS_PYTUBEFIX = importlib.util.find_spec("pytubefix") is not None
+if HAS_PYTUBEFIX:
+    from benchmarks.fake_youtube import FakeYouTubeServer, installed
+    from youtube_downloader import DownloaderEngine, DownloadIndex, JobQueue, MetadataCache
+    from youtube_downloader.daemon import DownloadDaemon
+
+MEDIA_SIZE = 16 * 1024 * 1024
+MEDIA_RATE = 2 * 1024 * 1024 # Bytes per second, so a download takes several seconds
+
+
+@unittest.skipUnless(HAS_PYTUBEFIX, "pytubefix is not installed")
+class DownloadDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(prefix="ytdl-test-")
+        self.addCleanup(shutil.rmtree, self.out_dir)
+        server = FakeYouTubeServer(media_size=MEDIA_SIZE, latency=0.01, media_latency=0, media_rate=MEDIA_RATE)
+        server.start()
+        self.addCleanup(server.stop)
+        fake = installed(server)
+        fake.__enter__()
+        self.addCleanup(fake.__exit__, None, None, None)
+        engine = DownloaderEngine(cache=MetadataCache(":memory:"), index=DownloadIndex(":memory:"),
+                                  download_workers=2)
+        self.addCleanup(engine.close)
+        self.daemon = DownloadDaemon(engine, JobQueue(":memory:"), port=0, out_dir=self.out_dir).start()
+        self.addCleanup(self.daemon.stop)
+
+    def wait_for_state(self, job_id, *states, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            state = self.daemon.queue.job(job_id)["state"]
+            if state in states:
+                return state
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not reach {states} within {timeout}s (it is '{state}').")
+
+    def test_submitted_job_starts_while_another_downloads(self):
+        _, (first,) = self.daemon.submit(["https://www.youtube.com/watch?v=vid00000001"])
+        self.wait_for_state(first, "downloading")
+        _, (second,) = self.daemon.submit(["https://www.youtube.com/watch?v=vid00000002"])
+        self.wait_for_state(second, "downloading", "done")
+        self.assertEqual(self.daemon.queue.job(first)["state"], "downloading")
+
+
+if __name__ == "__main__":
+    unittest.main()
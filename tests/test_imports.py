@@ -0,0 +1,46 @@
+"""
+Commands that don't download (help, verify, queue status, talking to a daemon) must work
+without pytubefix: each check runs in a fresh interpreter where importing it fails.
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCK_PYTUBEFIX = "import sys; sys.modules['pytubefix'] = None; "
+
+
+def run_without_pytubefix(code, *args):
+    with tempfile.TemporaryDirectory(prefix="ytdl-test-") as home:
+        env = {**os.environ, "HOME": home, "LOCALAPPDATA": home, "PYTHONPATH": ROOT}
+        return subprocess.run([sys.executable, "-c", BLOCK_PYTUBEFIX + code, *args], cwd=home, env=env,
+                              capture_output=True, text=True, timeout=60)
+
+
+class WithoutPytubefixTest(unittest.TestCase):
+    def assert_runs(self, code, *args):
+        result = run_without_pytubefix(code, *args)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_modules_import(self):
+        modules = ["cli", "client", "daemon", "jobqueue", "policy", "streams"]
+        if importlib.util.find_spec("tkinter") is not None:
+            modules.append("gui")
+        self.assert_runs("import importlib, sys\n"
+                         f"for name in {modules!r}:\n"
+                         "    importlib.import_module('youtube_downloader.' + name)\n"
+                         "assert 'pytubefix' not in [m for m in sys.modules if sys.modules[m] is not None]")
+
+    def test_commands_run(self):
+        main = "import sys; from youtube_downloader.cli import main; sys.exit(main(sys.argv[1:]))"
+        self.assertIn("usage:", self.assert_runs(main, "--help"))
+        self.assertIn("resolve: 0", self.assert_runs(main, "queue", "status"))
+        self.assertIn("usage:", self.assert_runs(main, "verify", "--help"))
+
+
+if __name__ == "__main__":
+    unittest.main()
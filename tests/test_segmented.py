@@ -0,0 +1,131 @@
+"""
+SegmentedDownloader and PartialDownload against a local HTTP server that serves one
+file, with or without support for byte range requests.
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from youtube_downloader.integrity import file_digest
+from youtube_downloader.segmented import PartialDownload, RangeNotSupportedError, SegmentedDownloader
+
+BLOCK = 1024 * 1024
+# Not a multiple of the segment or request size, so the last ones are short.
+DATA = os.urandom(5 * BLOCK + 12345)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves DATA at any path; under /norange/ the Range header is ignored, like some servers do."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if match and not self.path.startswith("/norange/"):
+            start, end = int(match.group(1)), min(int(match.group(2)), len(DATA) - 1)
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # The client hung up early (a rejected response)
+            return
+        with self.server.lock:
+            self.server.bytes_served += len(body)
+
+
+class SegmentedDownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="ytdl-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.file_path = os.path.join(self.directory, "video.mp4")
+        self.server.bytes_served = 0
+
+    def downloader(self):
+        return SegmentedDownloader(segments=4, request_size=BLOCK // 2, chunk_size=64 * 1024)
+
+    def test_download_is_byte_exact(self):
+        state = PartialDownload.open(self.file_path, len(DATA), f"{self.base_url}/video", 22, "abcdefghijk")
+        progress = []
+        self.downloader().download(state.url, state, lambda done, total: progress.append(done))
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(progress[-1], len(DATA))
+        self.assertEqual(self.server.bytes_served, len(DATA))
+        self.assertEqual(state.digest, file_digest(self.file_path))
+        self.assertFalse(os.path.exists(state.part_path))
+        self.assertFalse(os.path.exists(state.manifest_path))
+
+    def test_server_ignoring_ranges_is_rejected(self):
+        state = PartialDownload.open(self.file_path, len(DATA), f"{self.base_url}/norange/video")
+        with self.assertRaises(RangeNotSupportedError):
+            self.downloader().download(state.url, state)
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_short_file_is_an_error(self):
+        state = PartialDownload.open(self.file_path, len(DATA) + 10, f"{self.base_url}/video")
+        with self.assertRaises(IOError):
+            self.downloader().download(state.url, state)
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_finish_checks_the_size(self):
+        state = PartialDownload.open(self.file_path, len(DATA))
+        state.mark_done(0, len(DATA) - 1)
+        with self.assertRaises(IOError):
+            state.finish()
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertTrue(os.path.exists(state.part_path))
+
+    def test_resume_fetches_only_the_missing_ranges(self):
+        url = f"{self.base_url}/video"
+        done = [(0, 2 * BLOCK), (3 * BLOCK + 100, 4 * BLOCK)]
+        state = PartialDownload.open(self.file_path, len(DATA), url, 22, "abcdefghijk")
+        with open(state.part_path, "r+b") as f:
+            for start, end in done:
+                f.seek(start)
+                f.write(DATA[start:end])
+                state.mark_done(start, end)
+        state.save()
+
+        resumed = PartialDownload.open(self.file_path, len(DATA), url, 22, "abcdefghijk")
+        self.assertEqual(resumed.completed, done)
+        self.downloader().download(url, resumed)
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(self.server.bytes_served, len(DATA) - sum(end - start for start, end in done))
+        self.assertEqual(resumed.digest, file_digest(self.file_path))
+
+    def test_manifest_of_another_stream_is_discarded(self):
+        state = PartialDownload.open(self.file_path, len(DATA), itag=22)
+        state.mark_done(0, BLOCK)
+        state.save()
+        self.assertEqual(PartialDownload.open(self.file_path, len(DATA), itag=137).completed, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+YouTube downloader built on pytubefix.
+
+The downloader itself (DownloaderEngine) has no GUI dependency and can be used as a
+library or through the command line (python -m youtube_downloader). The Tk desktop
+app lives in youtube_downloader.gui and is only imported when it is launched.
+
+The names below are imported from their modules on first use, so commands that don't
+download (--help, verify, queue status, talking to a daemon) start without pytubefix.
+"""
+import importlib
+
+_EXPORTS = {
+    "core": ("DownloaderEngine",),
+    "audio": ("AudioConverter", "AudioError", "convert_audio"),
+    "cache": ("MetadataCache",),
+    "client": ("DaemonClient", "DaemonError"),
+    "control": ("DownloadCancelled", "DownloadControl"),
+    "daemon": ("DownloadDaemon",),
+    "httppool": ("ConnectionPool",),
+    "index": ("DownloadIndex",),
+    "integrity": ("BlockHasher", "file_digest", "verify_file"),
+    "jobqueue": ("JobQueue", "read_urls"),
+    "metrics": ("Metrics", "MetricsExporter"),
+    "mux": ("MuxError", "find_ffmpeg", "mux"),
+    "policy": ("QualityPolicy", "QualityRule"),
+    "progress": ("ProgressTracker",),
+    "retry": ("CircuitBreaker", "RetryPolicy", "call_with_retry", "is_retryable"),
+    "scheduler": ("DownloadJob", "DownloadScheduler", "resolve_in_order"),
+    "segmented": ("PartialDownload", "RangeNotSupportedError", "SegmentedDownloader"),
+    "streams": ("describe_streams", "is_playlist_url", "is_youtube_url", "parse_selection", "playlist_id_from_url",
+                "sanitize_filename", "select_quality", "stream_options_for", "video_id_from_url"),
+    "throttle": ("BandwidthLimiter", "BandwidthSchedule", "TokenBucket", "parse_rate"),
+    "writer": ("FileWriter", "preallocate"),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
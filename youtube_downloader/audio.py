@@ -0,0 +1,109 @@
+"""
+Audio-only downloads as real audio files. YouTube serves audio as AAC in an MP4
+container (or Opus in WebM): AAC is copied into an .m4a file as it is, and MP3 or Opus
+output is transcoded with ffmpeg on a pool sized to the CPU cores, next to the downloads
+that are still running.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .mux import run_ffmpeg
+
+# Output formats, and the format used unless another one is asked for. 'm4a' needs no
+# re-encoding for YouTube's AAC streams, so it is lossless and fast.
+AUDIO_FORMATS = ("m4a", "mp3", "opus")
+AUDIO_FORMAT = "m4a"
+AUDIO_BITRATE = 192 # kbit/s, for transcoded output
+# At most AUDIO_WORKERS ffmpeg transcodes run at once; each one is limited to one thread.
+AUDIO_WORKERS = os.cpu_count() or 1
+
+# Encoder per output format, and the source codecs (prefix of the stream's audio_codec,
+# e.g. 'mp4a.40.2') each format can take without re-encoding.
+AUDIO_ENCODERS = {"m4a": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+AUDIO_COPY_CODECS = {"m4a": ("mp4a",), "mp3": ("mp3",), "opus": ("opus",)}
+
+
+class AudioError(Exception):
+    """Raised when ffmpeg fails to convert an audio file."""
+
+
+def parse_bitrate(text):
+    """Parses an audio bitrate such as '192k', '192kbps' or '192' into kbit/s."""
+    match = re.fullmatch(r"\s*(\d+)\s*(k|kbps|kbit/s)?\s*", str(text), flags=re.IGNORECASE)
+    if not match or not 32 <= int(match.group(1)) <= 512:
+        raise ValueError(f"Invalid audio bitrate '{text}'; use kbit/s between 32 and 512, e.g. '192k'.")
+    return int(match.group(1))
+
+
+def can_copy(source_codec, audio_format):
+    """Whether audio in source_codec goes into audio_format without re-encoding."""
+    return bool(source_codec) and source_codec.lower().startswith(AUDIO_COPY_CODECS[audio_format])
+
+
+def convert_audio(source_path, output_path, bitrate=AUDIO_BITRATE, source_codec=None, ffmpeg=None):
+    """
+    Writes the audio track of source_path to output_path, in the format its extension
+    names (see AUDIO_FORMATS). The track is stream-copied when source_codec (as reported
+    by pytubefix, e.g. 'mp4a.40.2') fits the format, otherwise encoded at bitrate kbit/s.
+    """
+    audio_format = os.path.splitext(output_path)[1].lstrip(".").lower()
+    if audio_format not in AUDIO_FORMATS:
+        raise AudioError(f"Unknown audio format '{audio_format}'; use one of {', '.join(AUDIO_FORMATS)}.")
+    arguments = ["-i", source_path, "-map", "0:a:0", "-map_metadata", "0"]
+    if can_copy(source_codec, audio_format):
+        arguments += ["-c:a", "copy"]
+    else:
+        arguments += ["-c:a", AUDIO_ENCODERS[audio_format], "-b:a", f"{bitrate}k", "-threads", "1"]
+    if audio_format == "m4a":
+        arguments += ["-movflags", "+faststart"]
+    return run_ffmpeg(arguments, output_path, ffmpeg, "converting", AudioError)
+
+
+class AudioConverter:
+    """
+    Converts downloaded audio files (see convert_audio()) on a bounded pool: at most
+    workers ffmpeg processes run at once. Each pool thread only waits on its ffmpeg
+    process, so transcodes use every core without holding up the downloads. submit()
+    returns a Future of the output path; the source file is removed once it has been
+    converted. With metrics (a Metrics registry), conversions are timed as the
+    audio_convert span and counted in audio_conversions_total by mode (copy/transcode).
+    """
+    def __init__(self, workers=AUDIO_WORKERS, ffmpeg=None, metrics=None):
+        self.workers = max(1, workers)
+        self.ffmpeg = ffmpeg
+        self.metrics = metrics
+        self._executor = None # Started on the first submit()
+        self._lock = threading.Lock()
+
+    def submit(self, source_path, output_path, bitrate=AUDIO_BITRATE, source_codec=None, control=None):
+        """
+        Queues a conversion. If control (a DownloadControl) is cancelled before it starts,
+        the Future raises DownloadCancelled and the source file is kept.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio")
+            return self._executor.submit(self.convert, source_path, output_path, bitrate, source_codec, control)
+
+    def convert(self, source_path, output_path, bitrate=AUDIO_BITRATE, source_codec=None, control=None):
+        if control is not None:
+            control.checkpoint()
+        audio_format = os.path.splitext(output_path)[1].lstrip(".").lower()
+        mode = "copy" if audio_format in AUDIO_FORMATS and can_copy(source_codec, audio_format) else "transcode"
+        if self.metrics is None:
+            convert_audio(source_path, output_path, bitrate, source_codec, self.ffmpeg)
+        else:
+            with self.metrics.span("audio_convert", mode=mode, format=audio_format):
+                convert_audio(source_path, output_path, bitrate, source_codec, self.ffmpeg)
+            self.metrics.inc("audio_conversions_total", mode=mode)
+        os.remove(source_path)
+        return output_path
+
+    def shutdown(self):
+        """Waits for the queued conversions and stops the pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+"""
+Persistent SQLite cache of video and playlist metadata.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Metadata cache: where it lives, how long entries stay fresh (seconds) and how many
+# videos/playlists are kept before the least recently used ones are evicted.
+CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"), "youtube_downloader")
+CACHE_PATH = os.path.join(CACHE_DIR, "metadata.sqlite3")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 20000
+
+
+class MetadataCache:
+    """
+    Persistent SQLite cache of video and playlist metadata, keyed by video/playlist ID.
+    Videos store their title, length and stream descriptors, playlists their title and member
+    video IDs. Entries older than ttl seconds are treated as missing, and once a table
+    holds more than max_entries rows the least recently used ones are evicted.
+    Safe to share between threads.
+    """
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, title TEXT, "
+                             "streams TEXT, fetched_at REAL, accessed_at REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS playlists (playlist_id TEXT PRIMARY KEY, title TEXT, "
+                             "video_ids TEXT, fetched_at REAL, accessed_at REAL)")
+            if "length" not in {row[1] for row in self._db.execute("PRAGMA table_info(videos)")}:
+                self._db.execute("ALTER TABLE videos ADD COLUMN length INTEGER") # Caches created before lengths were stored
+            self._db.execute("CREATE INDEX IF NOT EXISTS videos_lru ON videos (accessed_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS playlists_lru ON playlists (accessed_at)")
+
+    def get_video(self, video_id):
+        """Returns {'video_id', 'title', 'length', 'streams'} for a fresh cached video, or None."""
+        row = self._get("videos", "video_id", video_id, "title, streams, length")
+        if row is None:
+            return None
+        return {"video_id": video_id, "title": row[0], "length": row[2], "streams": json.loads(row[1])}
+
+    def get_videos(self, video_ids):
+        """Batch form of get_video() (one query): returns {video_id: info} for the fresh cached ones."""
+        video_ids = list(dict.fromkeys(filter(None, video_ids)))
+        if not video_ids:
+            return {}
+        now = time.time()
+        placeholders = ", ".join("?" * len(video_ids))
+        with self._lock, self._db:
+            rows = self._db.execute(f"SELECT video_id, title, streams, length, fetched_at FROM videos "
+                                    f"WHERE video_id IN ({placeholders})", video_ids).fetchall()
+            fresh = [row for row in rows if now - row[-1] <= self.ttl]
+            expired = [(row[0],) for row in rows if now - row[-1] > self.ttl]
+            if expired:
+                self._db.executemany("DELETE FROM videos WHERE video_id = ?", expired)
+            self._db.executemany("UPDATE videos SET accessed_at = ? WHERE video_id = ?", [(now, row[0]) for row in fresh])
+        return {video_id: {"video_id": video_id, "title": title, "length": length, "streams": json.loads(streams)}
+                for video_id, title, streams, length, _ in fresh}
+
+    def put_video(self, video_id, title, streams, length=None):
+        self._put("videos", "video_id", video_id, "title, streams, length", (title, json.dumps(streams), length))
+
+    def get_playlist(self, playlist_id):
+        """Returns {'playlist_id', 'title', 'video_ids'} for a fresh cached playlist, or None."""
+        row = self._get("playlists", "playlist_id", playlist_id, "title, video_ids")
+        if row is None:
+            return None
+        return {"playlist_id": playlist_id, "title": row[0], "video_ids": json.loads(row[1])}
+
+    def put_playlist(self, playlist_id, title, video_ids):
+        self._put("playlists", "playlist_id", playlist_id, "title, video_ids", (title, json.dumps(list(video_ids))))
+
+    def _get(self, table, key_column, key, columns):
+        if not key:
+            return None
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(f"SELECT {columns}, fetched_at FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[-1] > self.ttl:
+                self._db.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+                return None
+            self._db.execute(f"UPDATE {table} SET accessed_at = ? WHERE {key_column} = ?", (now, key))
+        return row[:-1]
+
+    def _put(self, table, key_column, key, columns, values):
+        if not key:
+            return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(f"INSERT OR REPLACE INTO {table} ({key_column}, {columns}, fetched_at, accessed_at) "
+                             f"VALUES (?, {', '.join('?' * len(values))}, ?, ?)", (key, *values, now, now))
+            # Keep the table bounded: drop the least recently used rows beyond max_entries
+            self._db.execute(f"DELETE FROM {table} WHERE {key_column} IN (SELECT {key_column} FROM {table} "
+                             f"ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
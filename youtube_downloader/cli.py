@@ -0,0 +1,504 @@
+"""
+Command line interface.
+
+    python -m youtube_downloader                      # launch the desktop app
+    python -m youtube_downloader gui --daemon         # ... as a client of a running daemon
+    python -m youtube_downloader info URL [--audio]
+    python -m youtube_downloader get URL --quality 720p --out DIR --jobs 8
+    python -m youtube_downloader get URL --audio --audio-format mp3 --audio-bitrate 256k
+    python -m youtube_downloader get URL --limit 20M --schedule 09:00-18:00=5M
+    python -m youtube_downloader get PLAYLIST_URL --policy "best <=1080p, prefer avc1, cap 500M else best audio"
+    python -m youtube_downloader queue add --file urls.txt --out DIR   # or: ... | queue add -
+    python -m youtube_downloader queue run --jobs 8
+    python -m youtube_downloader queue status
+    python -m youtube_downloader verify DIR [--full]
+    python -m youtube_downloader daemon --port 9471 --out DIR --jobs 8   # local JSON API, see daemon.py
+    python -m youtube_downloader get URL --metrics-file ytdl.prom --trace spans.jsonl --metrics-port 9464
+
+While a download runs on a terminal, these commands can be typed (followed by Enter):
+limit RATE, job-limit RATE, pause, resume. RATE is e.g. 20M, 512K or 0 for unlimited.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from . import httppool
+from .audio import AUDIO_BITRATE, AUDIO_FORMAT, AUDIO_FORMATS, parse_bitrate
+from .control import DownloadControl
+from .client import DAEMON_HOST, DAEMON_PORT, DAEMON_URL
+from .retry import MEDIA_ATTEMPTS, METADATA_ATTEMPTS
+from .metrics import METRICS_INTERVAL, MetricsExporter
+from .scheduler import DOWNLOAD_WORKERS, DOWNLOAD_WORKERS_PER_HOST
+from .segmented import DOWNLOAD_SEGMENTS
+from .throttle import BandwidthSchedule, format_rate, parse_rate
+from .writer import FSYNC_POLICIES
+
+# How often (seconds) the progress line is redrawn while downloading.
+PROGRESS_INTERVAL = 0.5
+# Seconds Ctrl+C waits for a cancelled download to release its files and connections.
+CANCEL_TIMEOUT = 5
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m youtube_downloader",
+                                     description="Download YouTube videos, audio and playlists.")
+    commands = parser.add_subparsers(dest="command")
+    engine_options = build_engine_parser()
+
+    gui = commands.add_parser("gui", help="launch the desktop app (the default)")
+    gui.add_argument("--daemon", nargs="?", const=DAEMON_URL, metavar="URL",
+                     help=f"hand downloads to a running daemon (default: {DAEMON_URL}) instead of running them in the app")
+
+    info = commands.add_parser("info", help="show a video's or playlist's title and available qualities")
+    info.add_argument("url")
+    info.add_argument("--audio", action="store_true", help="list audio-only qualities")
+    info.add_argument("--policy", help="also show what a quality policy (see get --policy) picks for each video")
+
+    get = commands.add_parser("get", parents=[engine_options],
+                              help="download a video, its audio, or a whole playlist")
+    get.add_argument("url")
+    get.add_argument("--audio", action="store_true", help="download the audio stream only")
+    get.add_argument("--quality", default="best",
+                     help="quality label such as 720p or 128kbps, or 'best' (default); "
+                          "falls back to the best quality below it")
+    get.add_argument("--policy",
+                     help="quality rules tried in order for each video, separated by 'else', e.g. "
+                          "'best <=1080p, prefer avc1, cap 500M else best audio'; overrides --quality")
+    get.add_argument("--out", default=".", help="output directory (default: current directory)")
+    get.add_argument("-q", "--quiet", action="store_true", help="only print errors and the saved file paths")
+
+    queue = commands.add_parser("queue", parents=[engine_options],
+                                help="persistent download queue fed with URL lists (survives restarts)")
+    queue.add_argument("action", choices=["add", "run", "status", "list", "retry", "clean"],
+                       help="add URLs; run the queue until it is empty; show job counts; list jobs; "
+                            "send failed jobs back to the queue; remove finished jobs")
+    queue.add_argument("urls", nargs="*", help="URLs to add; '-' reads them from stdin")
+    queue.add_argument("--file", action="append", default=[],
+                       help="text file with URLs to add, one or more per line ('#' starts a comment); repeatable")
+    queue.add_argument("--audio", action="store_true", help="queue the audio streams only")
+    queue.add_argument("--quality", default="best", help="quality label for the added URLs (default: best)")
+    queue.add_argument("--policy", help="quality policy for the added URLs (see get --policy)")
+    queue.add_argument("--out", default=".", help="output directory for the added URLs (default: current directory)")
+    queue.add_argument("--state", choices=["resolve", "queued", "downloading", "done", "failed"],
+                       help="only list jobs in this state")
+    queue.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+
+    daemon = commands.add_parser("daemon", parents=[engine_options],
+                                 help="keep running and take downloads through a local HTTP/JSON API")
+    daemon.add_argument("--host", default=DAEMON_HOST, help=f"address to listen on (default: {DAEMON_HOST}, this computer only)")
+    daemon.add_argument("--port", type=int, default=DAEMON_PORT, help=f"port to listen on (default: {DAEMON_PORT})")
+    daemon.add_argument("--out", default=".", help="output directory for submitted URLs that don't name one "
+                                                   "(default: current directory)")
+    daemon.add_argument("--policy", help="default quality policy for submitted URLs (see get --policy)")
+    daemon.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+
+    verify = commands.add_parser("verify", help="check the files in a folder against its checksum manifest")
+    verify.add_argument("directory", nargs="?", default=".", help="folder to check (default: current directory)")
+    verify.add_argument("--full", action="store_true",
+                        help="re-hash every file, not only those whose size or modification time changed")
+    return parser
+
+
+def build_engine_parser():
+    """
+    Options of the commands that download (get, queue run, daemon), as a parent parser
+    for add_parser(parents=...). configure_engine() applies them.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"videos downloaded at once (default: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--jobs-per-host", type=int, default=DOWNLOAD_WORKERS_PER_HOST,
+                        help=f"concurrent downloads from one media server (default: {DOWNLOAD_WORKERS_PER_HOST})")
+    parser.add_argument("--segments", type=int, default=DOWNLOAD_SEGMENTS,
+                        help=f"parallel connections for one large file (default: {DOWNLOAD_SEGMENTS})")
+    parser.add_argument("--limit", type=parse_rate, default=None,
+                        help="overall speed cap such as 20M or 512K (bytes per second; default: unlimited)")
+    parser.add_argument("--job-limit", type=parse_rate, default=None,
+                        help="speed cap for each video on its own (default: unlimited)")
+    parser.add_argument("--schedule", type=BandwidthSchedule.parse, default=None,
+                        help="time-of-day overall caps such as '09:00-18:00=20M,22:00-06:00=0'; "
+                             "--limit applies outside these hours")
+    parser.add_argument("--force", action="store_true",
+                        help="download again even if the video was already downloaded in this quality")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="off",
+                        help="when to flush downloads to disk: off (leave it to the OS, the default), end (each "
+                             "finished file), checkpoint (also every few seconds, so a resume after a power loss "
+                             "never trusts unsynced bytes)")
+    add_audio_arguments(parser)
+    add_retry_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser
+
+
+def add_audio_arguments(parser):
+    parser.add_argument("--audio-format", choices=AUDIO_FORMATS, default=AUDIO_FORMAT,
+                        help=f"format of audio-only downloads (default: {AUDIO_FORMAT}, YouTube's AAC audio "
+                             "as is); mp3 and opus are transcoded with ffmpeg")
+    parser.add_argument("--audio-bitrate", type=parse_bitrate, default=AUDIO_BITRATE,
+                        help=f"bitrate of transcoded audio such as 128k or 320k (default: {AUDIO_BITRATE}k)")
+
+
+def add_retry_arguments(parser):
+    parser.add_argument("--retries", type=int, default=MEDIA_ATTEMPTS,
+                        help="tries for each part of a file before giving up on it; each retry resumes "
+                             f"from the last byte received (default: {MEDIA_ATTEMPTS})")
+    parser.add_argument("--metadata-retries", type=int, default=METADATA_ATTEMPTS,
+                        help=f"tries for each video or playlist lookup (default: {METADATA_ATTEMPTS})")
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help=f"write Prometheus-format metrics to PATH every {METRICS_INTERVAL}s and on exit "
+                             "(for node_exporter's textfile collector)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics (JSON at /metrics.json)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="append every timing span, and the metrics every "
+                             f"{METRICS_INTERVAL}s, to PATH as JSON lines")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    httppool.install() # Every command's requests, pytubefix's included, share one connection pool
+    if args.command in (None, "gui"):
+        return run_gui(getattr(args, "daemon", None))
+    if args.command == "queue":
+        return run_queue_command(args)
+    if args.command == "daemon":
+        return run_daemon_command(args)
+    if args.command == "verify":
+        return run_verify_command(args)
+    return run_command(args)
+
+
+def run_gui(daemon_url=None):
+    from .gui import main as gui_main # tkinter is only imported here
+    gui_main(daemon_url)
+    return 0
+
+
+def run_command(args):
+    from .core import DownloaderEngine
+    from .streams import is_playlist_url, is_youtube_url, select_quality
+    from .policy import QualityPolicy
+
+    if not is_youtube_url(args.url):
+        print(f"error: '{args.url}' is not a YouTube video or playlist URL", file=sys.stderr)
+        return 2
+    try:
+        policy = QualityPolicy.parse(args.policy) if args.policy else None
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    quiet = getattr(args, "quiet", False)
+    redraw = "\r" if sys.stderr.isatty() else "" # Log lines overwrite the progress line on a terminal
+
+    def on_event(event, data):
+        if event == "log" and not quiet:
+            line = f"[{time.strftime('%H:%M:%S')}] {data['message']}"
+            print(redraw + line.ljust(80) if redraw else line, file=sys.stderr)
+
+    engine = configure_engine(args, on_event) if args.command == "get" else DownloaderEngine(on_event=on_event)
+    stop_metrics = None
+    download_type = "audio" if args.audio else "video"
+    try:
+        if args.command == "get":
+            stop_metrics = start_metrics(engine, args)
+        if is_playlist_url(args.url):
+            if args.audio:
+                print("error: audio-only download is not supported for playlists", file=sys.stderr)
+                return 2
+            target = engine.stream_playlist(args.url) # Entries are resolved as they are consumed below
+            if target["empty"]:
+                print("error: this playlist is empty or private", file=sys.stderr)
+                return 1
+        else:
+            target = engine.fetch_video(args.url, download_type)
+
+        def describe_choice(info):
+            choice = policy.choose(info["streams"], adaptive=engine.ffmpeg is not None)
+            if choice is None:
+                return "no rule matches"
+            return f"{choice['label']} (itag {choice['itag']}), rule {choice['rule']}: {choice['rule_text']}"
+
+        if args.command == "info":
+            print(target["title"])
+            for itag, desc in target["options"]:
+                print(f"  {desc}  (itag {itag})")
+            if policy and "entries" not in target:
+                print(f"  Policy picks: {describe_choice(target)}")
+            for i, video_url, info, error in target.get("entries", []):
+                line = f"  {i+1}. {info['title'] if error is None else '[Error fetching title]'}"
+                if policy and error is None:
+                    line += f"  -> {describe_choice(info)}"
+                print(line, flush=True)
+            return 0
+
+        if "entries" in target and policy:
+            # Each video's stream is picked from its own stream list as it arrives
+            videos = ((video_url, info["title"]) for i, video_url, info, error in target["entries"] if error is None)
+            jobs = with_progress(engine, quiet, engine.download_playlist, videos, None, None, args.out, policy=policy)
+            failed = [job for job in jobs if job.status != "done"]
+            return 1 if failed else 0
+        if policy:
+            choice = policy.choose(target["streams"], adaptive=engine.ffmpeg is not None)
+            if choice is None:
+                print("error: no rule of the quality policy matches this video", file=sys.stderr)
+                return 1
+            itag, quality_desc = choice["itag"], f"{choice['label']} (rule {choice['rule']}: {choice['rule_text']})"
+            download_type = choice["download_type"]
+        else:
+            itag = select_quality(target["options"], args.quality)
+            if itag is None:
+                print(f"error: no quality matching '{args.quality}' is available", file=sys.stderr)
+                return 1
+            quality_desc = next(desc for option_itag, desc in target["options"] if option_itag == itag)
+        if not quiet:
+            print(f"Selected quality: {quality_desc}", file=sys.stderr)
+
+        if "entries" in target:
+            # Downloads start while later playlist pages are still being fetched
+            videos = ((video_url, info["title"]) for i, video_url, info, error in target["entries"] if error is None)
+            jobs = with_progress(engine, quiet, engine.download_playlist,
+                                 videos, itag, quality_desc.split(' ')[0], args.out)
+            failed = [job for job in jobs if job.status != "done"]
+            return 1 if failed else 0
+        print(with_progress(engine, quiet, engine.download_video, args.url, itag, args.out, download_type))
+        return 0
+    except KeyboardInterrupt:
+        print("\ninterrupted; partial downloads are kept and resume on the next run", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stop_metrics:
+            stop_metrics()
+        engine.close()
+
+
+def run_queue_command(args):
+    from .jobqueue import JobQueue, read_urls
+    from .policy import QualityPolicy
+
+    queue = JobQueue()
+    try:
+        if args.action == "add":
+            if args.policy:
+                QualityPolicy.parse(args.policy) # Reject a bad policy now rather than when the jobs resolve
+            lines = [url for url in args.urls if url != "-"]
+            if "-" in args.urls or (not args.urls and not args.file and not sys.stdin.isatty()):
+                lines += sys.stdin
+            for path in args.file:
+                with open(path, encoding="utf-8") as f:
+                    lines += f.readlines()
+            urls, rejected = read_urls(lines)
+            for word in rejected:
+                print(f"warning: skipping '{word}', not a YouTube video or playlist URL", file=sys.stderr)
+            added = queue.add(urls, "audio" if args.audio else "video", args.quality, args.policy, args.out)
+            print(f"Added {added} of {len(urls)} URLs ({len(urls) - added} were already queued).")
+        elif args.action in ("status", "list"):
+            counts = queue.counts()
+            print("  ".join(f"{state}: {count}" for state, count in counts.items()))
+            if args.action == "list":
+                for job in queue.jobs(args.state):
+                    detail = job["error"] if job["state"] == "failed" else job["file_path"] or ""
+                    print(f"{job['id']:>6}  {job['state']:<11}  {job['title'] or job['url']}  {detail}".rstrip())
+        elif args.action == "retry":
+            print(f"Requeued {queue.retry_failed()} failed jobs.")
+        elif args.action == "clean":
+            print(f"Removed {queue.remove_finished()} finished jobs.")
+        else: # run
+            redraw = "\r" if sys.stderr.isatty() else ""
+
+            def on_event(event, data):
+                if event == "log" and not args.quiet:
+                    line = f"[{time.strftime('%H:%M:%S')}] {data['message']}"
+                    print(redraw + line.ljust(80) if redraw else line, file=sys.stderr)
+
+            engine = configure_engine(args, on_event)
+            try:
+                recovered = queue.recover()
+                if recovered:
+                    engine.log(f"Requeued {recovered} downloads interrupted by the previous run.")
+                stop_metrics = start_metrics(engine, args)
+                try:
+                    counts = with_progress(engine, args.quiet, engine.run_queue, queue)
+                finally:
+                    stop_metrics()
+            finally:
+                engine.close()
+            return 1 if counts["failed"] else 0
+        return 0
+    except KeyboardInterrupt:
+        print("\ninterrupted; the queue continues where it stopped on the next 'queue run'", file=sys.stderr)
+        return 130
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        queue.close()
+
+
+def run_daemon_command(args):
+    from .daemon import DownloadDaemon
+    from .jobqueue import JobQueue
+
+    def on_event(event, data):
+        if event == "log" and (not args.quiet or data["message"].startswith("ERROR")):
+            print(f"[{time.strftime('%H:%M:%S')}] {data['message']}", file=sys.stderr)
+
+    engine = queue = daemon = stop_metrics = None
+    try:
+        queue = JobQueue()
+        engine = configure_engine(args, on_event)
+        daemon = DownloadDaemon(engine, queue, args.host, args.port, args.out, args.policy)
+        stop_metrics = start_metrics(engine, args)
+        daemon.start()
+        while True:
+            time.sleep(3600) # Until Ctrl+C
+    except KeyboardInterrupt:
+        print("\nstopping; unfinished downloads continue when the daemon is started again", file=sys.stderr)
+        return 0
+    except (OSError, ValueError) as e: # E.g. the port is in use, or a bad --policy
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if daemon is not None:
+            daemon.stop()
+        if stop_metrics is not None:
+            stop_metrics()
+        if engine is not None:
+            engine.close()
+        if queue is not None:
+            queue.close()
+
+
+def run_verify_command(args):
+    from .integrity import MANIFEST_NAME, read_manifest, verify_file
+
+    files = read_manifest(args.directory)
+    if not files:
+        print(f"error: no checksum manifest ({MANIFEST_NAME}) in '{args.directory}'", file=sys.stderr)
+        return 1
+    problems = 0
+    for name, entry in sorted(files.items()):
+        status = verify_file(os.path.join(args.directory, name), entry, args.full)
+        problems += status != "ok"
+        print(f"{status:<8} {name}")
+    print(f"{len(files) - problems} of {len(files)} files intact.")
+    return 1 if problems else 0
+
+
+def configure_engine(args, on_event=None):
+    """Returns a DownloaderEngine set up from the options of build_engine_parser()."""
+    from .core import DownloaderEngine # pytubefix is only needed by the commands that download
+
+    engine = DownloaderEngine(on_event=on_event)
+    engine.download_workers = max(1, args.jobs)
+    engine.download_workers_per_host = max(1, args.jobs_per_host)
+    engine.download_segments = max(1, args.segments)
+    engine.bandwidth.set_rate(args.limit)
+    engine.bandwidth.set_job_rate(args.job_limit)
+    engine.bandwidth.set_schedule(args.schedule)
+    engine.reuse_downloads = not args.force
+    engine.media_retry.attempts = max(1, args.retries)
+    engine.metadata_retry.attempts = max(1, args.metadata_retries)
+    engine.fsync = args.fsync
+    engine.audio_format = args.audio_format
+    engine.audio_bitrate = args.audio_bitrate
+    return engine
+
+
+def start_metrics(engine, args):
+    """
+    Starts the metrics exports asked for with --metrics-file, --metrics-port and --trace.
+    Returns a function that writes the final values and stops them.
+    """
+    metrics = engine.metrics
+    if args.trace:
+        metrics.open_trace(args.trace)
+    server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    exporter = MetricsExporter(metrics, args.metrics_file).start() if args.metrics_file or args.trace else None
+
+    def stop():
+        if exporter:
+            exporter.stop()
+        if server:
+            server.shutdown()
+            server.server_close()
+        metrics.close_trace()
+    return stop
+
+
+def with_progress(engine, quiet, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs, control=...) on a worker thread while drawing a progress line on
+    stderr. Ctrl+C cancels the run's DownloadControl (keeping partial files) and waits up
+    to CANCEL_TIMEOUT for the worker to close its files and connections.
+    """
+    control = DownloadControl()
+    result = {}
+
+    def run():
+        try:
+            result["value"] = func(*args, **kwargs, control=control)
+        except BaseException as e:
+            result["error"] = e
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    if sys.stdin.isatty():
+        threading.Thread(target=read_commands, args=(engine, control), daemon=True).start()
+    draw = not quiet and sys.stderr.isatty()
+    try:
+        while worker.is_alive():
+            worker.join(PROGRESS_INTERVAL)
+            if draw:
+                print("\r" + format_progress(engine.progress.snapshot()), end="", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        control.cancel(keep_partial=True)
+        worker.join(CANCEL_TIMEOUT)
+        raise
+    if draw:
+        print(file=sys.stderr)
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def read_commands(engine, control):
+    """Applies commands typed while a download runs (see the module docstring)."""
+    for line in sys.stdin:
+        command, _, value = line.strip().partition(" ")
+        try:
+            if command == "limit":
+                engine.bandwidth.set_rate(parse_rate(value))
+                engine.log(f"Overall speed limit: {format_rate(engine.bandwidth.rate)}")
+            elif command == "job-limit":
+                engine.bandwidth.set_job_rate(parse_rate(value))
+                engine.log(f"Per-video speed limit: {format_rate(engine.bandwidth.job_rate)}")
+            elif command == "pause":
+                control.pause()
+                engine.log("Download paused.")
+            elif command == "resume":
+                control.resume()
+                engine.log("Download resumed.")
+            elif command:
+                engine.log(f"Unknown command '{command}'; use limit RATE, job-limit RATE, pause or resume.")
+        except ValueError as e:
+            engine.log(f"ERROR: {e}")
+
+
+def format_progress(snapshot):
+    """One-line summary of a ProgressTracker snapshot."""
+    text = (f"{snapshot['percent']:5.1f}%  {snapshot['downloaded'] / (1024 * 1024):.1f}/"
+            f"{snapshot['total'] / (1024 * 1024):.1f} MB  {snapshot['speed'] / (1024 * 1024):.2f} MB/s")
+    if snapshot["eta"] is not None:
+        text += f"  ETA {int(snapshot['eta']) // 60}:{int(snapshot['eta']) % 60:02d}"
+    if snapshot["active"] > 1:
+        text += f"  ({snapshot['active']} downloads)"
+    return text.ljust(79)
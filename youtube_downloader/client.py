@@ -0,0 +1,91 @@
+"""
+Client side of daemon mode (see daemon.py): where the daemon listens by default and
+DaemonClient for its HTTP/JSON API. Kept apart from the daemon itself so that the command
+line and the desktop app can talk to a daemon without loading pytubefix.
+"""
+import json
+import urllib.error
+import urllib.request
+
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 9471
+DAEMON_URL = f"http://{DAEMON_HOST}:{DAEMON_PORT}"
+# Seconds between the empty keep-alive lines the daemon sends on an otherwise idle event stream.
+EVENT_KEEPALIVE = 15
+
+
+class DaemonError(Exception):
+    """Raised by DaemonClient when the daemon can't be reached or rejects a request."""
+
+
+class DaemonClient:
+    """
+    Client of a running daemon's API (see the module docstring). Methods return the
+    decoded JSON answers and raise DaemonError when the daemon can't be reached or
+    rejects the request.
+    """
+    def __init__(self, url=DAEMON_URL, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload if payload is not None else {}).encode() if method == "POST" else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get("error")
+            except (OSError, ValueError, AttributeError):
+                message = None
+            raise DaemonError(message or f"The daemon answered {e.code} {e.reason}.") from e
+        except (OSError, ValueError) as e: # URLError is an OSError
+            raise DaemonError(f"Could not reach the daemon at {self.url}: {e}") from e
+
+    def status(self):
+        return self.request("GET", "/status")
+
+    def submit(self, urls, download_type="video", quality=None, policy=None, out_dir=None):
+        """Queues urls; returns {'added', 'jobs'} with the job ID of each URL (see DownloadDaemon.submit)."""
+        payload = {"urls": list(urls), "type": download_type, "quality": quality, "policy": policy, "out": out_dir}
+        return self.request("POST", "/jobs", {name: value for name, value in payload.items() if value is not None})
+
+    def jobs(self, state=None, ids=None):
+        query = [f"state={state}"] if state else []
+        if ids is not None:
+            query.append("ids=" + ",".join(str(job_id) for job_id in ids))
+        return self.request("GET", "/jobs" + ("?" + "&".join(query) if query else ""))["jobs"]
+
+    def job(self, job_id):
+        return self.request("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id):
+        return self.request("POST", f"/jobs/{job_id}/cancel")["cancelled"]
+
+    def set_policy(self, policy):
+        return self.request("POST", "/policy", {"policy": policy})["policy"]
+
+    def set_settings(self, **settings):
+        return self.request("POST", "/settings", settings)
+
+    def pause(self):
+        return self.request("POST", "/pause")
+
+    def resume(self):
+        return self.request("POST", "/resume")
+
+    def events(self, since=None):
+        """
+        Yields events as the daemon publishes them: those after seq since, or from now on.
+        Blocks in between; raises DaemonError when the connection is lost.
+        """
+        try:
+            with urllib.request.urlopen(self.url + "/events" + (f"?since={since}" if since is not None else ""),
+                                        timeout=EVENT_KEEPALIVE * 2) as response:
+                for line in response:
+                    if line.strip():
+                        yield json.loads(line)
+        except (OSError, ValueError) as e:
+            raise DaemonError(f"Lost the connection to the daemon at {self.url}: {e}") from e
@@ -0,0 +1,62 @@
+"""
+Cooperative pause/resume and cancellation for running downloads.
+"""
+import threading
+
+# How often (seconds) a paused download re-checks its token and its parent's.
+PAUSE_POLL_INTERVAL = 0.2
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a download once its DownloadControl has been cancelled."""
+
+
+class DownloadControl:
+    """
+    Token shared between whoever controls a download and the loops doing the work.
+    Download loops call checkpoint() between chunks: it blocks while the token (or its
+    parent, e.g. the whole playlist run) is paused and raises DownloadCancelled once either
+    is cancelled. keep_partial tells the downloader whether to keep the .part file of a
+    cancelled download so it can be resumed later.
+    """
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.keep_partial = False
+        self._running = threading.Event() # Cleared while paused
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self, keep_partial=False):
+        self.keep_partial = keep_partial
+        self._cancelled.set()
+        self._running.set() # Wake up paused workers so they can exit
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def paused(self):
+        return not self._running.is_set() or (self.parent is not None and self.parent.paused)
+
+    @property
+    def keeps_partial(self):
+        """Whether the cancellation that applies to this token wants partial files kept."""
+        if self._cancelled.is_set() or self.parent is None:
+            return self.keep_partial
+        return self.parent.keeps_partial
+
+    def checkpoint(self):
+        """Blocks while paused and raises DownloadCancelled if cancelled."""
+        while True:
+            if self.cancelled:
+                raise DownloadCancelled("Download cancelled.")
+            if not self.paused:
+                return
+            self._cancelled.wait(PAUSE_POLL_INTERVAL) # Wakes up early on our own cancel()
@@ -0,0 +1,1019 @@
+"""
+GUI-free downloader engine shared by the command line and the Tk app.
+Nothing in this module imports tkinter.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pytubefix import YouTube, Playlist
+
+from .cache import MetadataCache, CACHE_PATH
+from .index import DownloadIndex, INDEX_PATH
+from .integrity import file_digest, lookup_checksum, record_checksum
+from .metrics import Metrics
+from . import httppool
+from .control import DownloadCancelled, DownloadControl
+from .progress import ProgressTracker
+from .retry import CircuitBreaker, RetryPolicy, call_with_retry
+from .scheduler import (DownloadJob, DownloadScheduler, resolve_in_order, DOWNLOAD_WORKERS,
+                        DOWNLOAD_WORKERS_PER_HOST, PLAYLIST_FETCH_WORKERS, PLAYLIST_ITEM_TIMEOUT)
+from .mux import find_ffmpeg, mux
+from .audio import AUDIO_BITRATE, AUDIO_FORMAT, AudioConverter, can_copy
+from .throttle import BandwidthLimiter
+from .streams import (describe_streams, is_playlist_url, parse_selection, playlist_id_from_url,
+                      sanitize_filename, select_quality, stream_options_for, video_id_from_url)
+from .segmented import (PartialDownload, RangeNotSupportedError, SegmentedDownloader,
+                        DOWNLOAD_SEGMENTS, SEGMENT_THRESHOLD)
+
+# Quality policies are evaluated on batches of up to this many playlist videos, whose
+# stream lists are read from the metadata cache in one query.
+POLICY_BATCH_SIZE = 50
+# Queued URLs are looked up (and playlists expanded) this many at a time while a queue runs.
+QUEUE_RESOLVE_BATCH = 50
+
+
+def chain(future, callback):
+    """Returns a Future of callback(future), which is called once future is done."""
+    chained = Future()
+
+    def run(done):
+        try:
+            chained.set_result(callback(done))
+        except BaseException as e:
+            chained.set_exception(e)
+    future.add_done_callback(run)
+    return chained
+
+
+def completed(result):
+    """Returns a Future that already holds result."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class DownloaderEngine:
+    """
+    Fetches metadata, selects streams and downloads them, without any user interface.
+    fetch_video()/fetch_playlist() resolve metadata through the metadata cache,
+    select_quality() picks one of the returned options, and download_video()/
+    download_playlist() fetch the files. Byte progress is kept in self.progress for
+    callers to sample; log messages and finished jobs are sent to event listeners as
+    listener(event, data) with event 'log' ({'message'}) or 'job' ({'job'}, sent when a
+    playlist job starts and when it ends).
+    pause()/resume()/cancel() act on the download that is currently running, and
+    self.bandwidth (a BandwidthLimiter) caps its speed; both may be used from any thread.
+    Finished files are recorded in a DownloadIndex; while reuse_downloads is set, a video
+    that was already downloaded in the same quality is skipped or hard-linked instead.
+    Timings of the hot paths (URL parsing, YouTube() construction, stream filtering,
+    downloads and disk writes) and the byte, retry and failure counters go into
+    self.metrics (a Metrics registry) for export.
+    Transient network errors are retried with backoff: metadata requests according to
+    self.metadata_retry and media transfers (resuming from the last byte written) according
+    to self.media_retry. self.breaker holds every request back for a while when YouTube
+    keeps answering 403/429.
+    The engine's own range requests go through a shared keep-alive connection pool
+    (self.connections, through self.opener), so a playlist run does not pay for a new
+    TCP/TLS handshake per request. pytubefix's requests join the pool once the application
+    has installed it as urllib's opener (httppool.install(), as the command line, the
+    desktop app and the daemon do); the engine leaves the process-wide opener alone.
+    Audio-only downloads are saved as self.audio_format ('m4a', 'mp3' or 'opus'):
+    self.audio_converter stream-copies or transcodes (at self.audio_bitrate kbit/s) each
+    downloaded audio stream with ffmpeg while the next downloads are already running.
+    """
+    def __init__(self, on_event=None, cache=None, download_workers=DOWNLOAD_WORKERS,
+                 download_workers_per_host=DOWNLOAD_WORKERS_PER_HOST, download_segments=DOWNLOAD_SEGMENTS,
+                 playlist_fetch_workers=PLAYLIST_FETCH_WORKERS, playlist_item_timeout=PLAYLIST_ITEM_TIMEOUT,
+                 bandwidth=None, index=None, metrics=None):
+        self.download_workers = download_workers # Concurrent playlist downloads
+        self.download_workers_per_host = download_workers_per_host # Concurrent downloads from one media host
+        self.download_segments = download_segments # Parallel connections for one large stream
+        self.playlist_fetch_workers = playlist_fetch_workers # Concurrent playlist entry lookups
+        self.playlist_item_timeout = playlist_item_timeout # Seconds before a playlist entry is skipped
+        self.progress = ProgressTracker()
+        self.fetched_yt = (None, None) # (URL, YouTube object) built by the last network fetch
+        self.control = DownloadControl() # Token of the current (or last) download run
+        self.bandwidth = bandwidth or BandwidthLimiter() # Global and per-job speed caps
+        self.ffmpeg = find_ffmpeg() # Needed to merge adaptive (1080p and up) video with audio
+        self.metrics = metrics or Metrics()
+        self.metadata_retry = RetryPolicy.metadata() # Retries of watch page / player / playlist requests
+        self.media_retry = RetryPolicy.media() # Retries of a stream's range requests
+        self.breaker = CircuitBreaker(on_open=self.on_throttled)
+        self.connections = httppool.POOL
+        self.opener = httppool.build_opener(self.connections)
+        self.fsync = "off" # When downloads fsync their files, see writer.FSYNC_POLICIES
+        self.audio_format = AUDIO_FORMAT # Format of audio-only downloads, see audio.AUDIO_FORMATS
+        self.audio_bitrate = AUDIO_BITRATE # kbit/s when the audio has to be transcoded
+        self.audio_converter = AudioConverter(ffmpeg=self.ffmpeg, metrics=self.metrics)
+        self.metrics.add_collector(self.collect_connection_stats)
+        self._listeners = []
+        self._listeners_lock = threading.Lock()
+        self._lookups = {} # video ID -> Future of a YouTube() lookup in flight
+        self._lookups_lock = threading.Lock()
+        if on_event is not None:
+            self.subscribe(on_event)
+        if cache is None:
+            try:
+                cache = MetadataCache()
+            except (OSError, sqlite3.Error) as e:
+                self.log(f"WARNING: Could not open the metadata cache at '{CACHE_PATH}', using a temporary one. Error: {e}")
+                cache = MetadataCache(":memory:")
+        self.metadata_cache = cache
+        if index is None:
+            try:
+                index = DownloadIndex()
+            except (OSError, sqlite3.Error) as e:
+                self.log(f"WARNING: Could not open the download index at '{INDEX_PATH}', using a temporary one. Error: {e}")
+                index = DownloadIndex(":memory:")
+        self.downloads_index = index
+        self.reuse_downloads = True # Skip (or hard-link) videos already downloaded in the same quality
+
+    def subscribe(self, listener):
+        """Registers listener(event, data); it is called from whichever thread emits the event."""
+        with self._listeners_lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._listeners_lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def emit(self, event, **data):
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event, data)
+
+    def log(self, message):
+        self.emit("log", message=message)
+
+    def close(self):
+        self.audio_converter.shutdown()
+        self.metadata_cache.close()
+        self.downloads_index.close()
+
+    def pause(self):
+        self.control.pause()
+        self.log("Download paused.")
+
+    def resume(self):
+        self.control.resume()
+        self.log("Download resumed.")
+
+    def cancel(self, keep_partial=False):
+        """Stops the running download. Partial files are removed unless keep_partial is set."""
+        self.control.cancel(keep_partial)
+
+    def on_throttled(self, seconds):
+        """Called by self.breaker when it opens."""
+        self.metrics.inc("circuit_breaker_trips_total")
+        self.log(f"WARNING: YouTube is throttling requests (HTTP 403/429). Holding all requests back for {seconds:.0f}s.")
+
+    def collect_connection_stats(self, metrics):
+        stats = self.connections.stats()
+        for outcome in ("hits", "misses", "stale"):
+            metrics.set_counter(f"connection_pool_{outcome}_total", stats[outcome])
+        metrics.set_gauge("connection_pool_open", stats["open"])
+        metrics.set_gauge("connection_pool_idle", stats["idle"])
+
+    def log_connection_stats(self, before):
+        """Logs how many connections were reused and opened since the connections.stats() before."""
+        stats = self.connections.stats()
+        hits, misses = stats["hits"] - before["hits"], stats["misses"] - before["misses"]
+        if hits + misses:
+            self.log(f"Connections: {hits} of {hits + misses} requests reused an open connection, {misses} new ones were opened.")
+
+    def retry_metadata(self, func, what, control=None):
+        """Returns func() (a metadata request for what), retried according to self.metadata_retry."""
+        def on_retry(attempt, delay, error):
+            self.metrics.inc("retries_total", reason="metadata")
+            self.log(f"WARNING: Could not fetch {what} (attempt {attempt} of {self.metadata_retry.attempts}). "
+                     f"Retrying in {delay:.1f}s. Error: {error}")
+        return call_with_retry(func, self.metadata_retry, self.breaker, control, on_retry)
+
+    def connect(self, video_url, control=None):
+        """Returns the YouTube object for video_url with its details and streams loaded, retrying transient errors."""
+        def fetch():
+            with self.metrics.span("youtube_init", url=video_url):
+                yt = YouTube(video_url)
+                yt.streams # pytubefix fetches the video's details on first access and keeps them
+            return yt
+        return self.retry_metadata(fetch, f"'{video_url}'", control)
+
+    def media_retry_logger(self, filename):
+        """Returns the on_retry callback for the transfers of filename."""
+        def on_retry(offset, attempt, delay, error):
+            self.metrics.inc("retries_total", reason="media")
+            self.log(f"WARNING: Download of '{filename}' interrupted at {offset / (1024 * 1024):.2f} MB "
+                     f"(attempt {attempt} of {self.media_retry.attempts}). Resuming in {delay:.1f}s. Error: {error}")
+        return on_retry
+
+    # --- Fetch ---
+
+    def lookup_video(self, video_url):
+        """
+        Returns (info, yt) for a video, where info is {'video_id', 'title', 'length', 'streams'}
+        (length in seconds, None if unknown).
+        Served from the metadata cache when possible (yt is then None); otherwise the
+        YouTube object that was built is returned as well so it can be reused. Concurrent
+        lookups of the same video share one request (the callers that waited get yt None).
+        """
+        with self.metrics.span("url_parse"):
+            video_id = video_id_from_url(video_url)
+        info = self.metadata_cache.get_video(video_id)
+        if info is not None:
+            self.metrics.inc("metadata_lookups_total", source="cache")
+            return info, None
+        with self._lookups_lock:
+            in_flight = self._lookups.get(video_id) if video_id else None
+            if in_flight is None:
+                lookup = self._lookups[video_id] = Future()
+        if in_flight is not None:
+            self.metrics.inc("metadata_lookups_total", source="shared")
+            return in_flight.result(), None
+        try:
+            self.metrics.inc("metadata_lookups_total", source="network")
+            yt = self.connect(video_url)
+            with self.metrics.span("stream_filter", video_id=video_id):
+                streams = describe_streams(yt.streams)
+            info = {"video_id": yt.video_id, "title": yt.title, "length": yt.length, "streams": streams}
+            self.metadata_cache.put_video(info["video_id"], info["title"], info["streams"], info["length"])
+            lookup.set_result(info)
+            return info, yt
+        except BaseException as e:
+            self.metrics.inc("failures_total", stage="lookup")
+            lookup.set_exception(e)
+            raise
+        finally:
+            with self._lookups_lock:
+                self._lookups.pop(video_id, None)
+
+    def iter_playlist(self, url):
+        """
+        Returns (title, video_urls) for a playlist, where video_urls is a generator that
+        fetches the playlist's continuation pages only as it is consumed. Served from the
+        metadata cache when possible; a listing is cached once it has been read to the end.
+        """
+        playlist_id = playlist_id_from_url(url)
+        cached = self.metadata_cache.get_playlist(playlist_id)
+        if cached is not None:
+            return cached["title"], (f"https://www.youtube.com/watch?v={video_id}" for video_id in cached["video_ids"])
+        def open_playlist():
+            pl = Playlist(url)
+            return pl, pl.title
+        # Only the first page is retried; continuation pages are fetched by pytubefix as video_urls is consumed
+        pl, title = self.retry_metadata(open_playlist, f"playlist '{url}'")
+
+        def video_urls():
+            video_ids = []
+            for video_url in pl.url_generator():
+                video_ids.append(video_id_from_url(video_url))
+                yield video_url
+            self.metadata_cache.put_playlist(playlist_id, title, video_ids)
+        return title, video_urls()
+
+    def lookup_playlist(self, url):
+        """Returns (title, video_urls) for a playlist, with every page fetched."""
+        title, video_urls = self.iter_playlist(url)
+        return title, list(video_urls)
+
+    def fetch_video(self, url, download_type="video"):
+        """
+        Fetches a single video's details. Returns a dict with 'url', 'video_id', 'title',
+        'length', 'streams' and 'options', the (itag, description) quality choices for download_type
+        ('video' or 'audio'), best first.
+        """
+        self.log(f"Connecting to URL: {url}")
+        info, yt = self.lookup_video(url)
+        if yt is not None:
+            self.fetched_yt = (url, yt) # Reused by download_video instead of connecting again
+            self.log(f"Successfully connected. Video Title: '{info['title']}'")
+        else:
+            self.log(f"Loaded from cache. Video Title: '{info['title']}'")
+        if download_type == "video":
+            if self.ffmpeg:
+                self.log("Fetching available video streams (progressive MP4, and adaptive MP4 merged with ffmpeg)...")
+            else:
+                self.log("Fetching available video streams (progressive MP4; install ffmpeg for 1080p and up)...")
+        else: # audio
+            self.log("Fetching available audio streams (MP4)...")
+        with self.metrics.span("stream_filter", video_id=info["video_id"]):
+            options = stream_options_for(download_type, info["streams"], adaptive=self.ffmpeg is not None)
+        return {**info, "url": url, "options": options}
+
+    def stream_playlist(self, url):
+        """
+        Opens a playlist without reading all of it. Returns a dict with 'url', 'title',
+        'options' (the quality choices of the first video), 'empty' and 'entries', a
+        generator of (index, video_url, info, error) in playlist order: info is the
+        lookup_video() dict, or None if the entry could not be resolved (error says why).
+        Playlist pages are fetched and their videos looked up only as entries is consumed,
+        so work on the first videos can start while later pages are still unknown.
+        """
+        self.log(f"Connecting to URL: {url}")
+        playlist_title, video_urls = self.iter_playlist(url)
+        self.log(f"Successfully connected. Playlist Title: '{playlist_title}'")
+        first_url = next(video_urls, None)
+        result = {"url": url, "title": playlist_title, "options": [], "empty": first_url is None, "entries": iter(())}
+        if first_url is None:
+            return result
+
+        # Fetch details for the first video to get quality options
+        first_info, _ = self.lookup_video(first_url)
+        self.log(f"Fetching sample quality options from first video: '{first_info['title']}'")
+        result["options"] = stream_options_for("playlist", first_info["streams"], adaptive=self.ffmpeg is not None)
+        self.log("Fetching video details as the playlist pages in...")
+        result["entries"] = self.resolve_playlist_entries(itertools.chain([first_url], video_urls))
+        return result
+
+    def resolve_playlist_entries(self, video_urls):
+        """Looks up video_urls concurrently, yielding (index, video_url, info, error) in order."""
+        resolved = failed = 0
+        entries = resolve_in_order(video_urls, lambda video_url: self.lookup_video(video_url)[0],
+                                   max_workers=self.playlist_fetch_workers,
+                                   item_timeout=self.playlist_item_timeout)
+        for i, video_url, info, error in entries:
+            if error is None:
+                resolved += 1
+            else:
+                failed += 1
+                self.log(f"WARNING: Could not fetch details for video {i+1} in playlist. Skipping. Error: {error}")
+            yield i, video_url, info, error
+        self.log(f"Successfully fetched titles for {resolved} of {resolved + failed} videos in the playlist.")
+
+    def fetch_playlist(self, url, on_entry=None):
+        """
+        Fetches a playlist and the titles of all its videos. Returns a dict with 'url', 'title',
+        'entries' and 'options'. entries holds (video URL, title) in playlist order, or
+        (None, None) for videos that could not be resolved; options are the quality choices
+        of the first video. on_entry(index, video_url, info, error) is called for every
+        entry, in order, as soon as it is resolved (see stream_playlist()).
+        """
+        playlist = self.stream_playlist(url)
+        result = {"url": url, "title": playlist["title"], "entries": [], "options": playlist["options"]}
+        for i, video_url, info, error in playlist["entries"]:
+            # Failed entries keep a placeholder so entry indices still match the playlist
+            result["entries"].append((video_url, info["title"]) if error is None else (None, None))
+            if on_entry:
+                on_entry(i, video_url, info, error)
+        return result
+
+    def plan_playlist(self, videos, policy, batch_size=POLICY_BATCH_SIZE):
+        """
+        Picks every video's stream with policy (a QualityPolicy) before anything is downloaded.
+        videos are (video URL, title) pairs and may be a generator. They are taken in batches
+        (growing from 1 to batch_size, so the first download is not held up) whose stream
+        lists come from a single metadata cache query; only videos missing from the cache
+        are looked up online. Yields (video_url, title, choice, error) in order: choice is
+        the QualityPolicy.choose() dict, or None if no rule matched or the lookup failed.
+        """
+        videos = iter(videos)
+        size = 1
+        while batch := list(itertools.islice(videos, size)):
+            size = min(size * 2, batch_size)
+            cached = self.metadata_cache.get_videos(video_id_from_url(video_url) for video_url, _ in batch)
+            missing = [video_url for video_url, _ in batch if video_id_from_url(video_url) not in cached]
+            looked_up = {video_url: (info, error) for _, video_url, info, error in
+                         resolve_in_order(missing, lambda video_url: self.lookup_video(video_url)[0],
+                                          max_workers=self.playlist_fetch_workers,
+                                          item_timeout=self.playlist_item_timeout)}
+            for video_url, title in batch:
+                info = cached.get(video_id_from_url(video_url))
+                error = None
+                if info is None:
+                    info, error = looked_up[video_url]
+                choice = policy.choose(info["streams"], adaptive=self.ffmpeg is not None) if error is None else None
+                yield video_url, title, choice, error
+
+    # --- Download ---
+
+    def download_video(self, url, itag, path, download_type="video", control=None):
+        """
+        Downloads one video (or its audio) in the stream itag to path. Returns the file path.
+        Raises DownloadCancelled if control (by default a new token), which pause()/resume()/
+        cancel() act on while it runs, is cancelled.
+        """
+        control = self.control = control or DownloadControl()
+        self.metrics.add_gauge("active_downloads", 1)
+        status = "failed"
+        try:
+            file_path = self.download_one(url, itag, path, download_type, control)
+            status = "done"
+            return file_path
+        except DownloadCancelled:
+            status = "cancelled"
+            raise
+        finally:
+            self.metrics.add_gauge("active_downloads", -1)
+            self.metrics.inc("downloads_total", status=status)
+            if status == "failed":
+                self.metrics.inc("failures_total", stage="download")
+
+    def download_one(self, url, itag, path, download_type, control, wait=True):
+        """
+        download_video() without making control the engine's current token (used by queue
+        workers). Without wait, returns a Future of the file path as soon as the download
+        itself is done; for audio, it completes once the audio has been converted.
+        """
+        fetched_url, yt = self.fetched_yt
+        if yt is None or fetched_url != url:
+            yt = self.connect(url, control) # Options came from the metadata cache; connect now for the stream URLs
+        on_progress = lambda done, total: self.progress.update(url, done, total)
+        throttle = self.bandwidth.for_job(control)
+        yt.register_on_progress_callback(self.stream_progress_callback(on_progress, control, throttle, self.metrics))
+
+        video_itag, audio_itag = parse_selection(itag)
+        with self.metrics.span("stream_filter", url=url, itag=itag):
+            selected_stream = yt.streams.get_by_itag(video_itag)
+            audio_stream = yt.streams.get_by_itag(audio_itag) if audio_itag else None
+        if not selected_stream or (audio_itag and not audio_stream):
+            raise ValueError(f"Stream {itag} is not available for '{yt.title}'.")
+
+        file_extension = self.file_extension(download_type)
+        quality_info = selected_stream.resolution if download_type == "video" else selected_stream.abr
+        
+        # Ensure quality_info is a string, handle None or missing attributes
+        quality_info_str = str(quality_info) if quality_info else "unknown_quality"
+
+        sanitized_title = sanitize_filename(yt.title)
+        filename = f"1-{sanitized_title}-{quality_info_str}.{file_extension}"
+        index_key = self.index_key(itag, download_type)
+        existing = self.reuse_download(yt.video_id, index_key, os.path.join(path, filename))
+        if existing:
+            return existing if wait else completed(existing)
+
+        digest = None # Computed while downloading a single stream
+
+        def finished(file_path):
+            self.log(f"SUCCESS: Download complete for '{yt.title}'. Saved as '{filename}'.")
+            self.record_download(yt.video_id, index_key, file_path, digest)
+            return file_path
+
+        self.log(f"Starting download for: '{yt.title}' at {quality_info_str} as '{filename}'")
+        try:
+            with self.metrics.span("download", video_id=yt.video_id, itag=itag):
+                if download_type == "audio":
+                    converting = self.download_audio(selected_stream, path, filename, on_progress, yt.video_id, control, throttle)
+                elif audio_stream:
+                    self.download_adaptive(selected_stream, audio_stream, path, filename, on_progress, yt.video_id, control, throttle)
+                    converting = completed(os.path.join(path, filename))
+                else:
+                    digest = self.download_stream(selected_stream, path, filename, on_progress, yt.video_id, control, throttle)
+                    converting = completed(os.path.join(path, filename))
+        except DownloadCancelled:
+            self.log(f"Download of '{yt.title}' cancelled.")
+            raise
+        finally:
+            self.progress.finish(url)
+        result = chain(converting, lambda future: finished(future.result()))
+        return result.result() if wait else result
+
+    def file_extension(self, download_type):
+        """Extension of the files saved for download_type ('video' or 'audio')."""
+        if download_type != "audio":
+            return "mp4"
+        return self.audio_format if self.ffmpeg else "m4a" # Without ffmpeg, audio stays in its MP4 container
+
+    def index_key(self, itag, download_type):
+        """The selection recorded in the download index: audio saved in another format is a different file."""
+        if download_type != "audio":
+            return itag
+        extension = self.file_extension("audio")
+        return f"{itag}.{extension}" if extension == "m4a" else f"{itag}.{extension}@{self.audio_bitrate}k"
+
+    def reuse_download(self, video_id, itag, file_path, prefix=""):
+        """
+        Looks video_id/itag up in the download index. Returns the path of a finished copy
+        to use instead of downloading file_path (hard-linked there when possible), or None.
+        """
+        if not self.reuse_downloads:
+            return None
+        try:
+            how, existing = self.downloads_index.reuse(video_id, itag, file_path)
+        except (OSError, sqlite3.Error) as e:
+            self.log(f"{prefix}WARNING: Could not check the download index. Error: {e}")
+            return None
+        if how == "exists":
+            self.log(f"{prefix}Already downloaded: '{os.path.basename(file_path)}'. Skipping.")
+            return file_path
+        if how == "linked":
+            self.log(f"{prefix}Already downloaded as '{existing}'. Hard-linked to '{os.path.basename(file_path)}'.")
+            entry = lookup_checksum(existing)
+            if entry is not None:
+                self.record_checksum(video_id, itag, file_path, entry["digest"])
+            return file_path
+        if how == "elsewhere":
+            self.log(f"{prefix}Already downloaded as '{existing}' (on another drive). Skipping.")
+            return existing
+        return None
+
+    def record_download(self, video_id, itag, file_path, digest=None):
+        """
+        Adds a finished file to the download index, so it is never fetched twice, and to the
+        checksum manifest of its folder. digest is the one computed while downloading; files
+        made some other way (merged, converted, pytubefix's own download) are hashed here.
+        """
+        try:
+            digest = digest or file_digest(file_path)
+            self.downloads_index.record(video_id, itag, file_path, digest)
+        except (OSError, sqlite3.Error) as e:
+            self.log(f"WARNING: Could not add '{os.path.basename(file_path)}' to the download index. Error: {e}")
+            return
+        self.record_checksum(video_id, itag, file_path, digest)
+
+    def record_checksum(self, video_id, itag, file_path, digest):
+        try:
+            record_checksum(file_path, digest, video_id=video_id, itag=str(itag))
+        except OSError as e:
+            self.log(f"WARNING: Could not update the checksum manifest of '{os.path.dirname(file_path)}'. Error: {e}")
+
+    @staticmethod
+    def stream_progress_callback(on_progress, control, throttle=None, metrics=None):
+        """
+        Returns a pytubefix on_progress callback for the stream.download fallback; it reports
+        progress, applies throttle and honours control between chunks (pytubefix lets the
+        exception through). The chunks are counted in metrics' downloaded_bytes_total.
+        """
+        def callback(stream, chunk, bytes_remaining):
+            if metrics is not None:
+                metrics.inc("downloaded_bytes_total", len(chunk))
+            on_progress(stream.filesize - bytes_remaining, stream.filesize)
+            if throttle:
+                throttle(len(chunk))
+            control.checkpoint()
+        return callback
+
+    def download_stream(self, stream, path, filename, on_progress, video_id=None, control=None, throttle=None):
+        """
+        Downloads a stream into path/filename through a resumable '.part' file.
+        Large streams are split over parallel range requests; an interrupted attempt at
+        the same file is resumed from its manifest. on_progress(bytes_downloaded, filesize)
+        is called as data arrives. Falls back to stream.download when ranges can't be used.
+        control (a DownloadControl) can pause or cancel the transfer between chunks, and
+        throttle(nbytes) (see BandwidthLimiter.for_job) limits its speed.
+        Returns the file's digest (see integrity) when it was computed while downloading,
+        otherwise None. A file that doesn't have the stream's size raises IOError.
+        """
+        if control is not None:
+            control.checkpoint()
+        on_retry = self.media_retry_logger(filename)
+
+        def download_sequentially():
+            # pytubefix's own download can't resume: each retry of it starts the file over
+            call_with_retry(lambda: stream.download(output_path=path, filename=filename), self.media_retry,
+                            self.breaker, control, lambda attempt, delay, error: on_retry(0, attempt, delay, error))
+            size = os.path.getsize(os.path.join(path, filename))
+            if stream.filesize and size != stream.filesize:
+                raise IOError(f"Incomplete download: '{filename}' has {size} of {stream.filesize} bytes.")
+
+        if not stream.filesize:
+            download_sequentially()
+            return None
+        os.makedirs(path, exist_ok=True)
+        file_path = os.path.join(path, filename)
+        segments = self.download_segments if stream.filesize >= SEGMENT_THRESHOLD else 1
+        state = PartialDownload.open(file_path, stream.filesize, stream.url, stream.itag, video_id)
+        if state.completed_bytes:
+            self.log(f"Resuming '{filename}': {state.completed_bytes / (1024 * 1024):.2f} of {stream.filesize / (1024 * 1024):.2f} MB already on disk.")
+        if segments > 1:
+            self.log(f"Using {segments} parallel connections for {stream.filesize / (1024 * 1024):.2f} MB.")
+        try:
+            downloader = SegmentedDownloader(segments, throttle=throttle, metrics=self.metrics, retry=self.media_retry,
+                                             breaker=self.breaker, on_retry=on_retry, fsync=self.fsync,
+                                             opener=self.opener)
+            downloader.download(stream.url, state, on_progress, control)
+            return state.digest
+        except RangeNotSupportedError as e:
+            self.log(f"WARNING: {e} Retrying over a single connection.")
+            self.metrics.inc("retries_total", reason="range_not_supported")
+            state.discard()
+            download_sequentially()
+            return None
+
+    def download_adaptive(self, video_stream, audio_stream, path, filename, on_progress, video_id=None, control=None,
+                          throttle=None):
+        """
+        Downloads an adaptive video-only and audio-only stream at the same time, then merges
+        them into path/filename with ffmpeg (stream copy, no re-encode). The separate parts
+        are resumable like any other download and are removed once the merge succeeds.
+        on_progress(bytes_downloaded, total) covers both parts together.
+        """
+        base = os.path.splitext(filename)[0]
+        parts = [(video_stream, f"{base}.f{video_stream.itag}.video.{video_stream.subtype}"),
+                 (audio_stream, f"{base}.f{audio_stream.itag}.audio.{'m4a' if audio_stream.subtype == 'mp4' else audio_stream.subtype}")]
+        total = (video_stream.filesize or 0) + (audio_stream.filesize or 0)
+        done = {}
+        lock = threading.Lock()
+
+        def part_progress(itag):
+            def update(part_done, part_total):
+                with lock:
+                    done[itag] = part_done
+                    downloaded = sum(done.values())
+                on_progress(downloaded, total)
+            return update
+
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [executor.submit(self.download_stream, stream, path, part_name, part_progress(stream.itag), video_id, control, throttle)
+                       for stream, part_name in parts]
+            for future in futures:
+                future.result()
+
+        self.log(f"Merging video and audio into '{filename}' (stream copy)...")
+        part_paths = [os.path.join(path, part_name) for _, part_name in parts]
+        mux(part_paths[0], part_paths[1], os.path.join(path, filename), self.ffmpeg)
+        for part_path in part_paths:
+            os.remove(part_path)
+
+    def download_audio(self, stream, path, filename, on_progress, video_id=None, control=None, throttle=None):
+        """
+        Downloads an audio-only stream into path/filename, in the format its extension names
+        (see file_extension()). The stream is downloaded next to it first, resumable like any
+        other download, then handed to self.audio_converter to be stream-copied or transcoded.
+        Returns a Future of the file path, done once the conversion is; the download worker
+        doesn't wait for it. A downloaded stream left by an earlier run is converted without
+        fetching it again.
+        """
+        file_path = os.path.join(path, filename)
+        audio_format = os.path.splitext(filename)[1].lstrip(".")
+        if self.ffmpeg is None:
+            if self.audio_format != audio_format:
+                self.log(f"WARNING: ffmpeg was not found, so '{filename}' is saved as {audio_format.upper()} "
+                         f"instead of {self.audio_format.upper()}.")
+            self.download_stream(stream, path, filename, on_progress, video_id, control, throttle)
+            return completed(file_path)
+        source_name = f"{os.path.splitext(filename)[0]}.f{stream.itag}.audio.{'m4a' if stream.subtype == 'mp4' else stream.subtype}"
+        source_path = os.path.join(path, source_name)
+        if stream.filesize and os.path.isfile(source_path) and os.path.getsize(source_path) == stream.filesize:
+            self.log(f"The audio of '{filename}' was already downloaded by an earlier run.")
+        else:
+            self.download_stream(stream, path, source_name, on_progress, video_id, control, throttle)
+        if can_copy(stream.audio_codec, audio_format):
+            self.log(f"Saving the audio as '{filename}' (stream copy)...")
+        else:
+            self.log(f"Converting the audio to {audio_format.upper()} at {self.audio_bitrate} kbit/s: '{filename}'...")
+        return self.audio_converter.submit(source_path, file_path, self.audio_bitrate, stream.audio_codec, control)
+
+    def download_playlist(self, videos, itag, quality_label, path, control=None, policy=None):
+        """
+        Downloads videos, (video URL, title) pairs, in stream itag (falling back to the
+        highest progressive resolution per video) using a DownloadScheduler. videos may be
+        a generator (e.g. fed by stream_playlist()): each video is queued once it has arrived
+        and a worker is free for it, so a cancel never has a backlog to drain. quality_label (e.g. '720p') goes into the filenames. Returns the DownloadJobs.
+        With policy (a QualityPolicy), itag and quality_label are not used: each video's
+        stream is picked by the policy from its own cached stream list (see plan_playlist()),
+        the matching rule is logged and kept in job.rule, and videos no rule fits are skipped.
+        Every job gets its own DownloadControl (job.control) under control, the token of the
+        whole run that pause()/resume()/cancel() act on; cancelled jobs end as 'cancelled'.
+        """
+        control = self.control = control or DownloadControl()
+        total_videos = len(videos) if hasattr(videos, "__len__") else "?" # Unknown while a playlist streams in
+        if total_videos == "?":
+            self.log(f"--- Starting playlist download; videos are queued as the playlist loads ({self.download_workers} at a time) ---")
+        else:
+            self.log(f"--- Starting playlist download for {total_videos} selected videos ({self.download_workers} at a time) ---")
+        self.progress.reset()
+        connection_stats = self.connections.stats()
+
+        scheduler = DownloadScheduler(self.download_workers, self.download_workers_per_host, progress=self.progress,
+                                      metrics=self.metrics)
+        slots = threading.Semaphore(self.download_workers) # A job is queued only when a worker is free for it
+        jobs = []
+        reused = []
+        selections = {} # job -> (video URL, itag, quality label, download type)
+        if policy is not None:
+            self.log(f"Choosing each video's quality with the policy '{policy}'.")
+            planned = self.plan_playlist(videos, policy)
+        else:
+            planned = ((video_url, title, None, None) for video_url, title in videos)
+
+        def queue_jobs():
+            # Job numbers are fixed here, so filenames don't depend on which download finishes first.
+            # Videos already downloaded in this quality are settled before they are queued.
+            for i, (video_url, title, choice, error) in enumerate(planned):
+                if control.cancelled:
+                    return
+                job = DownloadJob(i + 1, title, DownloadControl(parent=control))
+                jobs.append(job)
+                prefix = f"[{job.number}/{total_videos}] "
+                if policy is None:
+                    selections[job] = (video_url, itag, quality_label, "video")
+                elif choice is None:
+                    job.status, job.error = ("failed", error) if error else ("skipped", None)
+                    if not error:
+                        self.log(f"{prefix}WARNING: No rule of the quality policy matches '{title}'. Skipping.")
+                    self.emit("job", job=job)
+                    continue
+                else:
+                    job.rule = choice["rule"]
+                    selections[job] = (video_url, choice["itag"], choice["label"], choice["download_type"])
+                    self.log(f"{prefix}Rule {choice['rule']} ('{choice['rule_text']}') picked {choice['label']} "
+                             f"(itag {choice['itag']}) for '{title}'.")
+                _, job_itag, job_label, job_type = selections[job]
+                filename = f"{job.number}-{sanitize_filename(job.title)}-{job_label}.{self.file_extension(job_type)}"
+                if self.reuse_download(video_id_from_url(video_url), self.index_key(job_itag, job_type),
+                                       os.path.join(path, filename), prefix=prefix):
+                    job.status = "done"
+                    reused.append(job)
+                    self.emit("job", job=job)
+                    continue
+                slots.acquire()
+                if control.cancelled:
+                    job.status = "cancelled"
+                    self.emit("job", job=job)
+                    return
+                yield job
+
+        def finish(job, converting):
+            try:
+                converting.result()
+            except DownloadCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = e
+            self.emit("job", job=job)
+
+        def work(job):
+            self.emit("job", job=job)
+            video_url, job_itag, job_label, job_type = selections[job]
+            try:
+                converting = self.download_playlist_item(scheduler, job, video_url, job_itag, job_label, path,
+                                                         total_videos, job_type, policy)
+            except DownloadCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = e
+            else:
+                if converting is not None: # The worker moves on to the next download meanwhile
+                    job.status = "converting"
+                    self.emit("job", job=job)
+                    return chain(converting, lambda future: finish(job, future))
+            finally:
+                slots.release() # The next job may download while this one's audio is converted
+            self.emit("job", job=job)
+
+        scheduler.run(queue_jobs(), work)
+        total_videos = len(jobs)
+        for job in jobs:
+            if job.status == "failed":
+                self.log(f"[{job.number}/{total_videos}] ERROR: Could not download '{job.title}'. Skipping.")
+                self.log(f"--> Exception: {job.error}")
+
+        downloaded, _ = scheduler.progress()
+        succeeded = sum(1 for job in jobs if job.status == "done")
+        cancelled = sum(1 for job in jobs if job.status == "cancelled")
+        if cancelled:
+            self.log(f"--- Playlist download cancelled: {cancelled} of {total_videos} videos were not finished. ---")
+        if policy is not None:
+            self.log("Quality policy: " + ", ".join(
+                f"rule {number} ('{rule}') matched {sum(1 for job in jobs if job.rule == number)}"
+                for number, rule in enumerate(policy.rules, start=1))
+                + f", no rule matched {sum(1 for job in jobs if job.rule is None and job.status == 'skipped')}.")
+        self.log_connection_stats(connection_stats)
+        reused = f" ({len(reused)} already downloaded)" if reused else ""
+        self.log(f"--- Playlist download complete! {succeeded}/{total_videos} videos{reused}, "
+                 f"{downloaded / (1024 * 1024):.2f} MB at {scheduler.throughput() / (1024 * 1024):.2f} MB/s ---")
+        return jobs
+
+    def download_playlist_item(self, scheduler, job, video_url, selected_itag, quality_info, path, total_videos,
+                               download_type="video", policy=None):
+        """
+        Downloads one playlist video; runs on a DownloadScheduler worker thread. If the stream
+        picked by policy has disappeared since its stream list was cached, the policy is
+        applied again to the current streams instead of the generic fallback.
+        Returns a Future while the audio of an audio-only download is still being converted
+        (the job is done once it completes), otherwise None.
+        """
+        i = job.number - 1
+        job.control.checkpoint() # Queued jobs wait here while the run is paused
+        video_yt_obj = self.connect(video_url, job.control)
+        sanitized_title = sanitize_filename(video_yt_obj.title)
+        video_itag, audio_itag = parse_selection(selected_itag)
+        with self.metrics.span("stream_filter", video_id=video_yt_obj.video_id, itag=selected_itag):
+            stream = video_yt_obj.streams.get_by_itag(video_itag)
+            audio_stream = video_yt_obj.streams.get_by_itag(audio_itag) if audio_itag else None
+
+        if policy is not None and not (stream and (audio_stream or not audio_itag)):
+            streams = describe_streams(video_yt_obj.streams)
+            self.metadata_cache.put_video(video_yt_obj.video_id, video_yt_obj.title, streams, video_yt_obj.length)
+            choice = policy.choose(streams, adaptive=self.ffmpeg is not None)
+            if choice is None:
+                self.log(f"[{i+1}/{total_videos}] WARNING: The streams of '{video_yt_obj.title}' changed and no rule of the quality policy matches any more. Skipping.")
+                job.rule = None
+                job.status = "skipped"
+                return
+            self.log(f"[{i+1}/{total_videos}] The streams of '{video_yt_obj.title}' changed; rule {choice['rule']} now picks {choice['label']} (itag {choice['itag']}).")
+            self.metrics.inc("retries_total", reason="streams_changed")
+            job.rule = choice["rule"]
+            selected_itag, quality_info, download_type = choice["itag"], choice["label"], choice["download_type"]
+            if self.reuse_download(video_yt_obj.video_id, self.index_key(selected_itag, download_type),
+                                   os.path.join(path, f"{i+1}-{sanitized_title}-{quality_info}.{self.file_extension(download_type)}"),
+                                   prefix=f"[{i+1}/{total_videos}] "):
+                job.status = "done"
+                return
+            video_itag, audio_itag = parse_selection(selected_itag)
+            stream = video_yt_obj.streams.get_by_itag(video_itag)
+            audio_stream = video_yt_obj.streams.get_by_itag(audio_itag) if audio_itag else None
+
+        filename = f"{i+1}-{sanitized_title}-{quality_info}.{self.file_extension(download_type)}"
+        self.log(f"[{i+1}/{total_videos}] Downloading: '{video_yt_obj.title}' at {quality_info} as '{filename}'")
+        on_progress = lambda done, total: scheduler.update(job, done, total or 0)
+        throttle = self.bandwidth.for_job(job.control)
+        video_yt_obj.register_on_progress_callback(self.stream_progress_callback(on_progress, job.control, throttle,
+                                                                                 self.metrics))
+
+        if stream and (audio_stream or not audio_itag):
+            digest = None # Computed while downloading a single stream
+            with scheduler.host_slot(stream.url), self.metrics.span("download", video_id=video_yt_obj.video_id,
+                                                                    itag=selected_itag):
+                if download_type == "audio":
+                    converting = self.download_audio(stream, path, filename, on_progress, video_yt_obj.video_id, job.control, throttle)
+                elif audio_stream:
+                    self.download_adaptive(stream, audio_stream, path, filename, on_progress, video_yt_obj.video_id, job.control, throttle)
+                    converting = completed(os.path.join(path, filename))
+                else:
+                    digest = self.download_stream(stream, path, filename, on_progress, video_yt_obj.video_id, job.control, throttle)
+                    converting = completed(os.path.join(path, filename))
+
+            def finished(file_path):
+                self.log(f"[{i+1}/{total_videos}] SUCCESS: Downloaded '{video_yt_obj.title}'. Saved as '{filename}'.")
+                self.record_download(video_yt_obj.video_id, self.index_key(selected_itag, download_type), file_path, digest)
+                job.status = "done"
+
+            if not converting.done():
+                return chain(converting, lambda future: finished(future.result()))
+            finished(converting.result())
+        else:
+            self.log(f"[{i+1}/{total_videos}] WARNING: Quality '{quality_info}' not found for '{video_yt_obj.title}'. Falling back to highest progressive resolution.")
+            self.metrics.inc("retries_total", reason="quality_fallback")
+            highest_res_stream = video_yt_obj.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
+            if highest_res_stream:
+                fallback_quality_info = highest_res_stream.resolution
+                fallback_filename = f"{i+1}-{sanitized_title}-{fallback_quality_info}.mp4"
+                self.log(f"[{i+1}/{total_videos}] Falling back to '{fallback_quality_info}' for '{video_yt_obj.title}'.")
+                fallback_path = os.path.join(path, fallback_filename)
+                if self.reuse_download(video_yt_obj.video_id, highest_res_stream.itag, fallback_path, prefix=f"[{i+1}/{total_videos}] "):
+                    job.status = "done"
+                    return
+                with scheduler.host_slot(highest_res_stream.url), \
+                        self.metrics.span("download", video_id=video_yt_obj.video_id, itag=highest_res_stream.itag):
+                    digest = self.download_stream(highest_res_stream, path, fallback_filename, on_progress, video_yt_obj.video_id, job.control, throttle)
+                self.log(f"[{i+1}/{total_videos}] SUCCESS (Fallback): Downloaded '{video_yt_obj.title}'. Saved as '{fallback_filename}'.")
+                self.record_download(video_yt_obj.video_id, highest_res_stream.itag, fallback_path, digest)
+                job.status = "done"
+            else:
+                self.log(f"[{i+1}/{total_videos}] ERROR: No progressive MP4 stream found for '{video_yt_obj.title}'. Skipping.")
+                job.status = "skipped"
+
+    # --- Queue ---
+
+    def run_queue(self, queue, control=None, wake=None, poll_interval=None):
+        """
+        Works through a JobQueue until it has nothing left to resolve or download, or control
+        (the run's token, which pause()/resume()/cancel() act on) is cancelled. With wake (a
+        threading.Event that whoever adds jobs sets), an empty queue doesn't end the run: it
+        waits for wake, or poll_interval seconds, and goes on until control is cancelled. Jobs left
+        'downloading' by a run that didn't finish are not touched: the process calls
+        queue.recover() once when it starts, before its first run.
+        Queued URLs are resolved in batches (see resolve_queue()) while earlier jobs
+        download, up to download_workers at a time. When the run is cancelled, its jobs go
+        back to 'queued'; a job cancelled on its own (through the job's control, which the
+        'job' event carries) fails with the error 'Cancelled'.
+        Returns {state: count} for the queue afterwards.
+        """
+        control = self.control = control or DownloadControl()
+        counts = queue.counts()
+        self.log(f"--- Running the download queue: {counts['resolve']} to resolve, {counts['queued']} queued "
+                 f"({self.download_workers} at a time) ---")
+        self.progress.reset()
+        connection_stats = self.connections.stats()
+        scheduler = DownloadScheduler(self.download_workers, self.download_workers_per_host, progress=self.progress,
+                                      metrics=self.metrics)
+        slots = threading.Semaphore(self.download_workers) # A job is claimed only when a worker is free for it
+        rows_by_job = {}
+
+        def claimed_jobs():
+            while not control.cancelled:
+                if wake is not None:
+                    wake.clear() # Jobs added from here on set it again
+                if queue.counts()["queued"] < self.download_workers:
+                    self.resolve_queue(queue, control) # Keep the next downloads resolved ahead of time
+                slots.acquire()
+                row = None if control.cancelled else queue.claim()
+                for state, count in queue.counts().items():
+                    self.metrics.set_gauge("queue_jobs", count, state=state)
+                if row is None:
+                    slots.release()
+                    if queue.counts()["resolve"]:
+                        continue
+                    if wake is None:
+                        return
+                    wake.wait(poll_interval)
+                    continue
+                job = DownloadJob(row["id"], row["title"], DownloadControl(parent=control))
+                rows_by_job[job] = row
+                yield job
+
+        def finish(job, converting):
+            row = rows_by_job.pop(job) # A run with wake may go on for as long as the process does
+            try:
+                file_path = converting.result()
+                queue.update(row["id"], "done", file_path=file_path, error=None)
+                job.status = "done"
+            except DownloadCancelled:
+                if control.cancelled:
+                    queue.update(row["id"], "queued") # Picked up (and resumed) by the next run
+                else:
+                    queue.update(row["id"], "failed", error="Cancelled")
+                job.status = "cancelled"
+            except Exception as e:
+                self.log(f"ERROR: Could not download '{row['title']}'. Exception: {e}")
+                queue.update(row["id"], "failed", error=str(e))
+                job.status = "failed"
+                job.error = e
+            self.emit("job", job=job)
+
+        def work(job):
+            row = rows_by_job[job]
+            self.emit("job", job=job)
+            try:
+                converting = self.download_one(row["url"], row["itag"], row["out_dir"], row["download_type"],
+                                               job.control, wait=False)
+            except Exception as e:
+                converting = Future()
+                converting.set_exception(e)
+            finally:
+                slots.release() # The next job may download while this one's audio is converted
+            if converting.done():
+                finish(job, converting)
+                return None
+            job.status = "converting"
+            self.emit("job", job=job)
+            return chain(converting, lambda future: finish(job, future))
+
+        jobs = scheduler.run(claimed_jobs(), work)
+        counts = queue.counts()
+        for state, count in counts.items():
+            self.metrics.set_gauge("queue_jobs", count, state=state)
+        succeeded = sum(1 for job in jobs if job.status == "done")
+        self.log_connection_stats(connection_stats)
+        self.log(f"--- Queue run finished: {succeeded} of {len(jobs)} downloads succeeded; queue now has "
+                 + ", ".join(f"{count} {state}" for state, count in counts.items()) + " ---")
+        return counts
+
+    def resolve_queue(self, queue, control=None, limit=QUEUE_RESOLVE_BATCH):
+        """
+        Resolves up to limit jobs waiting in 'resolve': a playlist is replaced by jobs for
+        its videos, and a video's stream is picked (by its quality policy, or its quality
+        label through select_quality()) from its metadata, looked up concurrently and cached.
+        Resolved jobs move to 'queued', the rest to 'failed'. Returns how many were handled.
+        """
+        from .policy import QualityPolicy # policy imports this module
+        rows = queue.jobs("resolve", limit)
+        videos = []
+        for row in rows:
+            if control is not None and control.cancelled:
+                return 0
+            if not is_playlist_url(row["url"]):
+                videos.append(row)
+                continue
+            try:
+                title, video_urls = self.iter_playlist(row["url"])
+                added = queue.add(video_urls, row["download_type"], row["quality"], row["policy"], row["out_dir"], row["id"])
+                queue.update(row["id"], "done", title=title)
+                self.log(f"Queued {added} videos from playlist '{title}'.")
+            except Exception as e:
+                self.log(f"ERROR: Could not read playlist '{row['url']}'. Exception: {e}")
+                queue.update(row["id"], "failed", error=str(e))
+
+        entries = resolve_in_order(videos, lambda row: self.lookup_video(row["url"])[0],
+                                   max_workers=self.playlist_fetch_workers, item_timeout=self.playlist_item_timeout)
+        for _, row, info, error in entries:
+            if error is not None:
+                self.log(f"WARNING: Could not fetch details for '{row['url']}'. Error: {error}")
+                queue.update(row["id"], "failed", error=str(error))
+                continue
+            download_type = row["download_type"]
+            try:
+                if row["policy"]:
+                    choice = QualityPolicy.parse(row["policy"]).choose(info["streams"], adaptive=self.ffmpeg is not None)
+                    itag = choice and choice["itag"]
+                    if choice is not None:
+                        download_type = choice["download_type"]
+                else:
+                    options = stream_options_for(download_type, info["streams"], adaptive=self.ffmpeg is not None)
+                    itag = select_quality(options, row["quality"])
+            except ValueError as e:
+                itag, error = None, e
+            if itag is None:
+                reason = str(error) if error else f"no quality matching '{row['policy'] or row['quality']}' is available"
+                self.log(f"WARNING: Skipping '{info['title']}': {reason}.")
+                queue.update(row["id"], "failed", title=info["title"], error=reason)
+                continue
+            queue.update(row["id"], "queued", title=info["title"], itag=str(itag), download_type=download_type)
+        return len(rows)
@@ -0,0 +1,384 @@
+"""
+Daemon mode: one long-lived downloader process per host, driven through a local HTTP/JSON
+API. The process keeps its DownloaderEngine (and with it the metadata cache, download
+index and connection pool) warm between jobs, and works through a JobQueue whenever
+something is in it. Clients (curl, scripts using client.DaemonClient, or the desktop app
+started with --daemon) submit URLs, set the default quality policy, list and cancel jobs
+and follow the log, job and progress events.
+
+    POST /jobs              {"urls": [...], "type": "video" | "audio", "quality", "policy", "out"}
+    GET  /jobs              ?state=failed, ?ids=3,4 (downloading jobs include [bytes done, total] as progress)
+    GET  /jobs/ID           POST /jobs/ID/cancel
+    GET  /policy            POST /policy   {"policy": "best <=1080p else best audio"} (null clears it)
+    POST /settings          {"limit", "job_limit", "audio_format", "audio_bitrate"}
+    POST /pause             POST /resume   GET /status
+    GET  /events            ?since=SEQ: one JSON event per line ({"seq", "time", "event": "log" |
+                            "job" | "progress", ...}), replaying the buffered ones after SEQ
+
+POST requests must be sent as Content-Type: application/json, and only requests addressed
+to the host the daemon listens on are answered, so web pages can't reach the API.
+"""
+import collections
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .audio import AUDIO_FORMATS, parse_bitrate
+from .client import DAEMON_HOST, DAEMON_PORT, EVENT_KEEPALIVE
+from .control import DownloadControl
+from .streams import is_youtube_url
+from .jobqueue import JOB_STATES
+from .policy import QualityPolicy
+from .throttle import parse_rate
+
+# The last EVENT_BUFFER events are kept for clients that reconnect (/events?since=SEQ).
+EVENT_BUFFER = 1000
+# Seconds between progress events while something downloads (the keep-alive lines of
+# an idle event stream follow EVENT_KEEPALIVE).
+PROGRESS_INTERVAL = 1
+# Seconds between looks for jobs added to the queue file by other processes (queue add),
+# and before the queue is run again after a run stopped with an error.
+QUEUE_POLL_INTERVAL = 5
+MAX_REQUEST_BYTES = 16 * 1024 * 1024 # Request bodies; room for very long URL lists
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def job_info(job):
+    """The JSON form of a DownloadJob in 'job' events (its number is the queue's job ID)."""
+    return {"id": job.number, "title": job.title, "status": job.status,
+            "error": str(job.error) if job.error is not None else None}
+
+
+class DownloadDaemon:
+    """
+    Serves the API (see the module docstring) for engine and queue (a JobQueue) on
+    host:port, and runs the queue on a background thread whenever it has work, so
+    submitted URLs start downloading next to the jobs that are already running.
+    start() requeues the downloads an earlier daemon left unfinished (queue.recover(), once)
+    and returns at once; stop() cancels the running downloads, keeping their partial files
+    for the next start, and shuts the server down. Events are numbered (seq) and the
+    last EVENT_BUFFER of them are kept, so a client that reconnects misses nothing.
+    """
+    def __init__(self, engine, queue, host=DAEMON_HOST, port=DAEMON_PORT, out_dir=".", policy=None):
+        if policy:
+            QualityPolicy.parse(policy)
+        self.engine = engine
+        self.queue = queue
+        self.host = host
+        self.out_dir = os.path.abspath(out_dir) # For submitted URLs that don't name a directory
+        self.policy = policy # Default quality policy (text) for submitted URLs without their own
+        self.control = DownloadControl() # Token of every queue run: paused by /pause, cancelled by stop()
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        self._stopped = threading.Event()
+        self._wake = threading.Event() # Set when jobs are submitted
+        self._events = collections.deque(maxlen=EVENT_BUFFER)
+        self._last_seq = 0
+        self._events_changed = threading.Condition()
+        self._active = {} # Job ID -> (DownloadJob, URL) while it downloads
+        self._cancel_requests = set() # IDs of claimed jobs to cancel as soon as their download starts
+        self._lock = threading.Lock()
+        self._threads = []
+        engine.subscribe(self.on_engine_event)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            self.engine.log(f"Requeued {recovered} downloads interrupted by the previous run.")
+        for target in (self.server.serve_forever, self._run_queue, self._report_progress):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.engine.log(f"Daemon listening on {self.url}.")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.control.cancel(keep_partial=True)
+        self._wake.set()
+        with self._events_changed:
+            self._events_changed.notify_all()
+        self.server.shutdown()
+        for thread in self._threads:
+            thread.join()
+        self.server.server_close()
+        self.engine.unsubscribe(self.on_engine_event)
+
+    def _run_queue(self):
+        while not self.stopped:
+            try:
+                # One run for the daemon's lifetime: it picks submitted jobs up as soon as _wake is set
+                self.engine.run_queue(self.queue, self.control, wake=self._wake, poll_interval=QUEUE_POLL_INTERVAL)
+            except Exception as e:
+                self.engine.log(f"ERROR: The download queue stopped. Exception: {e}")
+                self._wake.wait(QUEUE_POLL_INTERVAL)
+
+    def _report_progress(self):
+        was_active = False
+        while not self._stopped.wait(PROGRESS_INTERVAL):
+            snapshot = self.engine.progress.snapshot()
+            if snapshot["active"] or was_active: # Once more when the last download has finished
+                self.publish("progress", **snapshot, jobs=self.job_progress())
+            was_active = bool(snapshot["active"])
+
+    # --- Events ---
+
+    def publish(self, event, **data):
+        with self._events_changed:
+            self._last_seq += 1
+            self._events.append({"seq": self._last_seq, "time": time.time(), "event": event, **data})
+            self._events_changed.notify_all()
+
+    @property
+    def last_seq(self):
+        with self._events_changed:
+            return self._last_seq
+
+    def events_after(self, seq, timeout):
+        """Returns the buffered events after seq, waiting up to timeout seconds for one."""
+        with self._events_changed:
+            if self._last_seq <= seq and not self.stopped:
+                self._events_changed.wait(timeout)
+            return [event for event in self._events if event["seq"] > seq]
+
+    def on_engine_event(self, event, data):
+        if event == "log":
+            self.publish("log", message=data["message"])
+            return
+        if event != "job":
+            return
+        job, cancel = data["job"], False
+        with self._lock:
+            if job.status == "downloading" and job.number not in self._active:
+                row = self.queue.job(job.number)
+                self._active[job.number] = (job, row and row["url"])
+                cancel = job.number in self._cancel_requests
+                self._cancel_requests.discard(job.number)
+            elif job.status not in ("downloading", "converting"):
+                self._active.pop(job.number, None)
+        if cancel:
+            job.control.cancel()
+        self.publish("job", job=job_info(job))
+
+    def job_progress(self):
+        """Returns {job ID: [bytes on disk, total bytes]} for the jobs downloading right now."""
+        with self._lock:
+            active = list(self._active.items())
+        progress = {job_id: self.engine.progress.get(url) for job_id, (job, url) in active}
+        return {job_id: list(done_total) for job_id, done_total in progress.items() if done_total}
+
+    # --- Requests ---
+
+    def submit(self, urls, download_type="video", quality=None, policy=None, out_dir=None):
+        """
+        Queues urls (see JobQueue.add) and wakes the queue runner. Without a quality or a
+        policy, the daemon's default policy applies (or else the best quality). URLs whose
+        job failed (or was cancelled) before are tried again.
+        Returns (how many were added, the job ID of each URL).
+        """
+        if download_type not in ("video", "audio"):
+            raise ValueError(f"Unknown download type '{download_type}'; use 'video' or 'audio'.")
+        rejected = [url for url in urls if not isinstance(url, str) or not is_youtube_url(url)]
+        if rejected:
+            raise ValueError(f"'{rejected[0]}' is not a YouTube video or playlist URL.")
+        if quality is None and policy is None:
+            policy = self.policy
+        if policy:
+            QualityPolicy.parse(policy)
+        out_dir = out_dir or self.out_dir
+        added = self.queue.add(urls, download_type, quality or "best", policy, out_dir)
+        ids = self.queue.ids(urls, download_type, out_dir)
+        retried = 0
+        for job_id in ids:
+            row = job_id is not None and self.queue.job(job_id)
+            if row and row["state"] == "failed":
+                self.queue.update(job_id, "resolve", error=None)
+                retried += 1
+        self.engine.log(f"Queued {added} of {len(urls)} submitted URLs ({len(urls) - added} were already queued"
+                        + (f", {retried} of them are tried again" if retried else "") + ").")
+        self._wake.set()
+        return added, ids
+
+    def list_jobs(self, state=None, ids=None):
+        if state is not None and state not in JOB_STATES:
+            raise ValueError(f"Unknown job state '{state}'; use one of {', '.join(JOB_STATES)}.")
+        if ids is None:
+            rows = self.queue.jobs(state)
+        else:
+            rows = [row for row in map(self.queue.job, ids) if row and (state is None or row["state"] == state)]
+        for row in rows:
+            if row["state"] == "downloading":
+                progress = self.engine.progress.get(row["url"])
+                row["progress"] = list(progress) if progress else None
+        return rows
+
+    def cancel(self, job_id):
+        """Cancels a job, removing its partial file. Returns False if it has already finished (or doesn't exist)."""
+        if self.queue.cancel(job_id):
+            row = self.queue.job(job_id)
+            self.publish("job", job={"id": job_id, "title": row["title"], "status": "cancelled", "error": "Cancelled"})
+            return True
+        with self._lock:
+            active = self._active.get(job_id)
+            if active is None:
+                row = self.queue.job(job_id)
+                if row is None or row["state"] != "downloading":
+                    return False
+                self._cancel_requests.add(job_id) # Claimed, but its download hasn't started yet
+        if active is not None:
+            active[0].control.cancel()
+        return True
+
+    def set_policy(self, policy):
+        if policy:
+            QualityPolicy.parse(policy)
+        self.policy = policy or None
+        self.engine.log(f"Default quality policy: {self.policy}." if self.policy else "Default quality policy cleared.")
+
+    def settings(self):
+        bandwidth = self.engine.bandwidth
+        return {"limit": bandwidth.rate, "job_limit": bandwidth.job_rate,
+                "audio_format": self.engine.audio_format, "audio_bitrate": self.engine.audio_bitrate}
+
+    def apply_settings(self, settings):
+        """Applies limit / job_limit (rates such as '20M', 0 for none), audio_format and audio_bitrate."""
+        unknown = set(settings) - set(self.settings())
+        if unknown:
+            raise ValueError(f"Unknown setting '{sorted(unknown)[0]}'; use one of {', '.join(self.settings())}.")
+        # Everything is checked before anything is applied
+        rates = {name: parse_rate(str(settings[name])) for name in ("limit", "job_limit") if name in settings}
+        audio_format = settings.get("audio_format", self.engine.audio_format)
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unknown audio format '{audio_format}'; use one of {', '.join(AUDIO_FORMATS)}.")
+        audio_bitrate = parse_bitrate(settings.get("audio_bitrate", self.engine.audio_bitrate))
+        if "limit" in rates:
+            self.engine.bandwidth.set_rate(rates["limit"])
+        if "job_limit" in rates:
+            self.engine.bandwidth.set_job_rate(rates["job_limit"])
+        self.engine.audio_format = audio_format
+        self.engine.audio_bitrate = audio_bitrate
+
+    def status(self):
+        return {"url": self.url, "paused": self.control.paused, "queue": self.queue.counts(), "policy": self.policy,
+                "settings": self.settings(), "progress": self.engine.progress.snapshot()}
+
+    def handle(self, method, path, params, body):
+        """Answers one API request (except /events). Returns (HTTP status, JSON-able answer)."""
+        parts = [part for part in path.split("/") if part]
+        if parts == ["jobs"] and method == "POST":
+            urls = body.get("urls") or ([body["url"]] if body.get("url") else [])
+            if not isinstance(urls, list) or not urls:
+                raise ValueError("Give the URLs to download as 'urls' (a list).")
+            added, ids = self.submit(urls, body.get("type", "video"), body.get("quality"), body.get("policy"),
+                                     body.get("out"))
+            return 200, {"added": added, "jobs": ids}
+        if parts == ["jobs"]:
+            ids = [int(job_id) for value in params.get("ids", []) for job_id in value.split(",") if job_id]
+            return 200, {"jobs": self.list_jobs(params.get("state", [None])[0], ids if "ids" in params else None)}
+        if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job_id = int(parts[1])
+            if method == "GET" and len(parts) == 2:
+                rows = self.list_jobs(ids=[job_id])
+                return (200, rows[0]) if rows else (404, {"error": f"There is no job {job_id}."})
+            if method == "POST" and parts[2:] == ["cancel"]:
+                return 200, {"cancelled": self.cancel(job_id)}
+        if parts == ["policy"]:
+            if method == "POST":
+                self.set_policy(body.get("policy"))
+            return 200, {"policy": self.policy}
+        if parts == ["settings"]:
+            if method == "POST":
+                self.apply_settings(body)
+            return 200, self.settings()
+        if parts in (["pause"], ["resume"]) and method == "POST":
+            (self.control.pause if parts == ["pause"] else self.control.resume)()
+            self.engine.log("Downloads paused." if parts == ["pause"] else "Downloads resumed.")
+            return 200, {"paused": self.control.paused}
+        if parts == ["status"] and method == "GET":
+            return 200, self.status()
+        return 404, {"error": f"Unknown request: {method} {path}"}
+
+
+def make_handler(daemon):
+    """Builds the request handler class serving daemon's API."""
+    allowed_hosts = {*LOCAL_HOSTS, daemon.host}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.dispatch("GET")
+
+        def do_POST(self):
+            self.dispatch("POST")
+
+        def dispatch(self, method):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query, keep_blank_values=True)
+            # Another host name means a page in a browser (DNS rebinding), not a local client
+            if urlsplit(f"//{self.headers.get('Host', '')}").hostname not in allowed_hosts:
+                self.send_json(403, {"error": "Requests must be addressed to the daemon's own host."})
+                return
+            try:
+                if method == "GET" and url.path.rstrip("/") == "/events":
+                    self.stream_events(int(params["since"][0]) if "since" in params else None)
+                    return
+                body = {}
+                if method == "POST":
+                    if self.headers.get_content_type() != "application/json":
+                        self.send_json(415, {"error": "Send requests as Content-Type: application/json."})
+                        return
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length > MAX_REQUEST_BYTES:
+                        self.send_json(413, {"error": f"Requests are limited to {MAX_REQUEST_BYTES} bytes."})
+                        return
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    if not isinstance(body, dict):
+                        raise ValueError("The request body must be a JSON object.")
+                self.send_json(*daemon.handle(method, url.path, params, body))
+            except ValueError as e: # Includes malformed JSON
+                self.send_json(400, {"error": str(e)})
+            except Exception as e:
+                self.send_json(500, {"error": str(e)})
+
+        def send_json(self, status, answer):
+            body = json.dumps(answer).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def stream_events(self, since):
+            """Writes events as JSON lines until the client disconnects or the daemon stops."""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            last_seq = daemon.last_seq
+            if since is None or since > last_seq: # From now on; a seq from before a restart too
+                since = last_seq
+            try:
+                while not daemon.stopped:
+                    events = daemon.events_after(since, EVENT_KEEPALIVE)
+                    self.wfile.write("".join(json.dumps(event) + "\n" for event in events).encode() or b"\n")
+                    self.wfile.flush()
+                    if events:
+                        since = events[-1]["seq"]
+            except OSError:
+                pass # The client has gone away
+
+    return Handler
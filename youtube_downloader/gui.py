@@ -0,0 +1,927 @@
+import time
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, scrolledtext
+import threading
+import queue
+import os
+import sys
+import logging
+import logging.handlers
+import sqlite3
+
+from . import httppool
+from .audio import AUDIO_BITRATE, AUDIO_FORMAT, AUDIO_FORMATS, parse_bitrate
+from .cache import CACHE_DIR
+from .control import DownloadCancelled, DownloadControl
+from .client import DaemonClient, DaemonError
+from .jobqueue import JobQueue, read_urls
+from .playlist_view import PlaylistView
+from .policy import QualityPolicy
+from .streams import is_youtube_url, parse_selection, playlist_id_from_url, video_id_from_url
+from .throttle import BandwidthSchedule, format_rate, parse_rate
+
+# Progress display: how many times per second the UI samples download progress.
+PROGRESS_FPS = 10
+
+# Log area: queued messages are flushed every LOG_FLUSH_MS with a single insert, and the
+# widget keeps only the last LOG_MAX_LINES lines. Every message also goes to a rotating
+# log file, so nothing trimmed from the widget is lost.
+LOG_FLUSH_MS = 100
+LOG_MAX_LINES = 2000
+LOG_FILE = os.path.join(CACHE_DIR, "logs", "youtube_downloader.log")
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+LOG_TO_CONSOLE = True # Echo log lines to stdout (once per flush, from the UI thread)
+LOG_FILTERS = {"All messages": logging.INFO, "Warnings and errors": logging.WARNING, "Errors only": logging.ERROR}
+
+# Attached to a daemon (--daemon): how often (seconds) the submitted jobs are polled, and
+# how long to wait before reconnecting to its event stream.
+DAEMON_POLL_INTERVAL = 0.5
+DAEMON_RECONNECT_DELAY = 3
+
+
+def message_level(message):
+    """Infers a logging level from the prefixes the app uses ('ERROR:', 'WARNING:', ...)."""
+    head = message.lstrip("[0123456789/] ").upper()
+    if head.startswith(("ERROR", "FATAL", "--> EXCEPTION", "AN UNEXPECTED ERROR")):
+        return logging.ERROR
+    if head.startswith("WARNING"):
+        return logging.WARNING
+    return logging.INFO
+
+
+class DaemonProgress:
+    """Stands in for the engine's ProgressTracker while attached to a daemon: snapshot() is its last progress event."""
+    def __init__(self):
+        self.last = {"downloaded": 0, "total": 0, "percent": 0, "speed": 0.0, "eta": None, "active": 0}
+
+    def reset(self):
+        pass # The daemon's totals cover all of its downloads
+
+    def snapshot(self):
+        return self.last
+
+class YouTubeDownloaderApp:
+    """
+    A desktop application for downloading YouTube videos, audio, and playlists.
+    This version uses 'pytubefix' and includes a detailed logging area for status and errors.
+    Improvements include better UI/UX, individual playlist video progress,
+    and selection of specific videos from a playlist.
+    All fetching and downloading is done by a DownloaderEngine; this class only drives the UI.
+    With daemon (a DaemonClient), downloads are handed to that daemon instead, and its log
+    and progress are shown; stream options are still looked up by the local engine.
+    """
+    def __init__(self, root, engine=None, daemon=None):
+        """
+        Initializes the main application window and its widgets.
+        """
+        self.root = root
+        self.root.title("YouTube Downloader (pytubefix)")
+        self.root.geometry("950x800") # Increased width and height for better layout
+        self.root.resizable(True, True) # Changed to True, True to allow resizing
+        self.root.configure(bg="#e0e0e0") # Lighter background
+
+        # --- Style configuration ---
+        style = ttk.Style()
+        style.theme_use('clam')
+        style.configure("TLabel", background="#e0e0e0", font=("Helvetica", 11))
+        style.configure("TButton", font=("Helvetica", 11, "bold"), padding=8, background="#4CAF50", foreground="white")
+        style.map("TButton", background=[('active', '#45a049')])
+        style.configure("TRadiobutton", background="#e0e0e0", font=("Helvetica", 10))
+        style.configure("TEntry", font=("Helvetica", 11), fieldbackground="#ffffff")
+        style.configure("TCombobox", font=("Helvetica", 11), fieldbackground="#ffffff")
+        style.configure("TFrame", background="#e0e0e0")
+        style.configure("TLabelframe", background="#e0e0e0", borderwidth=2, relief="groove")
+        style.configure("TLabelframe.Label", font=("Helvetica", 12, "bold"), foreground="#333333")
+
+        # --- Main Frame ---
+        main_frame = ttk.Frame(self.root, padding="15", style="TFrame")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        main_frame.columnconfigure(0, weight=1) # Allow column to expand
+        main_frame.rowconfigure(1, weight=1) # Crucial: Allow log_frame (row=1) to expand vertically
+
+        # --- Top controls frame ---
+        controls_frame = ttk.Frame(main_frame, style="TFrame")
+        controls_frame.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        controls_frame.columnconfigure(0, weight=1)
+
+        # --- Download Type Selection ---
+        type_frame = ttk.LabelFrame(controls_frame, text="1. Choose Download Type", padding="10")
+        type_frame.grid(row=0, column=0, sticky="ew", pady=(0, 10))
+        type_frame.columnconfigure(0, weight=1) # Center radio buttons
+
+        self.download_type = tk.StringVar(value="video")
+        ttk.Radiobutton(type_frame, text="Single Video", variable=self.download_type, value="video", command=self.update_ui_for_type).pack(anchor=tk.W, pady=2)
+        ttk.Radiobutton(type_frame, text="Audio Only", variable=self.download_type, value="audio", command=self.update_ui_for_type).pack(anchor=tk.W, pady=2)
+        ttk.Radiobutton(type_frame, text="Playlist", variable=self.download_type, value="playlist", command=self.update_ui_for_type).pack(anchor=tk.W, pady=2)
+
+        # --- URL Input ---
+        url_frame = ttk.LabelFrame(controls_frame, text="2. Enter YouTube URL", padding="10")
+        url_frame.grid(row=1, column=0, sticky="ew", pady=(0, 10))
+        url_frame.columnconfigure(0, weight=1)
+
+        self.url_entry = ttk.Entry(url_frame)
+        self.url_entry.grid(row=0, column=0, sticky="ew", ipady=5)
+        self.url_entry.bind("<Return>", self.on_url_change) # Fetch on Enter key
+        self.url_entry.bind("<FocusOut>", self.on_url_change) # Fetch on losing focus
+        # Many URLs at once go into the persistent download queue instead
+        ttk.Button(url_frame, text="Add List...", command=self.open_queue_dialog).grid(row=0, column=1, padx=(5, 0))
+
+        # --- Quality Selection ---
+        self.quality_frame = ttk.LabelFrame(controls_frame, text="3. Select Quality", padding="10")
+        self.quality_frame.grid(row=2, column=0, sticky="ew", pady=(0, 10))
+        self.quality_frame.columnconfigure(0, weight=1)
+        
+        self.quality_var = tk.StringVar()
+        self.quality_menu = ttk.Combobox(self.quality_frame, textvariable=self.quality_var, state="disabled")
+        self.quality_menu.grid(row=0, column=0, sticky="ew", pady=5, ipady=3)
+        self.quality_menu.bind("<<ComboboxSelected>>", self.on_quality_change)
+
+        # Optional per-video rules for playlists, e.g. "best <=1080p, prefer avc1, cap 500M else best audio"
+        self.policy_frame = ttk.Frame(self.quality_frame)
+        self.policy_frame.grid(row=1, column=0, sticky="ew")
+        self.policy_frame.columnconfigure(1, weight=1)
+        ttk.Label(self.policy_frame, text="Policy (optional, overrides the quality above):",
+                  font=("Helvetica", 9)).grid(row=0, column=0, padx=(0, 5))
+        self.policy_var = tk.StringVar()
+        ttk.Entry(self.policy_frame, textvariable=self.policy_var).grid(row=0, column=1, sticky="ew")
+        self.policy_frame.grid_remove() # Only shown for playlists
+
+        # Format of audio-only downloads: m4a keeps YouTube's AAC audio as is, mp3/opus are transcoded
+        self.audio_frame = ttk.Frame(self.quality_frame)
+        self.audio_frame.grid(row=2, column=0, sticky="ew")
+        ttk.Label(self.audio_frame, text="Save audio as:", font=("Helvetica", 9)).grid(row=0, column=0, padx=(0, 5))
+        self.audio_format_var = tk.StringVar(value=AUDIO_FORMAT)
+        ttk.Combobox(self.audio_frame, textvariable=self.audio_format_var, values=AUDIO_FORMATS, state="readonly",
+                     width=6).grid(row=0, column=1, padx=(0, 10))
+        ttk.Label(self.audio_frame, text="Bitrate (MP3/Opus):", font=("Helvetica", 9)).grid(row=0, column=2, padx=(0, 5))
+        self.audio_bitrate_var = tk.StringVar(value=f"{AUDIO_BITRATE}k")
+        ttk.Combobox(self.audio_frame, textvariable=self.audio_bitrate_var, values=("128k", "160k", "192k", "256k", "320k"),
+                     width=6).grid(row=0, column=3)
+        self.audio_frame.grid_remove() # Only shown for audio downloads
+
+        # --- Playlist Video Selection (initially hidden) ---
+        self.playlist_selection_frame = ttk.LabelFrame(controls_frame, text="4. Select Videos from Playlist", padding="10")
+        self.playlist_selection_frame.grid(row=3, column=0, sticky="ew", pady=(0, 10))
+        self.playlist_selection_frame.columnconfigure(0, weight=1)
+        self.playlist_selection_frame.rowconfigure(0, weight=1) # Allow the playlist view to expand vertically
+        self.playlist_selection_frame.grid_remove() # Hide initially
+
+        # Only the visible rows exist as widgets, so channel-sized playlists stay responsive
+        self.playlist_view = PlaylistView(self.playlist_selection_frame, height=8)
+        self.playlist_view.grid(row=0, column=0, columnspan=2, sticky="nsew")
+
+        # Select/Deselect All buttons
+        playlist_buttons_frame = ttk.Frame(self.playlist_selection_frame)
+        playlist_buttons_frame.grid(row=1, column=0, columnspan=2, pady=(5,0), sticky="ew")
+        playlist_buttons_frame.columnconfigure(0, weight=1)
+        playlist_buttons_frame.columnconfigure(1, weight=1)
+
+        ttk.Button(playlist_buttons_frame, text="Select All", command=self.select_all_playlist_videos).grid(row=0, column=0, padx=5, sticky="ew")
+        ttk.Button(playlist_buttons_frame, text="Deselect All", command=self.deselect_all_playlist_videos).grid(row=0, column=1, padx=5, sticky="ew")
+
+        # --- Download Controls & Progress ---
+        download_controls_frame = ttk.Frame(controls_frame, style="TFrame")
+        # This row will be dynamically set based on download_type
+        self.download_controls_row = 3 # Default row if playlist selection is hidden
+        download_controls_frame.grid(row=self.download_controls_row, column=0, sticky="ew", pady=(0, 10))
+        download_controls_frame.columnconfigure(0, weight=1)
+
+        self.progress_bar = ttk.Progressbar(download_controls_frame, orient="horizontal", length=100, mode="determinate")
+        self.progress_bar.grid(row=0, column=0, sticky="ew", padx=(0, 10))
+
+        self.download_button = ttk.Button(download_controls_frame, text="Download", command=self.start_download_thread, state="disabled")
+        self.download_button.grid(row=0, column=1)
+
+        self.pause_button = ttk.Button(download_controls_frame, text="Pause", command=self.toggle_pause, state="disabled")
+        self.pause_button.grid(row=0, column=2, padx=(5, 0))
+        self.cancel_button = ttk.Button(download_controls_frame, text="Cancel", command=self.cancel_download, state="disabled")
+        self.cancel_button.grid(row=0, column=3, padx=(5, 0))
+
+        self.progress_label = ttk.Label(download_controls_frame, text="", font=("Helvetica", 9))
+        self.progress_label.grid(row=1, column=0, sticky="w", pady=(3, 0))
+
+        # Speed limits apply immediately, also to a download that is already running
+        speed_frame = ttk.Frame(download_controls_frame, style="TFrame")
+        speed_frame.grid(row=2, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        self.speed_limit_var = tk.StringVar(value="0")
+        self.job_speed_limit_var = tk.StringVar(value="0")
+        self.speed_schedule_var = tk.StringVar()
+        speed_entries = []
+        for column, (label, variable, width) in enumerate([("Speed limit:", self.speed_limit_var, 7),
+                                                           ("Per video:", self.job_speed_limit_var, 7),
+                                                           ("Schedule:", self.speed_schedule_var, 22)]):
+            ttk.Label(speed_frame, text=label, font=("Helvetica", 9)).grid(row=0, column=column * 2, padx=(0 if column == 0 else 10, 3))
+            entry = ttk.Entry(speed_frame, textvariable=variable, width=width)
+            entry.grid(row=0, column=column * 2 + 1)
+            entry.bind("<Return>", self.apply_speed_limits)
+            entry.bind("<FocusOut>", self.apply_speed_limits)
+            speed_entries.append(entry)
+        self.speed_schedule_entry = speed_entries[-1]
+
+        # --- Log Area ---
+        log_frame = ttk.LabelFrame(main_frame, text="Logs & Status", padding="10")
+        log_frame.grid(row=1, column=0, sticky="nsew", pady=(10, 0))
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(1, weight=1) # Allow log text to expand
+
+        log_filter_frame = ttk.Frame(log_frame)
+        log_filter_frame.grid(row=0, column=0, sticky="e", pady=(0, 5))
+        ttk.Label(log_filter_frame, text="Show:", font=("Helvetica", 9)).pack(side=tk.LEFT, padx=(0, 5))
+        self.log_filter_var = tk.StringVar(value="All messages")
+        ttk.Combobox(log_filter_frame, textvariable=self.log_filter_var, values=list(LOG_FILTERS), state="readonly", width=20).pack(side=tk.LEFT)
+
+        self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled', height=10, wrap=tk.WORD, font=("Consolas", 9), bg="#f8f8f8", fg="#333333")
+        self.log_text.grid(row=1, column=0, sticky="nsew")
+        self.log_line_count = 0 # Lines currently in log_text
+        self.log_file = None # Rotating file logger, opened on first flush
+        
+        self.stream_options = []
+        self.fetch_lock = threading.Lock() # Guards fetch_token/fetch_key and rows added by fetches
+        self.fetch_token = DownloadControl() # Cancelled when the current fetch is superseded
+        self.fetch_key = None # (download type, video/playlist ID) of the current fetch
+        self.fetch_thread = None
+        self.playlist_videos_info = [] # Stores (video URL, title) for playlist videos
+        self.playlist_job_rows = [] # Playlist row of each job in the running playlist download
+        self.job_queue = None # JobQueue, opened the first time URLs are added or the queue is run
+        self.log_queue = queue.Queue()
+        if engine is None:
+            from .core import DownloaderEngine # pytubefix is only imported here
+            engine = DownloaderEngine(on_event=self.on_engine_event)
+        else:
+            engine.subscribe(self.on_engine_event)
+        self.engine = engine
+        self.progress = engine.progress # Written by download threads, sampled by refresh_progress
+        self.daemon = daemon
+        self.daemon_rates = None # (overall, per video) speed limits last sent to the daemon
+        self.log("Welcome! Please select a download type and enter a URL.")
+        if daemon is not None:
+            self.progress = DaemonProgress()
+            self.speed_schedule_entry.config(state="disabled") # The daemon has no schedule setting
+            self.log(f"Downloads are handed to the daemon at {daemon.url}.")
+            threading.Thread(target=self.follow_daemon, daemon=True).start()
+        self.root.after(LOG_FLUSH_MS, self.process_log_queue)
+        self.root.after(1000 // PROGRESS_FPS, self.refresh_progress)
+
+    def process_log_queue(self):
+        """
+        Flushes the log queue from the main thread: every queued message goes to the log
+        file (and console), and the ones passing the level filter are added to the log
+        area in a single insert, after which the oldest lines beyond LOG_MAX_LINES are dropped.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            text = "\n".join(line for level, line in batch) + "\n"
+            self.write_log_file(text)
+            if LOG_TO_CONSOLE and sys.stdout is not None: # None under pythonw and windowed builds
+                sys.stdout.write(text)
+            min_level = LOG_FILTERS.get(self.log_filter_var.get(), logging.INFO)
+            shown = [line for level, line in batch if level >= min_level][-LOG_MAX_LINES:]
+            if shown:
+                shown_text = "\n".join(shown) + "\n"
+                self.log_text.config(state='normal')
+                self.log_text.insert(tk.END, shown_text)
+                self.log_line_count += shown_text.count("\n")
+                excess = self.log_line_count - LOG_MAX_LINES
+                if excess > 0:
+                    self.log_text.delete("1.0", f"{excess + 1}.0")
+                    self.log_line_count -= excess
+                self.log_text.config(state='disabled')
+                self.log_text.see(tk.END)
+        self.root.after(LOG_FLUSH_MS, self.process_log_queue)
+
+    def write_log_file(self, text):
+        """Appends a batch of log lines to the rotating log file; the log file is optional."""
+        if self.log_file is None:
+            log_file = logging.getLogger("youtube_downloader.gui.log_file")
+            if not log_file.handlers:
+                try:
+                    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+                    handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES,
+                                                                   backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+                except OSError:
+                    self.log_file = False # Unwritable location: keep logging to the window only
+                    return
+                handler.terminator = "" # Batches already end with a newline
+                log_file.addHandler(handler)
+                log_file.propagate = False
+                log_file.setLevel(logging.INFO)
+            self.log_file = log_file
+        if self.log_file:
+            self.log_file.info(text)
+
+    def refresh_progress(self):
+        """Samples download progress at PROGRESS_FPS and updates the progress bar and readout."""
+        snapshot = self.progress.snapshot()
+        self.progress_bar['value'] = snapshot["percent"]
+        if snapshot["total"]:
+            text = f"{snapshot['downloaded'] / (1024 * 1024):.1f} / {snapshot['total'] / (1024 * 1024):.1f} MB"
+            if snapshot["active"]:
+                text += f"  |  {snapshot['speed'] / (1024 * 1024):.2f} MB/s"
+                if snapshot["eta"] is not None:
+                    text += f"  |  ETA {int(snapshot['eta']) // 60}:{int(snapshot['eta']) % 60:02d}"
+                if snapshot["active"] > 1:
+                    text += f"  |  {snapshot['active']} downloads"
+            self.progress_label.config(text=text)
+        else:
+            self.progress_label.config(text="")
+        self.root.after(1000 // PROGRESS_FPS, self.refresh_progress)
+
+    def on_engine_event(self, event, data):
+        """
+        Receives engine events (on any thread): log messages go to the log area, playlist
+        job changes to the Status column of the video's row.
+        """
+        if event == "log":
+            self.log(data["message"])
+        elif event == "job" and data["job"].number <= len(self.playlist_job_rows):
+            job = data["job"]
+            status = f"{job.status} (rule {job.rule})" if job.rule else job.status
+            self.playlist_view.set_status(self.playlist_job_rows[job.number - 1], status)
+
+    def follow_daemon(self):
+        """Shows the daemon's log and progress events (on a background thread), reconnecting when the stream drops."""
+        since, connected = None, True
+        while True:
+            try:
+                for event in self.daemon.events(since):
+                    if not connected:
+                        self.log("Reconnected to the daemon.")
+                        connected = True
+                    since = event["seq"]
+                    if event["event"] == "log":
+                        self.log(event["message"])
+                    elif event["event"] == "progress":
+                        self.progress.last = event
+                error = "the daemon has stopped"
+            except DaemonError as e:
+                error = e
+            if connected:
+                self.log(f"WARNING: No updates from the daemon ({error}); reconnecting...")
+                connected = False
+            time.sleep(DAEMON_RECONNECT_DELAY)
+
+    def log(self, message, level=None):
+        """
+        Queues a message for the log area in a thread-safe way; process_log_queue writes it
+        out on the main thread. level defaults to one inferred from the message prefix.
+        """
+        timestamp = time.strftime("%H:%M:%S")
+        self.log_queue.put((level or message_level(message), f"[{timestamp}] {message}"))
+
+    def update_ui_for_type(self):
+        """Updates the UI based on the selected download type."""
+        self.clear_fields()
+        download_type = self.download_type.get()
+        self.log(f"Switched to '{download_type.capitalize()}' download type.")
+
+        # Get the controls_frame to re-grid elements
+        main_frame = self.root.nametowidget(self.root.winfo_children()[0])
+        controls_frame = main_frame.winfo_children()[0]
+
+        # Hide all elements that might change position
+        self.quality_frame.grid_remove()
+        self.playlist_selection_frame.grid_remove()
+        
+        # Determine new grid positions
+        current_row = 2 # Starting row for quality_frame/playlist_selection_frame
+
+        if download_type == "playlist":
+            self.quality_frame.config(text="3. Select Quality (for all videos)")
+            self.quality_frame.grid(row=current_row, column=0, sticky="ew", pady=(0, 10))
+            self.policy_frame.grid()
+            current_row += 1
+            self.playlist_selection_frame.grid(row=current_row, column=0, sticky="ew", pady=(0, 10))
+            current_row += 1
+        else:
+            self.quality_frame.config(text="3. Select Quality")
+            self.quality_frame.grid(row=current_row, column=0, sticky="ew", pady=(0, 10))
+            self.policy_frame.grid_remove()
+            current_row += 1
+        if download_type == "audio":
+            self.audio_frame.grid()
+        else:
+            self.audio_frame.grid_remove()
+        
+        # Position the download controls frame
+        download_controls_frame = self.root.nametowidget(controls_frame.winfo_children()[-1]) # Assuming it's the last child
+        download_controls_frame.grid(row=current_row, column=0, sticky="ew", pady=(0, 10))
+
+
+    def on_url_change(self, event=None):
+        """
+        Handles the event when the URL entry changes (Enter or focus out). Events for the
+        video/playlist that is already loaded or loading are ignored; a fetch for anything
+        else cancels the previous one, so only the newest fetch ever updates the UI.
+        """
+        url = self.url_entry.get().strip()
+        if not url:
+            self.clear_fields()
+            self.log("URL field is empty. Please enter a YouTube URL.")
+            return
+
+        # Basic URL validation (can be more robust)
+        if not is_youtube_url(url):
+            self.log("Invalid URL format. Please enter a valid YouTube video or playlist URL.")
+            self.clear_fields()
+            return
+
+        download_type = self.download_type.get()
+        fetch_key = self.fetch_key_for(url, download_type)
+        if fetch_key == self.fetch_key:
+            return # Same video/playlist as the current fetch, e.g. focus just moved away again
+
+        self.log("URL detected. Starting to fetch details...")
+        # Clear previous quality options and disable download button (before the fetch starts filling them)
+        self.clear_fields() # Also cancels the previous fetch
+        token = DownloadControl()
+        with self.fetch_lock:
+            self.fetch_token = token
+            self.fetch_key = fetch_key
+        self.fetch_thread = threading.Thread(target=self.fetch_stream_options, args=(url, download_type, token), daemon=True)
+        self.fetch_thread.start()
+
+    @staticmethod
+    def fetch_key_for(url, download_type):
+        """Canonical identity of a fetch: differently written URLs of one video share it."""
+        canonical_id = playlist_id_from_url(url) if download_type == "playlist" else video_id_from_url(url)
+        return download_type, canonical_id or url
+
+    def cancel_fetch(self):
+        """Cancels the running metadata fetch; nothing it still produces reaches the UI."""
+        with self.fetch_lock:
+            self.fetch_token.cancel()
+            self.fetch_key = None
+
+    def apply_fetch_result(self, token, func):
+        """Runs func on the main thread, unless the fetch that produced it has been superseded."""
+        self.root.after(0, lambda: None if token.cancelled else func())
+
+    def fetch_stream_options(self, url, download_type, token):
+        """
+        Fetches available video/audio streams from the YouTube URL (on a worker thread).
+        Results are only applied while token, the DownloadControl of this fetch, is not
+        cancelled; a cancelled playlist fetch also stops loading further entries.
+        """
+        entries = ()
+
+        try:
+            if download_type in ["video", "audio"]:
+                stream_options = self.engine.fetch_video(url, download_type)["options"]
+
+            elif download_type == "playlist":
+                # Only the first page is read here; the entries are listed below as they resolve
+                playlist = self.engine.stream_playlist(url)
+                if playlist["empty"]:
+                    self.log("Error: This playlist is empty or private.")
+                    self.apply_fetch_result(token, self.clear_fields)
+                    return
+                stream_options = playlist["options"]
+                entries = playlist["entries"]
+
+            if token.cancelled:
+                return
+            if not stream_options:
+                self.log("Error: No compatible streams were found for this URL. Please check if it's a valid video/audio/playlist URL.")
+                self.apply_fetch_result(token, self.clear_fields)
+                return
+
+            self.log(f"Found {len(stream_options)} quality options.")
+            
+            # Update UI from the main thread
+            def update_ui():
+                self.stream_options = stream_options
+                self.quality_menu['values'] = [opt[1] for opt in self.stream_options]
+                if self.stream_options:
+                    self.quality_menu.set(self.stream_options[0][1]) # Set default to highest quality
+                    self.on_quality_change()
+                    self.quality_menu.config(state="readonly")
+                    self.download_button.config(state="normal")
+                    self.log("Ready to download. Please select a quality and click 'Download'.")
+                else:
+                    self.quality_menu.config(state="disabled")
+                    self.download_button.config(state="disabled")
+                    self.log("No quality options available.")
+            
+            self.apply_fetch_result(token, update_ui)
+
+            # Entries stream into the playlist view in playlist order while later pages load, and
+            # can be selected and downloaded right away. playlist_videos_info is extended first,
+            # so every row in the view (applied in batches) has its entry. The lock keeps a
+            # superseded fetch from adding rows after the next fetch has cleared the view.
+            videos_info = []
+            with self.fetch_lock:
+                if not token.cancelled:
+                    self.playlist_videos_info = videos_info
+            for i, video_url, info, error in entries:
+                with self.fetch_lock:
+                    if token.cancelled:
+                        self.log("Stopped loading the previous playlist.")
+                        break # Dropping the generator also stops its page fetches and lookups
+                    if error is None:
+                        videos_info.append((video_url, info["title"]))
+                        self.playlist_view.append(info["title"], info.get("length"),
+                                                  {s["itag"]: s["filesize"] for s in info["streams"]})
+                    else:
+                        videos_info.append((None, None))
+                        self.playlist_view.append(None, status="unavailable")
+
+        except Exception as e:
+            if token.cancelled:
+                return
+            self.log(f"FATAL ERROR: Could not fetch details. Please check the URL and your internet connection.")
+            self.log(f"--> Exception: {str(e)}")
+            self.apply_fetch_result(token, self.clear_fields)
+
+    def on_quality_change(self, event=None):
+        """Shows each playlist video's size in the selected quality (only visible rows are redrawn)."""
+        itag = next((itag for itag, desc in self.stream_options if desc == self.quality_var.get()), None)
+        parts = [part for part in parse_selection(itag) if part is not None] if itag is not None else []
+
+        def size_for(sizes):
+            if not parts or not all(part in sizes for part in parts):
+                return 0 # Not available in this quality (the download falls back to another one)
+            return sum(sizes[part] or 0 for part in parts)
+        self.playlist_view.size_for = size_for
+        self.playlist_view.refresh()
+
+    def select_all_playlist_videos(self):
+        """Selects all videos in the playlist view."""
+        self.log("Selecting all videos in the playlist.")
+        self.playlist_view.select_all()
+
+    def deselect_all_playlist_videos(self):
+        """Deselects all videos in the playlist view."""
+        self.log("Deselecting all videos in the playlist.")
+        self.playlist_view.deselect_all()
+
+    def start_download_thread(self, target=None):
+        """Starts the download process (or target) in a new thread to keep the UI responsive."""
+        self.download_button.config(state="disabled")
+        self.download_control = DownloadControl() # Pause/Cancel act on this run only
+        self.pause_button.config(text="Pause", state="normal")
+        self.cancel_button.config(state="normal")
+        self.progress.reset()
+        self.log("Download button clicked. Starting download process...")
+        threading.Thread(target=target or self.download, daemon=True).start()
+
+    def open_job_queue(self):
+        """Returns the download queue, opening it on first use (None if it can't be opened)."""
+        if self.job_queue is None:
+            try:
+                self.job_queue = JobQueue()
+                recovered = self.job_queue.recover()
+                if recovered:
+                    self.log(f"Requeued {recovered} downloads interrupted by the previous run.")
+            except (OSError, sqlite3.Error) as e:
+                self.log(f"ERROR: Could not open the download queue. Error: {e}")
+                messagebox.showerror("Download Queue", f"Could not open the download queue: {e}")
+        return self.job_queue
+
+    def open_queue_dialog(self):
+        """Opens a window to paste many video/playlist URLs into the persistent download queue."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Add URLs to the Download Queue")
+        dialog.geometry("640x420")
+        dialog.columnconfigure(0, weight=1)
+        dialog.rowconfigure(1, weight=1)
+        ttk.Label(dialog, text="Paste video or playlist URLs, one or more per line:").grid(row=0, column=0, sticky="w", padx=10, pady=(10, 5))
+        text = scrolledtext.ScrolledText(dialog, height=15, wrap=tk.NONE, font=("Consolas", 9))
+        text.grid(row=1, column=0, sticky="nsew", padx=10)
+        status_label = ttk.Label(dialog, text="", font=("Helvetica", 9))
+        status_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
+        buttons = ttk.Frame(dialog)
+        buttons.grid(row=3, column=0, sticky="e", padx=10, pady=(0, 10))
+
+        def show_counts():
+            if self.daemon is not None:
+                return
+            job_queue = self.open_job_queue()
+            if job_queue is not None:
+                status_label.config(text="Queue: " + ", ".join(f"{count} {state}" for state, count in job_queue.counts().items()))
+
+        def add(start):
+            if self.daemon is not None:
+                add_to_daemon()
+                return
+            job_queue = self.open_job_queue()
+            urls, rejected = read_urls(text.get("1.0", tk.END).splitlines())
+            if job_queue is None or not urls:
+                status_label.config(text="No YouTube URLs found." if job_queue is not None else "")
+                return
+            save_path = filedialog.askdirectory(parent=dialog)
+            if not save_path:
+                return
+            download_type = "audio" if self.download_type.get() == "audio" else "video"
+            policy = self.policy_var.get().strip() or None
+            if policy:
+                try:
+                    QualityPolicy.parse(policy)
+                except ValueError as e:
+                    messagebox.showerror("Quality Policy", str(e), parent=dialog)
+                    return
+            added = job_queue.add(urls, download_type, "best", policy, save_path)
+            self.log(f"Added {added} of {len(urls)} URLs to the download queue ({len(urls) - added} were already queued"
+                     + (f", {len(rejected)} lines were not YouTube URLs" if rejected else "") + ").")
+            text.delete("1.0", tk.END)
+            show_counts()
+            if not start:
+                return
+            if str(self.pause_button.cget("state")) == "disabled": # Pause is only enabled while a download runs
+                self.start_download_thread(self.run_job_queue)
+            else:
+                self.log("A download is already running; start the queue again once it has finished.")
+
+        def add_to_daemon():
+            urls, rejected = read_urls(text.get("1.0", tk.END).splitlines())
+            if not urls:
+                status_label.config(text="No YouTube URLs found.")
+                return
+            save_path = filedialog.askdirectory(parent=dialog)
+            if not save_path:
+                return
+            download_type = "audio" if self.download_type.get() == "audio" else "video"
+            try:
+                result = self.daemon.submit(urls, download_type, policy=self.policy_var.get().strip() or None, out_dir=save_path)
+            except DaemonError as e:
+                messagebox.showerror("Download Queue", str(e), parent=dialog)
+                return
+            self.log(f"Sent {len(urls)} URLs to the daemon ({result['added']} new"
+                     + (f", {len(rejected)} lines were not YouTube URLs" if rejected else "") + ").")
+            text.delete("1.0", tk.END)
+            status_label.config(text=f"Sent to the daemon at {self.daemon.url}; its downloads start right away.")
+
+        ttk.Button(buttons, text="Add to Queue", command=lambda: add(False)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons, text="Add and Start", command=lambda: add(True)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.LEFT)
+        show_counts()
+
+    def run_job_queue(self):
+        """Runs the download queue until it is empty (on the download thread)."""
+        try:
+            job_queue = self.open_job_queue()
+            if job_queue is not None:
+                self.engine.run_queue(job_queue, self.download_control)
+        except Exception as e:
+            self.log(f"ERROR: The download queue stopped. Exception: {e}")
+        finally:
+            self.root.after(0, self.finish_download)
+
+    def finish_download(self):
+        """Re-enables Download and disables Pause/Cancel once the download thread is done."""
+        self.download_button.config(state="normal")
+        self.pause_button.config(text="Pause", state="disabled")
+        self.cancel_button.config(state="disabled")
+
+    def apply_speed_limits(self, event=None):
+        """Hands the speed limit fields (e.g. 20M, 512K, 0 = unlimited) to the engine, or to the daemon."""
+        bandwidth = self.engine.bandwidth
+        try:
+            rate = parse_rate(self.speed_limit_var.get())
+            job_rate = parse_rate(self.job_speed_limit_var.get())
+            schedule = BandwidthSchedule.parse(self.speed_schedule_var.get())
+        except ValueError as e:
+            self.log(f"Error: {e}")
+            return
+        if self.daemon is not None:
+            if (rate, job_rate) == self.daemon_rates:
+                return
+            try:
+                self.daemon.set_settings(limit=rate or 0, job_limit=job_rate or 0)
+            except DaemonError as e:
+                self.log(f"Error: {e}")
+                return
+            self.daemon_rates = (rate, job_rate)
+            self.log(f"Daemon speed limit: {format_rate(rate)} overall, {format_rate(job_rate)} per video.")
+            return
+        if (rate, job_rate, str(schedule)) == (bandwidth.rate, bandwidth.job_rate, str(bandwidth.schedule)):
+            return
+        bandwidth.set_rate(rate)
+        bandwidth.set_job_rate(job_rate)
+        bandwidth.set_schedule(schedule)
+        self.log(f"Speed limit: {format_rate(rate)} overall, {format_rate(job_rate)} per video"
+                 + (f", schedule {schedule}" if schedule.rules else "") + ".")
+
+    def toggle_pause(self):
+        """Pauses the running download (keeping the bytes so far) or resumes it."""
+        if self.download_control.paused:
+            self.download_control.resume()
+            self.pause_button.config(text="Pause")
+            self.log("Download resumed.")
+        else:
+            self.download_control.pause()
+            self.pause_button.config(text="Resume")
+            self.log("Download paused. Partial files are kept until you resume or cancel.")
+
+    def cancel_download(self):
+        """Cancels the running download; its connections and partial files are released."""
+        self.download_control.cancel()
+        self.pause_button.config(text="Pause", state="disabled")
+        self.cancel_button.config(state="disabled")
+        self.log("Cancelling download...")
+
+    def download(self):
+        """Handles the actual download logic."""
+        url = self.url_entry.get().strip()
+        download_type = self.download_type.get()
+        selected_quality_str = self.quality_var.get()
+
+        if not selected_quality_str and download_type != "playlist": # Playlist handles quality selection differently
+            self.log("Error: Please select a quality option before downloading.")
+            self.root.after(0, self.finish_download)
+            return
+
+        try:
+            self.log("Please select a directory to save your file(s).")
+            # Must ask for directory from the main thread
+            save_path = self.ask_for_directory()
+            if not save_path:
+                self.log("Download cancelled: No directory was selected.")
+                return
+            
+            self.log(f"Files will be saved to: {save_path}")
+
+            if download_type == "playlist":
+                selected_indices = [i for i in self.playlist_view.selected()
+                                    if i < len(self.playlist_videos_info) and self.playlist_videos_info[i][0] is not None]
+                if not selected_indices:
+                    self.log("Error: No videos selected for playlist download.")
+                    messagebox.showwarning("No Selection", "Please select at least one video from the playlist to download.")
+                    return
+                # Get the (URL, title) pairs for selected videos (entries that failed to resolve have no URL)
+                selected_videos = [self.playlist_videos_info[i] for i in selected_indices]
+                self.playlist_job_rows = selected_indices # Job number n is row playlist_job_rows[n-1]
+                for i in selected_indices:
+                    self.playlist_view.set_status(i, "queued")
+                self.download_playlist(selected_videos, selected_quality_str, save_path)
+            else:
+                self.download_single_item(url, selected_quality_str, save_path)
+
+        except Exception as e:
+            self.log(f"An unexpected error occurred during the download process.")
+            self.log(f"--> Exception: {str(e)}")
+            messagebox.showerror("Download Error", f"An error occurred: {str(e)}")
+        finally:
+            self.root.after(0, self.finish_download)
+    
+    def ask_for_directory(self):
+        """Asks for directory in a thread-safe way."""
+        path_queue = queue.Queue()
+        self.root.after(0, lambda: path_queue.put(filedialog.askdirectory()))
+        return path_queue.get()
+
+    def download_single_item(self, url, quality_str, path):
+        """Downloads a single video or audio file."""
+        selected_itag = None
+        for itag, desc in self.stream_options:
+            if desc == quality_str:
+                selected_itag = itag
+                break
+        
+        if not selected_itag:
+            self.log(f"Error: Could not find the selected stream for '{quality_str}'.")
+            self.root.after(0, lambda: messagebox.showerror("Download Error", f"Could not find the selected quality: {quality_str}"))
+            return
+
+        try:
+            if self.daemon is not None:
+                self.report_daemon_result(self.download_with_daemon([url], self.download_type.get(), str(selected_itag), path))
+                return
+            self.engine.audio_format = self.audio_format_var.get()
+            self.engine.audio_bitrate = parse_bitrate(self.audio_bitrate_var.get())
+            file_path = self.engine.download_video(url, selected_itag, path, self.download_type.get(), self.download_control)
+            self.root.after(0, lambda: messagebox.showinfo("Success", f"'{os.path.basename(file_path)}' has been downloaded successfully!"))
+        except DownloadCancelled:
+            self.log("Download cancelled.")
+        except Exception as e:
+            self.log(f"ERROR: Failed to download. Exception: {e}")
+            self.root.after(0, lambda message=f"Failed to download: {e}": messagebox.showerror("Download Error", message))
+
+    def download_playlist(self, selected_videos, quality_str, path):
+        """Downloads the selected videos of a playlist, in the selected quality or by the quality policy."""
+        if self.daemon is not None:
+            try:
+                jobs = self.download_with_daemon([video_url for video_url, title in selected_videos], "video",
+                                                 quality_str.split(' ')[0] if quality_str else None, path,
+                                                 self.policy_var.get().strip() or None, self.playlist_job_rows)
+                self.report_daemon_result(jobs)
+            except DaemonError as e:
+                self.log(f"ERROR: {e}")
+                self.root.after(0, lambda message=str(e): messagebox.showerror("Download Error", message))
+            return
+        if self.policy_var.get().strip():
+            try:
+                policy = QualityPolicy.parse(self.policy_var.get())
+            except ValueError as e:
+                self.log(f"Error: {e}")
+                self.root.after(0, lambda message=str(e): messagebox.showerror("Quality Policy", message))
+                return
+            jobs = self.engine.download_playlist(selected_videos, None, None, path, self.download_control, policy=policy)
+            self.report_playlist_result(jobs)
+            return
+
+        selected_itag = None
+        for itag, desc in self.stream_options:
+            if desc == quality_str:
+                selected_itag = itag
+                break
+        
+        if not selected_itag:
+            self.log(f"Error: Could not find the selected quality itag for '{quality_str}'.")
+            self.root.after(0, lambda: messagebox.showerror("Download Error", f"Could not find the selected quality: {quality_str}"))
+            return
+
+        quality_info = quality_str.split(' ')[0] # e.g., "720p" from "720p - video/mp4"
+        jobs = self.engine.download_playlist(selected_videos, selected_itag, quality_info, path, self.download_control)
+        self.report_playlist_result(jobs)
+
+    def report_playlist_result(self, jobs):
+        """Tells the user how a playlist download ended."""
+        if any(job.status == "cancelled" for job in jobs):
+            self.log("Playlist download cancelled.")
+            return
+        self.root.after(0, lambda: messagebox.showinfo("Success", f"Selected videos from playlist downloaded successfully!"))
+
+    def download_with_daemon(self, urls, download_type, quality, path, policy=None, rows=()):
+        """
+        Hands urls to the daemon and follows their jobs until they have finished (on the
+        download thread); rows are the playlist rows showing each job's state. Pause and
+        Cancel are passed on to the daemon. Returns the jobs (dicts, see JobQueue).
+        """
+        settings = {"audio_format": self.audio_format_var.get(), "audio_bitrate": self.audio_bitrate_var.get()}
+        try:
+            rates = (parse_rate(self.speed_limit_var.get()), parse_rate(self.job_speed_limit_var.get()))
+            settings.update(limit=rates[0] or 0, job_limit=rates[1] or 0)
+        except ValueError:
+            rates = self.daemon_rates # Logged by apply_speed_limits; the daemon keeps its limits
+        self.daemon.set_settings(**settings)
+        self.daemon_rates = rates
+        job_ids = self.daemon.submit(urls, download_type, quality, policy, path)["jobs"]
+        ids = [job_id for job_id in job_ids if job_id is not None]
+        if not ids:
+            raise DaemonError("The daemon didn't queue any of the downloads.")
+        rows_by_id = dict(zip(job_ids, rows))
+        self.log(f"Sent {len(ids)} downloads to the daemon (jobs {', '.join(map(str, ids))}).")
+        paused = cancelled = False
+        while True:
+            if self.download_control.cancelled and not cancelled:
+                for job_id in ids:
+                    self.daemon.cancel(job_id)
+                cancelled = True
+            elif self.download_control.paused != paused:
+                paused = self.download_control.paused
+                (self.daemon.pause if paused else self.daemon.resume)() # Pauses all of the daemon's downloads
+            jobs = self.daemon.jobs(ids=ids)
+            for job in jobs:
+                if job["id"] in rows_by_id:
+                    self.playlist_view.set_status(rows_by_id[job["id"]], job["state"])
+            if all(job["state"] in ("done", "failed") for job in jobs):
+                return jobs
+            time.sleep(DAEMON_POLL_INTERVAL)
+
+    def report_daemon_result(self, jobs):
+        """Tells the user how the jobs handed to the daemon ended."""
+        if self.download_control.cancelled:
+            self.log("Download cancelled.")
+            return
+        failed = [job for job in jobs if job["state"] != "done"]
+        if not failed:
+            message = (f"'{os.path.basename(jobs[0]['file_path'])}' has been downloaded successfully!" if len(jobs) == 1
+                       else f"All {len(jobs)} videos have been downloaded successfully!")
+            self.root.after(0, lambda: messagebox.showinfo("Success", message))
+            return
+        errors = "\n".join(f"{job['title'] or job['url']}: {job['error']}" for job in failed[:5])
+        self.log(f"ERROR: {len(failed)} of {len(jobs)} downloads failed.")
+        self.root.after(0, lambda: messagebox.showerror("Download Error", f"{len(failed)} of {len(jobs)} downloads failed:\n{errors}"))
+
+    def clear_fields(self):
+        """Resets the quality menu, playlist view, and status, cancelling any running fetch."""
+        self.cancel_fetch()
+        self.quality_menu.set('')
+        self.quality_menu.config(state="disabled")
+        self.quality_menu['values'] = []
+        self.playlist_view.clear()
+        self.playlist_job_rows = []
+        self.download_button.config(state="disabled")
+        self.progress.reset()
+        self.stream_options = []
+        self.playlist_videos_info = []
+
+
+def main(daemon_url=None):
+    """Launches the Tk application, as a client of the daemon at daemon_url if one is given."""
+    httppool.install() # pytubefix's requests share the engine's connection pool
+    root = tk.Tk()
+    app = YouTubeDownloaderApp(root, daemon=DaemonClient(daemon_url) if daemon_url else None)
+    root.mainloop()
+    app.engine.close()
+    if app.job_queue is not None:
+        app.job_queue.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Shared keep-alive HTTP(S) connection pool. Requests sent through build_opener(pool)
+reuse idle connections to the same host instead of paying for a new TCP and TLS
+handshake each time; the engine sends its own range requests that way. pytubefix
+calls urllib.request.urlopen directly, so its watch page, player and playlist requests
+and its stream downloads are only pooled once an application installs the pool as
+urllib's process-wide opener with install(). The command line, the desktop app and the
+daemon do; a library user decides for their own process.
+"""
+import http.client
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# At most POOL_MAX_PER_HOST connections to one host are open at once; a request waits
+# for a free one (up to its timeout) beyond that. Idle connections are dropped after
+# POOL_IDLE_TIMEOUT seconds, before servers are likely to have closed them.
+POOL_MAX_PER_HOST = 16
+POOL_IDLE_TIMEOUT = 60
+POOL_WAIT_TIMEOUT = 30 # For requests without a timeout of their own
+
+# Errors that mean a reused connection had been closed by the server while it sat idle.
+STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+
+class PooledResponse(http.client.HTTPResponse):
+    """HTTPResponse that hands its connection back to the pool once the body has been read or it is closed."""
+    release = None # Set by ConnectionPool: release(reusable)
+    _body_read = False
+
+    def _read_and_discard_trailer(self):
+        super()._read_and_discard_trailer()
+        self._body_read = True # End of a chunked body
+
+    def _close_conn(self):
+        # Only a connection whose response was read to the end can carry another request
+        reusable = not self.will_close and (self._body_read or (not self.chunked and self.length == 0))
+        super()._close_conn()
+        release, self.release = self.release, None
+        if release:
+            release(reusable)
+
+
+class PooledHTTPConnection(http.client.HTTPConnection):
+    response_class = PooledResponse
+
+
+class PooledHTTPSConnection(http.client.HTTPSConnection):
+    response_class = PooledResponse
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of keep-alive connections, keyed by scheme and host (with port).
+    open(request) sends a urllib Request over an idle connection when there is one (a
+    hit) or a new one (a miss); the connection returns to the pool when the response has
+    been read to the end or closed. A request that finds its reused connection closed by
+    the server is sent once more on a fresh one. stats() reports hits, misses, stale
+    connections and how many connections are open and idle.
+    """
+    def __init__(self, max_per_host=POOL_MAX_PER_HOST, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.max_per_host = max(1, max_per_host)
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl.create_default_context()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._idle = {} # (scheme, host) -> [(connection, time.monotonic() when it went idle)]
+        self._open = {} # (scheme, host) -> number of open connections, idle or in use
+        self._changed = threading.Condition()
+
+    def stats(self):
+        with self._changed:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale,
+                    "open": sum(self._open.values()), "idle": sum(len(idle) for idle in self._idle.values())}
+
+    def _checkout(self, key, timeout):
+        """Returns (connection, reused) for key, waiting while the host is at max_per_host."""
+        deadline = time.monotonic() + (timeout if isinstance(timeout, (int, float)) else POOL_WAIT_TIMEOUT)
+        with self._changed:
+            while True:
+                idle = self._idle.get(key, [])
+                now = time.monotonic()
+                while idle:
+                    connection, since = idle.pop()
+                    if now - since < self.idle_timeout:
+                        self.hits += 1
+                        return connection, True
+                    connection.close()
+                    self._open[key] -= 1
+                if self._open.get(key, 0) < self.max_per_host:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    self.misses += 1
+                    break
+                if not self._changed.wait(deadline - now) and time.monotonic() >= deadline:
+                    raise urllib.error.URLError(f"no free connection to {key[1]} within the timeout")
+        scheme, host = key
+        if scheme == "https":
+            return PooledHTTPSConnection(host, context=self.ssl_context), False
+        return PooledHTTPConnection(host), False
+
+    def _checkin(self, key, connection, reusable):
+        with self._changed:
+            if reusable and connection.sock is not None:
+                self._idle.setdefault(key, []).append((connection, time.monotonic()))
+            else:
+                connection.close()
+                self._open[key] -= 1
+            self._changed.notify()
+
+    def open(self, request):
+        """Sends request (a urllib.request.Request prepared by its opener) and returns the response."""
+        key = (request.type, request.host)
+        headers = dict(request.unredirected_hdrs)
+        headers.update((name, value) for name, value in request.headers.items() if name not in headers)
+        headers["Connection"] = "keep-alive"
+        headers = {name.title(): value for name, value in headers.items()}
+        timeout = request.timeout if isinstance(request.timeout, (int, float)) else socket.getdefaulttimeout()
+        while True:
+            connection, reused = self._checkout(key, timeout)
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request(request.get_method(), request.selector, request.data, headers)
+                response = connection.getresponse()
+            except OSError as e:
+                self._checkin(key, connection, False)
+                if reused and request.data is None and isinstance(e, STALE_ERRORS):
+                    with self._changed:
+                        self.stale += 1
+                    continue # Closed by the server while idle; try a fresh connection
+                raise urllib.error.URLError(e) # Like urllib's own handlers
+            except BaseException:
+                self._checkin(key, connection, False)
+                raise
+            response.release = lambda reusable: self._checkin(key, connection, reusable)
+            response.url = request.get_full_url()
+            response.msg = response.reason # What urllib's own handlers do
+            return response
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._changed:
+            for key, idle in self._idle.items():
+                for connection, _ in idle:
+                    connection.close()
+                    self._open[key] -= 1
+            self._idle.clear()
+
+
+class PooledHandler(urllib.request.AbstractHTTPHandler):
+    """urllib handler that sends http and https requests through a ConnectionPool."""
+    handler_order = 400 # Ahead of urllib's own HTTPHandler/HTTPSHandler
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def http_open(self, request):
+        if request._tunnel_host:
+            return None # HTTPS through a proxy: left to urllib's HTTPSHandler
+        return self.pool.open(request)
+
+    https_open = http_open
+    http_request = https_request = urllib.request.AbstractHTTPHandler.do_request_
+
+
+POOL = ConnectionPool() # Shared by every engine in the process
+_installed = False
+_install_lock = threading.Lock()
+
+
+def build_opener(pool=POOL):
+    """A urllib OpenerDirector whose open() sends http and https requests through pool."""
+    return urllib.request.build_opener(PooledHandler(pool))
+
+
+def install(pool=POOL):
+    """Makes urllib.request.urlopen (and with it pytubefix) use pool. Only the first call has an effect."""
+    global _installed
+    with _install_lock:
+        if not _installed:
+            urllib.request.install_opener(build_opener(pool))
+            _installed = True
+    return pool
@@ -0,0 +1,106 @@
+"""
+Persistent index of finished downloads, used to avoid fetching the same video twice.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import CACHE_DIR
+from .integrity import DIGEST_SCHEME, file_digest
+
+INDEX_PATH = os.path.join(CACHE_DIR, "downloads.sqlite3")
+
+
+class DownloadIndex:
+    """
+    Persistent SQLite index of completed downloads across all output directories, keyed
+    by video ID + itag (the selection string, e.g. '22' or '137+140'). Each entry records
+    the file's path, size, modification time, digest (usually computed while it
+    downloaded) and the digest's scheme (see integrity). Entries whose file has been
+    deleted or changed are dropped when they are looked up. Safe to share between threads.
+    """
+    def __init__(self, path=INDEX_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS downloads (video_id TEXT, itag TEXT, path TEXT, size INTEGER, "
+                             "mtime_ns INTEGER, digest TEXT, digest_scheme TEXT, finished_at REAL, "
+                             "PRIMARY KEY (video_id, itag, path))")
+
+    def record(self, video_id, itag, file_path, digest=None):
+        """
+        Adds a finished download. digest must be in DIGEST_SCHEME; without it the file is
+        hashed, so call it from a worker thread.
+        """
+        if not video_id:
+            return
+        file_path = os.path.abspath(file_path)
+        digest = digest or file_digest(file_path)
+        stat = os.stat(file_path)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (video_id, str(itag), file_path, stat.st_size, stat.st_mtime_ns, digest, DIGEST_SCHEME,
+                              time.time()))
+
+    def find(self, video_id, itag):
+        """
+        Returns (path, digest) of the intact copies of video_id downloaded as itag, newest first.
+        A copy whose size changed, or whose contents changed along with its modification
+        time, is removed from the index.
+        """
+        if not video_id:
+            return []
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime_ns, digest, digest_scheme FROM downloads "
+                                    "WHERE video_id = ? AND itag = ? ORDER BY finished_at DESC",
+                                    (video_id, str(itag))).fetchall()
+        intact, stale = [], []
+        for path, size, mtime_ns, digest, scheme in rows:
+            try:
+                stat = os.stat(path)
+                ok = stat.st_size == size and (stat.st_mtime_ns == mtime_ns
+                                               or (scheme == DIGEST_SCHEME and file_digest(path) == digest))
+            except OSError:
+                ok = False
+            if ok:
+                intact.append((path, digest))
+            else:
+                stale.append(path)
+        if stale:
+            with self._lock, self._db:
+                self._db.executemany("DELETE FROM downloads WHERE video_id = ? AND itag = ? AND path = ?",
+                                     [(video_id, str(itag), path) for path in stale])
+        return intact
+
+    def reuse(self, video_id, itag, file_path):
+        """
+        Makes file_path hold an already downloaded copy of video_id/itag if there is one.
+        Returns (how, existing_path): how is 'exists' if file_path itself is an intact copy,
+        'linked' if it was hard-linked to a copy on the same filesystem, 'elsewhere' if
+        the only copies are on another filesystem, or None if nothing was downloaded yet.
+        """
+        copies = self.find(video_id, itag)
+        if not copies:
+            return None, None
+        file_path = os.path.abspath(file_path)
+        if any(path == file_path for path, _ in copies):
+            return "exists", file_path
+        if os.path.exists(file_path):
+            return None, None # Something else already has this name; let the download replace it
+        for source, digest in copies:
+            try:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                os.link(source, file_path)
+            except OSError:
+                continue # Other filesystem, or no hard link support
+            self.record(video_id, itag, file_path, digest)
+            return "linked", source
+        return "elsewhere", copies[0][0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
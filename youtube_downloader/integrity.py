@@ -0,0 +1,157 @@
+"""
+File digests computed while downloading, and the per-directory checksum manifest.
+
+Segmented downloads write a file out of order, so a single running hash over the file
+is not possible without reading it back. Instead every HASH_BLOCK_SIZE block is hashed
+on its own as its bytes are written, and a file's digest is the hash of its block
+digests in order (a hash list). file_digest() computes the same value from a file on disk.
+That is not the plain SHA-256 of the file, so stored digests are labelled DIGEST_SCHEME.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .writer import read_at
+
+# Digest scheme: HASH_ALGORITHM over the HASH_ALGORITHM digests of each HASH_BLOCK_SIZE
+# block. The block size matches the writer's alignment, and segment ranges start on
+# block boundaries, so each block is written front to back by a single segment.
+HASH_ALGORITHM = "sha256"
+HASH_BLOCK_SIZE = 1024 * 1024
+DIGEST_SCHEME = f"{HASH_ALGORITHM}-blocks-{HASH_BLOCK_SIZE}" # 'sha256-blocks-1048576'
+
+# Every output directory gets a manifest of the files downloaded into it, with their size,
+# modification time, digest and the digest's scheme.
+MANIFEST_NAME = ".ytdl-checksums.json"
+
+_manifest_lock = threading.Lock() # Serializes manifest updates from the download workers
+
+
+def file_digest(file_path, algorithm=HASH_ALGORITHM, block_size=HASH_BLOCK_SIZE):
+    """Returns the hex digest of file_path (see the module docstring) by reading it once."""
+    digest = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(hashlib.new(algorithm, block).digest())
+    return digest.hexdigest()
+
+
+class BlockHasher:
+    """
+    Computes the digest of a file of filesize bytes from the chunks written to it, in any
+    order across blocks: update(offset, chunks) is given each write. A block is hashed as
+    it is written while its bytes arrive front to back; blocks that were written out of
+    order, or before this hasher existed (by an earlier, resumed attempt), are read back
+    from the file by hexdigest(). reread_bytes tells how much that was.
+    Not thread-safe: updates come from the one FileWriter thread.
+    """
+    def __init__(self, filesize, algorithm=HASH_ALGORITHM, block_size=HASH_BLOCK_SIZE):
+        self.filesize = filesize
+        self.algorithm = algorithm
+        self.block_size = block_size
+        self.reread_bytes = 0
+        self._hashing = {} # Block index -> (hash object, bytes of the block hashed so far)
+        self._digests = {} # Block index -> digest of the complete block
+        self._reread = set() # Blocks that have to be read back
+
+    def block_length(self, index):
+        return min(self.block_size, self.filesize - index * self.block_size)
+
+    def update(self, offset, chunks):
+        """Hashes chunks (bytes-like objects) written back to back at offset."""
+        for chunk in chunks:
+            with memoryview(chunk) as view:
+                while view:
+                    index, position = divmod(offset, self.block_size)
+                    length = min(len(view), self.block_size - position)
+                    self._update_block(index, position, view[:length])
+                    view = view[length:]
+                    offset += length
+
+    def _update_block(self, index, position, data):
+        if index in self._reread or index in self._digests:
+            return
+        block, hashed = self._hashing.pop(index, (None, 0))
+        if hashed != position:
+            self._reread.add(index) # Not front to back (or partly written before): read it back later
+            return
+        block = block or hashlib.new(self.algorithm)
+        block.update(data)
+        hashed += len(data)
+        if hashed == self.block_length(index):
+            self._digests[index] = block.digest()
+        else:
+            self._hashing[index] = (block, hashed)
+
+    def hexdigest(self, fd):
+        """Returns the file's hex digest, reading the blocks that weren't hashed while written from fd."""
+        digest = hashlib.new(self.algorithm)
+        for index in range(-(-self.filesize // self.block_size)):
+            block = self._digests.get(index)
+            if block is None:
+                data = read_at(fd, self.block_length(index), index * self.block_size)
+                if len(data) != self.block_length(index):
+                    raise IOError(f"Incomplete download: block {index} is {len(data)} of {self.block_length(index)} bytes.")
+                self.reread_bytes += len(data)
+                block = hashlib.new(self.algorithm, data).digest()
+            digest.update(block)
+        return digest.hexdigest()
+
+
+# --- Manifest ---
+
+def read_manifest(directory):
+    """Returns {file name: entry} from directory's manifest ({} if it has none or it is unreadable)."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def record_checksum(file_path, digest, **info):
+    """
+    Adds (or replaces) file_path's entry in the manifest of its directory: its size,
+    modification time and digest (in DIGEST_SCHEME), plus info (e.g. video_id and itag).
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    stat = os.stat(file_path)
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest, "scheme": DIGEST_SCHEME,
+             "finished_at": time.time(), **info}
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with _manifest_lock:
+        files = read_manifest(directory)
+        files[name] = entry
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": files}, f, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+
+def lookup_checksum(file_path):
+    """Returns file_path's manifest entry, or None."""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return read_manifest(directory).get(name)
+
+
+def verify_file(file_path, entry=None, full=False):
+    """
+    Checks file_path against its manifest entry (looked up unless given). Returns 'ok',
+    'missing' (no file), 'unknown' (no entry, or a digest in another scheme), 'size' (size
+    differs) or 'corrupt' (digest differs). A file whose size and modification time are unchanged counts as intact
+    without reading it, unless full is set.
+    """
+    entry = entry or lookup_checksum(file_path)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return "missing"
+    if entry is None or entry.get("scheme") != DIGEST_SCHEME:
+        return "unknown"
+    if stat.st_size != entry["size"]:
+        return "size"
+    if not full and stat.st_mtime_ns == entry.get("mtime_ns"):
+        return "ok"
+    return "ok" if file_digest(file_path) == entry["digest"] else "corrupt"
@@ -0,0 +1,179 @@
+"""
+Persistent, crash-safe queue of download jobs, fed with bulk URL lists.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from .cache import CACHE_DIR
+from .streams import is_youtube_url, playlist_id_from_url, video_id_from_url
+
+QUEUE_PATH = os.path.join(CACHE_DIR, "queue.sqlite3")
+
+# resolve -> queued -> downloading -> done / failed
+JOB_STATES = ("resolve", "queued", "downloading", "done", "failed")
+
+
+def read_urls(lines):
+    """
+    Extracts URLs from lines of text (a file, stdin or pasted text): one or more URLs per
+    line separated by whitespace; blank lines and lines starting with '#' are ignored.
+    Returns (urls, rejected), where rejected are the words that are not YouTube URLs.
+    """
+    urls, rejected = [], []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        for word in line.split():
+            (urls if is_youtube_url(word) else rejected).append(word)
+    return urls, rejected
+
+
+def job_key(url):
+    """What makes two queued URLs the same job: the video (or playlist) ID, else the URL itself."""
+    return video_id_from_url(url) or playlist_id_from_url(url) or url
+
+
+class JobQueue:
+    """
+    SQLite job queue (WAL mode, every state change committed on its own) that survives
+    crashes and restarts. Each job is one URL plus how to download it; a playlist URL is
+    expanded into one job per video when it is resolved. The same video (or playlist)
+    is only queued once per download type and output directory, however often it is added.
+    Rows are returned as dicts. Safe to share between threads; only one process should
+    run (see DownloaderEngine.run_queue) a queue file at a time.
+    """
+    COLUMNS = ("id", "url", "key", "download_type", "quality", "policy", "out_dir", "state", "title", "itag",
+               "file_path", "error", "attempts", "parent_id", "added_at", "updated_at")
+
+    def __init__(self, path=QUEUE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None) # Transactions are explicit
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # Committed changes survive a crash of the app (WAL)
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, "
+                         "key TEXT NOT NULL, download_type TEXT NOT NULL, quality TEXT, policy TEXT, out_dir TEXT NOT NULL, "
+                         "state TEXT NOT NULL, title TEXT, itag TEXT, file_path TEXT, error TEXT, "
+                         "attempts INTEGER NOT NULL DEFAULT 0, parent_id INTEGER, added_at REAL, updated_at REAL, "
+                         "UNIQUE (key, download_type, out_dir))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+
+    def _rows(self, cursor):
+        return [dict(zip(self.COLUMNS, row)) for row in cursor.fetchall()]
+
+    def add(self, urls, download_type="video", quality="best", policy=None, out_dir=".", parent_id=None):
+        """
+        Queues urls (in state 'resolve') in one transaction. URLs already in the queue for
+        the same download type and output directory are ignored. Returns how many were added.
+        """
+        now = time.time()
+        out_dir = os.path.abspath(out_dir)
+        rows = [(url, job_key(url), download_type, quality, policy, out_dir, "resolve", parent_id, now, now)
+                for url in urls]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._db.total_changes
+                self._db.executemany("INSERT OR IGNORE INTO jobs (url, key, download_type, quality, policy, out_dir, "
+                                     "state, parent_id, added_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                added = self._db.total_changes - before
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return added
+
+    def ids(self, urls, download_type="video", out_dir="."):
+        """Returns the IDs of the jobs add() made (or found) for urls, in order; None where there is none."""
+        out_dir = os.path.abspath(out_dir)
+        with self._lock:
+            return [(self._db.execute("SELECT id FROM jobs WHERE key = ? AND download_type = ? AND out_dir = ?",
+                                      (job_key(url), download_type, out_dir)).fetchone() or (None,))[0]
+                    for url in urls]
+
+    def job(self, job_id):
+        """Returns one job, or None."""
+        with self._lock:
+            rows = self._rows(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)))
+        return rows[0] if rows else None
+
+    def jobs(self, state=None, limit=None):
+        """Returns jobs (all, or those in state), oldest first."""
+        query = "SELECT * FROM jobs" + (" WHERE state = ?" if state else "") + " ORDER BY id" + (" LIMIT ?" if limit else "")
+        params = [value for value in (state, limit) if value]
+        with self._lock:
+            return self._rows(self._db.execute(query, params))
+
+    def counts(self):
+        """Returns {state: number of jobs} for every state."""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in JOB_STATES}
+
+    def claim(self):
+        """Atomically moves the oldest 'queued' job to 'downloading' and returns it, or None."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._rows(self._db.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"))
+                if rows:
+                    self._db.execute("UPDATE jobs SET state = 'downloading', attempts = attempts + 1, updated_at = ? "
+                                     "WHERE id = ?", (time.time(), rows[0]["id"]))
+                    rows[0]["state"] = "downloading"
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows[0] if rows else None
+
+    def update(self, job_id, state, **fields):
+        """Moves a job to state, also setting any of title, itag, download_type, file_path and error."""
+        fields = {name: value for name, value in fields.items()
+                  if name in ("title", "itag", "download_type", "file_path", "error")}
+        assignments = "".join(f", {name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET state = ?, updated_at = ?{assignments} WHERE id = ?",
+                             (state, time.time(), *fields.values(), job_id))
+
+    def cancel(self, job_id):
+        """
+        Fails a job that hasn't started downloading yet (state 'resolve' or 'queued') with the
+        error 'Cancelled', so no run picks it up. Returns whether it did; a downloading job is
+        cancelled through its DownloadJob's control instead (see DownloaderEngine.run_queue).
+        """
+        with self._lock:
+            return bool(self._db.execute("UPDATE jobs SET state = 'failed', error = 'Cancelled', updated_at = ? "
+                                         "WHERE id = ? AND state IN ('resolve', 'queued')",
+                                         (time.time(), job_id)).rowcount)
+
+    def recover(self):
+        """
+        Requeues jobs left 'downloading' by a run that crashed or was stopped; their partial
+        files are resumed. Call once when the process starts, before its first run: called
+        while a run is going, it would requeue that run's downloads and they would be
+        downloaded twice. Returns how many were requeued.
+        """
+        with self._lock:
+            return self._db.execute("UPDATE jobs SET state = 'queued', updated_at = ? WHERE state = 'downloading'",
+                                    (time.time(),)).rowcount
+
+    def retry_failed(self):
+        """Sends failed jobs back to 'resolve'. Returns how many."""
+        with self._lock:
+            return self._db.execute("UPDATE jobs SET state = 'resolve', error = NULL, updated_at = ? WHERE state = 'failed'",
+                                    (time.time(),)).rowcount
+
+    def remove_finished(self):
+        """Deletes the jobs that are done. Returns how many."""
+        with self._lock:
+            return self._db.execute("DELETE FROM jobs WHERE state = 'done'").rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
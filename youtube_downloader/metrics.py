@@ -0,0 +1,229 @@
+"""
+Lightweight instrumentation: timing spans, counters and gauges, exported in the
+Prometheus text format (file or HTTP endpoint) and as JSON lines.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PREFIX = "ytdl"
+# Upper bounds (seconds) of the span duration histogram buckets.
+SPAN_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+# Seconds between metrics file rewrites / JSON snapshot lines while exporting.
+METRICS_INTERVAL = 10
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and span timings.
+    span() times a block: its duration goes into the span histogram (keyed by span name
+    only, so it stays small) and, while a trace file is open, into a JSON line together
+    with the span's fields (video ID, itag, ...). observe() records a duration without a
+    trace line, for hot paths such as individual disk writes. Values kept elsewhere (such
+    as connection pool statistics) are pulled in by collectors, see add_collector().
+    """
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {} # (name, label key) -> value
+        self._gauges = {} # (name, label key) -> value
+        self._spans = {} # span name -> [count per bucket..., count, sum]
+        self._collectors = []
+        self._trace = None
+        self._trace_lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_counter(self, name, value, **labels):
+        """Sets a counter that is counted elsewhere (from a collector)."""
+        with self._lock:
+            self._counters[(name, _label_key(labels))] = value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def add_gauge(self, name, delta, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, span, seconds):
+        with self._lock:
+            entry = self._spans.get(span)
+            if entry is None:
+                entry = self._spans[span] = [0] * len(SPAN_BUCKETS) + [0, 0.0]
+            for index, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    entry[index] += 1
+            entry[-2] += 1
+            entry[-1] += seconds
+
+    @contextmanager
+    def span(self, name, **fields):
+        """Times the with block as span name; an exception is noted in the trace line and re-raised."""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(name, seconds)
+            if self._trace is not None:
+                self.trace({"type": "span", "span": name, "seconds": round(seconds, 6), **fields,
+                            **({"error": error} if error else {})})
+
+    # --- JSON lines ---
+
+    def open_trace(self, path):
+        """Appends a JSON line for every span (and each snapshot) to path from now on."""
+        trace = open(path, "a", encoding="utf-8", buffering=1)
+        with self._trace_lock:
+            self._trace, previous = trace, self._trace
+        if previous is not None:
+            previous.close()
+
+    def close_trace(self):
+        with self._trace_lock:
+            trace, self._trace = self._trace, None
+        if trace is not None:
+            trace.close()
+
+    def trace(self, record):
+        line = json.dumps({"ts": round(time.time(), 6), **record}, default=str)
+        with self._trace_lock:
+            if self._trace is not None:
+                self._trace.write(line + "\n")
+
+    # --- Export ---
+
+    def add_collector(self, collect):
+        """Registers collect(metrics), called before every export to update values with set_counter()/set_gauge()."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def collect(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        for collect in collectors:
+            collect(self)
+
+    def snapshot(self):
+        """Returns {'counters', 'gauges', 'spans'} with 'name{label="value"}' keys; spans have count/sum."""
+        self.collect()
+        with self._lock:
+            return {"counters": {name + _format_labels(key): value for (name, key), value in self._counters.items()},
+                    "gauges": {name + _format_labels(key): value for (name, key), value in self._gauges.items()},
+                    "spans": {name: {"count": entry[-2], "sum": round(entry[-1], 6)} for name, entry in self._spans.items()}}
+
+    def prometheus_text(self):
+        """The current values in the Prometheus text exposition format."""
+        lines = []
+        self.collect()
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            spans = {name: list(entry) for name, entry in self._spans.items()}
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+                lines.extend(f"{self.prefix}_{name}{_format_labels(key)} {value}"
+                             for (metric, key), value in sorted(values.items()) if metric == name)
+        if spans:
+            family = f"{self.prefix}_span_seconds"
+            lines.append(f"# TYPE {family} histogram")
+            for name, entry in sorted(spans.items()):
+                key = (("span", name),)
+                for bound, count in zip(SPAN_BUCKETS, entry):
+                    lines.append(f"{family}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+                lines.append(f"{family}_bucket{_format_labels(key, [('le', '+Inf')])} {entry[-2]}")
+                lines.append(f"{family}_sum{_format_labels(key)} {entry[-1]:.6f}")
+                lines.append(f"{family}_count{_format_labels(key)} {entry[-2]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes prometheus_text() to path atomically (for node_exporter's textfile collector)."""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics (Prometheus text) and /metrics.json (snapshot) on a daemon thread. Returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class MetricsExporter:
+    """
+    Periodically rewrites a Prometheus metrics file and/or appends a snapshot line to the
+    metrics' trace, every interval seconds and once more on stop().
+    """
+    def __init__(self, metrics, prometheus_path=None, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        if self.prometheus_path:
+            self.metrics.write_prometheus(self.prometheus_path)
+        self.metrics.trace({"type": "metrics", **self.metrics.snapshot()})
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.export()
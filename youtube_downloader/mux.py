@@ -0,0 +1,54 @@
+"""
+Merging of separately downloaded (adaptive) video and audio streams with ffmpeg.
+Streams are copied into the new container as they are, so muxing is limited by
+disk I/O rather than CPU.
+"""
+import os
+import shutil
+import subprocess
+
+# ffmpeg executable to use; set FFMPEG_BINARY to a full path if it is not on PATH.
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+
+class MuxError(Exception):
+    """Raised when ffmpeg fails to merge the streams."""
+
+
+def find_ffmpeg(binary=FFMPEG_BINARY):
+    """Returns the full path of the ffmpeg executable, or None if it is not installed."""
+    return shutil.which(binary)
+
+
+def mux(video_path, audio_path, output_path, ffmpeg=None):
+    """
+    Merges the video track of video_path and the audio track of audio_path into output_path
+    without re-encoding. The result is written next to output_path first and only moved
+    into place once ffmpeg succeeds.
+    """
+    return run_ffmpeg(["-i", video_path, "-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c", "copy"],
+                      output_path, ffmpeg, "muxing")
+
+
+def run_ffmpeg(arguments, output_path, ffmpeg=None, step="muxing", error=MuxError):
+    """
+    Runs ffmpeg with arguments (inputs and options) writing to a temporary file next to
+    output_path (named after step), which is moved into place once ffmpeg succeeds.
+    Raises error (MuxError by default) if ffmpeg is missing or fails.
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        raise error("ffmpeg was not found. Install it or set FFMPEG_BINARY to its path.")
+    base, extension = os.path.splitext(output_path)
+    tmp_path = f"{base}.{step}{extension}"
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", *arguments, tmp_path]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        message = result.stderr.decode(errors="replace").strip().splitlines()
+        raise error(f"ffmpeg exited with code {result.returncode}: {message[-1] if message else 'no output'}")
+    os.replace(tmp_path, output_path)
+    return output_path
@@ -0,0 +1,184 @@
+"""
+Virtualized playlist table for the Tk app.
+"""
+import queue
+import tkinter as tk
+from tkinter import ttk
+
+# Rows and status changes queued from other threads are applied every FLUSH_MS, in one batch.
+FLUSH_MS = 100
+ROW_HEIGHT = 20
+WHEEL_ROWS = 3 # Rows scrolled per mouse wheel step
+
+
+def format_duration(seconds):
+    if not seconds:
+        return ""
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+def format_size(size):
+    return f"{size / (1024 * 1024):.1f} MB" if size else ""
+
+
+class PlaylistView(ttk.Frame):
+    """
+    Multi-select playlist table that stays fast with tens of thousands of entries.
+    Entries live in compact parallel lists; the Treeview only ever holds the handful of
+    rows that fit on screen, which are refilled in place when the list scrolls or changes.
+    Clicking a row toggles its selection, like a MULTIPLE-mode Listbox.
+
+    append(), set_status() and clear() may be called from any thread: they are queued
+    and applied together every FLUSH_MS. size_for(sizes) decides the Size column from
+    an entry's {itag: filesize} map (e.g. for the currently selected quality).
+    """
+    COLUMNS = (("number", "#", 50, "e"), ("title", "Title", 360, "w"), ("duration", "Duration", 70, "e"),
+               ("size", "Size", 80, "e"), ("status", "Status", 90, "w"))
+
+    def __init__(self, master, height=8, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(self, columns=[name for name, *_ in self.COLUMNS], show="headings",
+                                 height=height, selectmode="none")
+        for name, heading, width, anchor in self.COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, anchor=anchor, stretch=(name == "title"))
+        ttk.Style(self).configure("Playlist.Treeview", rowheight=ROW_HEIGHT)
+        self.tree.configure(style="Playlist.Treeview")
+        self.tree.tag_configure("selected", background="#cce5ff")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.size_for = lambda sizes: 0
+        self._titles = []
+        self._durations = []
+        self._sizes = [] # {itag: filesize} per entry
+        self._statuses = []
+        self._selected = set()
+        self._offset = 0 # Index of the first visible entry
+        self._visible = height # Rows that fit in the Treeview
+        self._slots = [] # Treeview item IDs, one per visible row, reused while scrolling
+        self._updates = queue.Queue()
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<Button-1>", self.on_click)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self._offset - WHEEL_ROWS * (1 if event.delta > 0 else -1)))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self._offset - WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self._offset + WHEEL_ROWS))
+        self.after(FLUSH_MS, self.flush)
+
+    def __len__(self):
+        return len(self._titles)
+
+    # --- Thread-safe updates ---
+
+    def append(self, title, duration=None, sizes=None, status=""):
+        self._updates.put(("append", (title, duration, sizes or {}, status)))
+
+    def set_status(self, index, status):
+        self._updates.put(("status", (index, status)))
+
+    def clear(self):
+        self._updates.put(("clear", None))
+
+    def flush(self):
+        """Applies the queued updates in one go and redraws the visible rows once."""
+        changed = False
+        while True:
+            try:
+                action, args = self._updates.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if action == "append":
+                title, duration, sizes, status = args
+                self._titles.append(title)
+                self._durations.append(duration)
+                self._sizes.append(sizes)
+                self._statuses.append(status)
+            elif action == "status":
+                index, status = args
+                if index < len(self._statuses):
+                    self._statuses[index] = status
+            elif action == "clear":
+                self._titles, self._durations, self._sizes, self._statuses = [], [], [], []
+                self._selected = set()
+                self._offset = 0
+        if changed:
+            self.refresh()
+        self.after(FLUSH_MS, self.flush)
+
+    # --- Selection (main thread) ---
+
+    def selected(self):
+        """Indices of the selected entries, in playlist order."""
+        return sorted(self._selected)
+
+    def select_all(self):
+        self._selected = set(range(len(self._titles)))
+        self.refresh()
+
+    def deselect_all(self):
+        self._selected = set()
+        self.refresh()
+
+    # --- Rendering ---
+
+    def refresh(self):
+        """Refills the visible rows from the backing lists and updates the scrollbar."""
+        total = len(self._titles)
+        self._offset = max(0, min(self._offset, total - self._visible))
+        while len(self._slots) < self._visible:
+            self._slots.append(self.tree.insert("", tk.END))
+        attached = set(self.tree.get_children())
+        for slot, iid in enumerate(self._slots):
+            index = self._offset + slot
+            if slot >= self._visible or index >= total:
+                if iid in attached:
+                    self.tree.detach(iid)
+                continue
+            if iid not in attached:
+                self.tree.reattach(iid, "", slot)
+            title = self._titles[index]
+            values = (index + 1, title if title is not None else "[Error fetching title]",
+                      format_duration(self._durations[index]), format_size(self.size_for(self._sizes[index])),
+                      self._statuses[index])
+            self.tree.item(iid, values=values, tags=("selected",) if index in self._selected else ())
+        if total:
+            self.scrollbar.set(self._offset / total, min(1.0, (self._offset + self._visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, offset):
+        self._offset = offset
+        self.refresh()
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self._titles)))
+        elif action == "scroll":
+            step = self._visible if unit == "pages" else 1
+            self.scroll_to(self._offset + int(amount) * step)
+
+    def on_resize(self, event):
+        first_row = self.tree.bbox(self._slots[0]) if self._slots else None
+        heading_height = first_row[1] if first_row else ROW_HEIGHT
+        visible = max(1, (event.height - heading_height) // ROW_HEIGHT)
+        if visible != self._visible:
+            self._visible = visible
+            self.refresh()
+
+    def on_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "cell":
+            return None # Headings and column separators keep their normal behaviour
+        iid = self.tree.identify_row(event.y)
+        if iid in self._slots:
+            index = self._offset + self._slots.index(iid)
+            if index < len(self._titles):
+                self._selected ^= {index}
+                self.refresh()
+        return "break" # Rows are recycled, so the Treeview's own selection is not used
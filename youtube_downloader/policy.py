@@ -0,0 +1,152 @@
+"""
+Declarative quality policies: rules such as 'best <=1080p, prefer avc1, cap 500M else
+best audio' that pick each video's stream from its own stream list.
+"""
+import re
+
+from .streams import quality_number
+
+# Units accepted by size caps such as '500M' or '1.5GB' (binary, like the MB figures shown elsewhere).
+_SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    """Parses a size such as '500M', '500 MB' or '1.5G' into bytes."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG])I?B?", text.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid size '{text}'; use e.g. 500M or 1.5G.")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def _codec_matches(codec, wanted):
+    return (codec or "").lower().startswith(wanted)
+
+
+class QualityRule:
+    """
+    One rule of a QualityPolicy: comma-separated terms that all have to hold.
+
+        best                 highest quality that satisfies the other terms (the default)
+        audio / best audio   an audio-only stream instead of a video
+        <=1080p, >=480p      resolution bounds (a bare '1080p' means at most 1080p)
+        <=30fps, <=128kbps   frame rate / audio bitrate bounds
+        cap 500M, <=500M     size limit (video and audio together for merged downloads)
+        prefer avc1          favour a codec among otherwise equal streams
+        only avc1            require a codec
+        progressive          only single-file streams, never video + audio merged with ffmpeg
+    """
+    def __init__(self, text):
+        self.text = text.strip()
+        self.audio = False
+        self.max_height = self.min_height = self.max_fps = self.max_abr = self.max_size = None
+        self.prefer_codec = self.codec = None
+        self.progressive = False
+        for term in filter(None, (term.strip() for term in self.text.lower().split(","))):
+            self.parse_term(term.replace("≤", "<=").replace("≥", ">="))
+
+    def parse_term(self, term):
+        if term == "best":
+            return
+        if term.startswith("best "):
+            self.parse_term(term[5:].strip()) # 'best <=1080p', 'best audio'
+        elif term in ("audio", "best audio", "audio only"):
+            self.audio = True
+        elif term in ("progressive", "no merge"):
+            self.progressive = True
+        elif match := re.fullmatch(r"(?:<=|max|at most)?\s*(\d+)p", term):
+            self.max_height = int(match.group(1))
+        elif match := re.fullmatch(r"(?:>=|min|at least)\s*(\d+)p", term):
+            self.min_height = int(match.group(1))
+        elif match := re.fullmatch(r"(?:<=|max)?\s*(\d+)\s*fps", term):
+            self.max_fps = int(match.group(1))
+        elif match := re.fullmatch(r"(?:<=|max)?\s*(\d+)\s*kbps", term):
+            self.max_abr = int(match.group(1))
+        elif match := re.fullmatch(r"(?:cap|<=|max|under)\s*(.+)", term):
+            self.max_size = parse_size(match.group(1))
+        elif match := re.fullmatch(r"prefer\s+([\w.]+)", term):
+            self.prefer_codec = match.group(1)
+        elif match := re.fullmatch(r"(?:only|codec)\s+([\w.]+)", term):
+            self.codec = match.group(1)
+        else:
+            raise ValueError(f"Unknown quality policy term '{term}'.")
+
+    def __str__(self):
+        return self.text
+
+    def prefers(self, codec):
+        return self.prefer_codec is not None and _codec_matches(codec, self.prefer_codec)
+
+    def fits(self, size):
+        return self.max_size is None or not size or size <= self.max_size # Unknown sizes are given the benefit of the doubt
+
+    def choose(self, streams, adaptive=False):
+        """Returns (itag, label, filesize) of the best stream descriptor matching this rule, or None."""
+        if self.audio:
+            candidates = [(quality_number(s["abr"]), self.prefers(s["audio_codec"]),
+                           -s["filesize"], s["itag"], s["abr"], s["filesize"])
+                          for s in streams if s["type"] == "audio" and s["subtype"] == "mp4" and s["abr"]
+                          and (self.max_abr is None or quality_number(s["abr"]) <= self.max_abr)
+                          and (self.codec is None or _codec_matches(s["audio_codec"], self.codec))
+                          and self.fits(s["filesize"])]
+        else:
+            audio = [s for s in streams if s["type"] == "audio" and not s["progressive"] and s["subtype"] == "mp4" and s["abr"]]
+            best_audio = max(audio, key=lambda s: quality_number(s["abr"]), default=None)
+            candidates = []
+            for s in streams:
+                if s["type"] != "video" or s["subtype"] != "mp4" or not s["resolution"]:
+                    continue
+                if not s["progressive"] and (self.progressive or not adaptive or best_audio is None):
+                    continue
+                height, fps = quality_number(s["resolution"]), s["fps"] or 0
+                itag, size = s["itag"], s["filesize"]
+                if not s["progressive"]:
+                    itag, size = f"{s['itag']}+{best_audio['itag']}", size and size + best_audio["filesize"]
+                if (self.max_height is not None and height > self.max_height) \
+                        or (self.min_height is not None and height < self.min_height) \
+                        or (self.max_fps is not None and fps > self.max_fps) \
+                        or (self.codec is not None and not _codec_matches(s["video_codec"], self.codec)) \
+                        or not self.fits(size):
+                    continue
+                # Highest resolution first; then the preferred codec, higher frame rate, no merge, smaller file
+                candidates.append((height, self.prefers(s["video_codec"]), fps,
+                                   s["progressive"], -size, itag, s["resolution"], size))
+        if not candidates:
+            return None
+        *_, itag, label, size = max(candidates, key=lambda candidate: candidate[:-3]) # Ranked on the leading fields
+        return itag, label, size
+
+
+class QualityPolicy:
+    """
+    Ordered quality rules separated by 'else' (or ';'); the first rule that matches one of
+    a video's streams decides what is downloaded, e.g.
+    'best <=1080p, prefer avc1, cap 500M else best audio'. See QualityRule for the terms.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+    @classmethod
+    def parse(cls, text):
+        rules = [QualityRule(part) for part in re.split(r";|\belse\b", text or "", flags=re.IGNORECASE) if part.strip()]
+        if not rules:
+            raise ValueError("A quality policy needs at least one rule, e.g. 'best <=1080p else best audio'.")
+        return cls(rules)
+
+    def __str__(self):
+        return " else ".join(str(rule) for rule in self.rules)
+
+    def choose(self, streams, adaptive=False):
+        """
+        Picks a stream from streams (descriptors as built by describe_streams). adaptive
+        allows video + audio pairs merged with ffmpeg. Returns a dict with 'itag' (as
+        accepted by parse_selection), 'label' (e.g. '720p' or '128kbps'), 'download_type'
+        ('video' or 'audio'), 'filesize', 'rule' (1-based number of the rule that matched)
+        and 'rule_text', or None if no rule matches.
+        """
+        for number, rule in enumerate(self.rules, start=1):
+            picked = rule.choose(streams, adaptive)
+            if picked is not None:
+                itag, label, size = picked
+                return {"itag": itag, "label": label, "download_type": "audio" if rule.audio else "video",
+                        "filesize": size, "rule": number, "rule_text": str(rule)}
+        return None
@@ -0,0 +1,78 @@
+"""
+Download progress shared between worker threads and whoever displays it.
+"""
+import threading
+import time
+
+# Seconds over which the speed readout is averaged.
+SPEED_WINDOW = 3.0
+
+
+class ProgressTracker:
+    """
+    Thread-safe byte counters shared by any number of running downloads.
+    Workers call update() as often as data arrives, which only touches a few
+    counters; readers call snapshot() at their own pace to get totals, speed and ETA.
+    """
+    def __init__(self, speed_window=SPEED_WINDOW):
+        self.speed_window = speed_window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets all downloads, e.g. before a new batch starts."""
+        with self._lock:
+            self._downloads = {} # key -> [downloaded_bytes, total_bytes, finished]
+            self._transferred = 0 # Bytes received in this session, excluding resumed data
+            self._samples = [] # (time.monotonic(), transferred) taken by snapshot()
+
+    def update(self, key, downloaded_bytes, total_bytes):
+        """
+        Records that download key has downloaded_bytes of total_bytes on disk.
+        The first report for a key sets its baseline, so bytes resumed from an earlier
+        attempt count towards the total but not towards the speed.
+        """
+        with self._lock:
+            entry = self._downloads.get(key)
+            if entry is None:
+                self._downloads[key] = [downloaded_bytes, total_bytes, False]
+                return
+            self._transferred += max(0, downloaded_bytes - entry[0])
+            entry[0] = downloaded_bytes
+            entry[1] = total_bytes
+
+    def get(self, key):
+        """Returns (downloaded_bytes, total_bytes) of download key, or None if it hasn't reported yet."""
+        with self._lock:
+            entry = self._downloads.get(key)
+            return (entry[0], entry[1]) if entry else None
+
+    def finish(self, key):
+        """Marks a download as no longer active."""
+        with self._lock:
+            if key in self._downloads:
+                self._downloads[key][2] = True
+
+    def snapshot(self):
+        """
+        Returns a dict with 'downloaded' and 'total' bytes, 'percent', 'speed' in bytes per
+        second averaged over the last speed_window seconds, 'eta' in seconds (or None)
+        and the number of 'active' downloads.
+        """
+        now = time.monotonic()
+        with self._lock:
+            downloaded = sum(entry[0] for entry in self._downloads.values())
+            total = sum(entry[1] for entry in self._downloads.values())
+            active = sum(1 for entry in self._downloads.values() if not entry[2])
+            self._samples.append((now, self._transferred))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.speed_window:
+                self._samples.pop(0)
+            (first_time, first_bytes), (last_time, last_bytes) = self._samples[0], self._samples[-1]
+        speed = (last_bytes - first_bytes) / (last_time - first_time) if last_time > first_time else 0.0
+        remaining = max(0, total - downloaded)
+        return {"downloaded": downloaded,
+                "total": total,
+                "percent": (downloaded / total) * 100 if total else 0,
+                "speed": speed,
+                "eta": remaining / speed if speed > 0 else None,
+                "active": active}
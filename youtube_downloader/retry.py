@@ -0,0 +1,196 @@
+"""
+Retrying transient network errors: exponential backoff with jitter, per-operation
+attempt and time budgets, and a circuit breaker that holds every request back for a
+while once YouTube starts answering with 403/429 (throttling).
+"""
+import http.client
+import random
+import threading
+import time
+import urllib.error
+
+from .control import DownloadCancelled
+
+# HTTP statuses worth another try. 403 and 429 are how YouTube throttles, so they also
+# count towards the circuit breaker.
+RETRY_STATUSES = {403, 408, 429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {403, 429}
+
+# Metadata lookups (watch pages, player responses, playlist pages): few, short retries,
+# so a lookup still finishes within the playlist item timeout.
+METADATA_ATTEMPTS = 3
+METADATA_BASE_DELAY = 1.0
+METADATA_MAX_DELAY = 8.0
+METADATA_BUDGET = 20 # Seconds of retrying per lookup
+# Media transfers: more patience; every retry resumes from the last byte written.
+MEDIA_ATTEMPTS = 6
+MEDIA_BASE_DELAY = 2.0
+MEDIA_MAX_DELAY = 60.0
+MEDIA_BUDGET = 300 # Seconds of retrying per range without any progress
+
+# Circuit breaker: BREAKER_THRESHOLD throttling responses within BREAKER_WINDOW seconds
+# open it for BREAKER_COOLDOWN seconds, doubling (up to BREAKER_MAX_COOLDOWN) each time
+# it opens again before a request has succeeded.
+BREAKER_THRESHOLD = 5
+BREAKER_WINDOW = 30
+BREAKER_COOLDOWN = 15
+BREAKER_MAX_COOLDOWN = 300
+BREAKER_POLL_INTERVAL = 0.2 # How often a held-back request re-checks its DownloadControl
+
+
+def http_status(error):
+    """The HTTP status behind error (urllib's HTTPError or pytubefix's wrapper of it), or None."""
+    while error is not None:
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_retryable(error):
+    """Whether error is a transient network failure (dropped connection, timeout, 5xx, throttling)."""
+    if isinstance(error, DownloadCancelled):
+        return False
+    status = http_status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError, http.client.HTTPException))
+
+
+def is_throttled(error):
+    return http_status(error) in THROTTLE_STATUSES
+
+
+class RetryPolicy:
+    """
+    How often and how patiently an operation is retried: at most attempts tries in total,
+    and no new try once budget seconds have passed since the first one. Before try n+1 it
+    waits a random time between 0 and min(max_delay, base_delay * 2**(n-1)) ("full
+    jitter"), so workers that failed together don't all come back at the same moment.
+    """
+    def __init__(self, attempts, base_delay, max_delay, budget):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    @classmethod
+    def metadata(cls, attempts=METADATA_ATTEMPTS):
+        return cls(attempts, METADATA_BASE_DELAY, METADATA_MAX_DELAY, METADATA_BUDGET)
+
+    @classmethod
+    def media(cls, attempts=MEDIA_ATTEMPTS):
+        return cls(attempts, MEDIA_BASE_DELAY, MEDIA_MAX_DELAY, MEDIA_BUDGET)
+
+    def delay(self, attempt):
+        """Seconds to wait after failed try number attempt (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def next_delay(self, attempt, started, error):
+        """
+        The wait before another try after try number attempt failed with error, or None if
+        the error is permanent or the attempts or time budget (counted from started, a
+        time.monotonic() value) are used up.
+        """
+        if not is_retryable(error) or attempt >= self.attempts:
+            return None
+        delay = self.delay(attempt)
+        if time.monotonic() + delay - started > self.budget:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Shared by every request of an engine. record() is told the outcome of each request;
+    once threshold throttling responses arrive within window seconds the breaker opens,
+    and wait() holds every caller back until the cooldown has passed, instead of letting
+    all workers keep hammering (and failing against) a server that is throttling them.
+    The cooldown doubles each time the breaker trips again and resets after a success.
+    """
+    def __init__(self, threshold=BREAKER_THRESHOLD, window=BREAKER_WINDOW, cooldown=BREAKER_COOLDOWN,
+                 max_cooldown=BREAKER_MAX_COOLDOWN, on_open=None):
+        self.threshold = max(1, threshold)
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.on_open = on_open # on_open(seconds) is called each time the breaker trips
+        self.trips = 0
+        self._cooldown = cooldown
+        self._throttled = [] # time.monotonic() of recent throttling responses
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def open_for(self):
+        """Seconds until the breaker closes again (0 when it is closed)."""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+    def record(self, error=None):
+        """Records a request's outcome: error None for a success, else the exception it raised."""
+        if error is None:
+            with self._lock:
+                if not self._throttled and time.monotonic() >= self._open_until:
+                    self._cooldown = self.base_cooldown
+            return
+        if not is_throttled(error):
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._throttled = [at for at in self._throttled if now - at < self.window] + [now]
+            if len(self._throttled) < self.threshold or now < self._open_until:
+                return
+            seconds = self._cooldown
+            self._open_until = now + seconds
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._throttled = []
+            self.trips += 1
+        if self.on_open:
+            self.on_open(seconds)
+
+    def wait(self, control=None):
+        """Blocks while the breaker is open; raises DownloadCancelled if control is cancelled meanwhile."""
+        while (remaining := self.open_for) > 0:
+            if control is not None:
+                control.checkpoint()
+            time.sleep(min(remaining, BREAKER_POLL_INTERVAL))
+
+
+def sleep(seconds, control=None):
+    """time.sleep(seconds) that wakes up to raise DownloadCancelled if control is cancelled."""
+    deadline = time.monotonic() + seconds
+    while (remaining := deadline - time.monotonic()) > 0:
+        if control is not None:
+            control.checkpoint()
+        time.sleep(min(remaining, BREAKER_POLL_INTERVAL))
+
+
+def call_with_retry(func, policy, breaker=None, control=None, on_retry=None):
+    """
+    Returns func(), trying again according to policy (a RetryPolicy) while it fails with
+    a transient error. Every try first waits for breaker (a CircuitBreaker) to close and
+    reports its outcome to it. on_retry(attempt, delay, error) is called before each wait.
+    The last error is re-raised once the policy gives up.
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker is not None:
+            breaker.wait(control)
+        try:
+            result = func()
+        except Exception as e:
+            if breaker is not None:
+                breaker.record(e)
+            delay = policy.next_delay(attempt, started, e)
+            if delay is None:
+                raise
+            if on_retry:
+                on_retry(attempt, delay, e)
+            sleep(delay, control)
+            continue
+        if breaker is not None:
+            breaker.record()
+        return result
@@ -0,0 +1,219 @@
+"""
+Concurrency helpers: in-order resolution of playlist entries on a bounded thread
+pool, and the scheduler that runs several downloads at once.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .progress import ProgressTracker
+
+# Playlist metadata resolution: how many YouTube() lookups may be in flight at once,
+# and how long (in seconds) a single entry may take before it is given up on.
+PLAYLIST_FETCH_WORKERS = 8
+PLAYLIST_ITEM_TIMEOUT = 30
+
+# Playlist downloads: how many jobs may run at once overall, and per media host.
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_WORKERS_PER_HOST = 2
+
+
+def resolve_in_order(items, resolve, max_workers=PLAYLIST_FETCH_WORKERS, item_timeout=PLAYLIST_ITEM_TIMEOUT):
+    """
+    Calls resolve(item) for every item using a bounded pool of worker threads.
+    Yields (index, item, result, error) tuples in input order, each one as soon as it
+    and everything before it has finished. An item that runs longer than item_timeout
+    seconds is yielded with a TimeoutError so it cannot stall the rest of the batch.
+    items may be a lazy iterator (e.g. a paginated playlist): it is advanced on a separate
+    thread, so a slow next() never delays results that are already available.
+    """
+    items = iter(items)
+    started = {} # index -> time.monotonic() when a worker picked the item up
+    pending = {} # future -> (index, item)
+    finished = {} # index -> (item, result, error), waiting for earlier items
+    next_submit = 0
+    next_yield = 0
+    exhausted = False
+    end = object() # Returned by next(items, end) once the iterator is exhausted
+    next_item = None # Future of the next() call in flight on the feeder thread
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return resolve(item)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    feeder = ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            # Keep at most max_workers items in flight; the rest stay in the iterator.
+            if next_item is None and not exhausted and len(pending) < max_workers:
+                next_item = feeder.submit(next, items, end)
+            if next_item is not None and next_item.done():
+                item = next_item.result() # Re-raises errors from the iterator itself
+                next_item = None
+                if item is end:
+                    exhausted = True
+                else:
+                    pending[executor.submit(run, next_submit, item)] = (next_submit, item)
+                    next_submit += 1
+                continue
+
+            while next_yield in finished:
+                item, result, error = finished.pop(next_yield)
+                yield next_yield, item, result, error
+                next_yield += 1
+
+            if not pending and next_item is None:
+                break
+
+            deadlines = [started[index] + item_timeout for index, _ in pending.values() if index in started]
+            wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else item_timeout
+            done, _ = wait([*pending, *filter(None, [next_item])], timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future is next_item:
+                    continue # Handled at the top of the loop
+                index, item = pending.pop(future)
+                try:
+                    finished[index] = (item, future.result(), None)
+                except Exception as e:
+                    finished[index] = (item, None, e)
+
+            now = time.monotonic()
+            for future, (index, item) in list(pending.items()):
+                if index in started and now - started[index] >= item_timeout:
+                    # The worker thread cannot be interrupted; its late result is simply dropped.
+                    del pending[future]
+                    finished[index] = (item, None, TimeoutError(f"timed out after {item_timeout}s"))
+    finally:
+        feeder.shutdown(wait=False, cancel_futures=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DownloadJob:
+    """Progress bookkeeping for one download handled by a DownloadScheduler."""
+    def __init__(self, number, title, control=None):
+        self.number = number # 1-based position in the batch, used for the filename prefix
+        self.title = title
+        self.control = control # DownloadControl to pause or cancel just this job
+        self.status = "queued" # queued -> downloading (-> converting) -> done / failed / skipped / cancelled
+        self.rule = None # Number of the quality policy rule that picked the stream, if a policy is used
+        self.total_bytes = 0
+        self.downloaded_bytes = 0
+        self.error = None
+
+
+class DownloadScheduler:
+    """
+    Runs download jobs concurrently on a bounded pool of worker threads.
+    At most max_workers jobs run at once, and at most per_host_limit of them
+    may be transferring from the same host (see host_slot()). With metrics (a Metrics
+    registry), the download_queue_depth and active_downloads gauges follow the jobs and
+    downloads_total counts them by final status.
+    """
+    def __init__(self, max_workers=DOWNLOAD_WORKERS, per_host_limit=DOWNLOAD_WORKERS_PER_HOST, progress=None,
+                 metrics=None):
+        self.max_workers = max(1, max_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.progress_tracker = progress or ProgressTracker() # Shared with whoever displays progress
+        self.metrics = metrics
+        self.jobs = []
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._finished_at = None
+
+    def host_slot(self, url):
+        """Returns the semaphore limiting concurrent transfers from the host serving url."""
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def update(self, job, downloaded_bytes, total_bytes):
+        """Records progress for a job. Safe to call from any worker thread."""
+        with self._lock:
+            job.downloaded_bytes = downloaded_bytes
+            job.total_bytes = total_bytes
+        self.progress_tracker.update(job.number, downloaded_bytes, total_bytes)
+
+    def progress(self):
+        """Returns (downloaded_bytes, total_bytes) summed over all jobs."""
+        with self._lock:
+            return (sum(job.downloaded_bytes for job in self.jobs),
+                    sum(job.total_bytes for job in self.jobs))
+
+    def throughput(self):
+        """Returns the aggregate download rate in bytes per second since run() started."""
+        if self._started_at is None:
+            return 0.0
+        elapsed = (self._finished_at or time.monotonic()) - self._started_at
+        downloaded, _ = self.progress()
+        return downloaded / elapsed if elapsed > 0 else 0.0
+
+    def run(self, jobs, work):
+        """
+        Calls work(job) for every job and blocks until all of them have finished.
+        jobs may be a generator: each job starts as soon as it is produced (and a worker
+        is free), while later ones are still being produced. jobs is read as fast as it
+        produces jobs; a generator that should wait for a free worker blocks itself (see
+        run_queue() and download_playlist() in core.py).
+        A job is marked 'failed' if work raises; otherwise work sets the final status.
+        work may also return a Future for a last step that doesn't need the download worker
+        (e.g. transcoding the audio): the worker moves on to the next job right away, and
+        the job counts as finished (or 'failed', if the Future raises) once the Future is
+        done. run() waits for those Futures too.
+        """
+        self.jobs = []
+        self._started_at = time.monotonic()
+        self._finished_at = None
+
+        metrics = self.metrics
+        pending = [] # Set once the job of a Future returned by work has finished
+
+        def finish(job, future=None, finished=None):
+            if future is not None and future.exception() is not None:
+                job.status = "failed"
+                job.error = future.exception()
+            self.progress_tracker.finish(job.number)
+            if metrics is not None:
+                metrics.inc("downloads_total", status=job.status)
+                if job.status == "failed":
+                    metrics.inc("failures_total", stage="download")
+            if finished is not None:
+                finished.set()
+
+        def run_job(job):
+            job.status = "downloading"
+            if metrics is not None:
+                metrics.add_gauge("download_queue_depth", -1)
+                metrics.add_gauge("active_downloads", 1)
+            result = None
+            try:
+                result = work(job)
+            except Exception as e:
+                job.status = "failed"
+                job.error = e
+            finally:
+                if metrics is not None:
+                    metrics.add_gauge("active_downloads", -1)
+            if isinstance(result, Future):
+                finished = threading.Event() # Future waiters wake up before its callbacks have run
+                with self._lock:
+                    pending.append(finished)
+                result.add_done_callback(lambda future: finish(job, future, finished))
+            else:
+                finish(job)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for job in jobs:
+                with self._lock:
+                    self.jobs.append(job)
+                if metrics is not None:
+                    metrics.add_gauge("download_queue_depth", 1)
+                executor.submit(run_job, job)
+        for finished in pending:
+            finished.wait()
+        self._finished_at = time.monotonic()
+        return self.jobs
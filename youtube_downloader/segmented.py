@@ -0,0 +1,316 @@
+"""
+Segmented, resumable HTTP downloads: parallel byte-range requests written in place
+(through a FileWriter) into a preallocated '.part' file, with a sidecar manifest of the
+completed ranges. The file's digest (see integrity) is computed as it is written.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from .control import DownloadCancelled
+from .integrity import HASH_BLOCK_SIZE, BlockHasher
+from .retry import sleep
+from .writer import FileWriter, preallocate
+
+# Segmented downloads: streams at least SEGMENT_THRESHOLD bytes are fetched over
+# DOWNLOAD_SEGMENTS parallel HTTP range requests instead of one sequential connection.
+SEGMENT_THRESHOLD = 32 * 1024 * 1024
+DOWNLOAD_SEGMENTS = 4
+RANGE_REQUEST_SIZE = 9 * 1024 * 1024 # Largest single range request, same as pytubefix uses
+READ_CHUNK_SIZE = 256 * 1024
+HTTP_TIMEOUT = 30
+MANIFEST_SAVE_INTERVAL = 2 # Seconds between .part.json manifest updates while downloading
+
+
+class RangeNotSupportedError(Exception):
+    """Raised when a server ignores a byte range request and sends something else."""
+
+
+class PartialDownload:
+    """
+    On-disk state of an unfinished download: a preallocated '<file>.part' file and a
+    '<file>.part.json' sidecar manifest recording the stream (URL, itag, video ID),
+    its expected filesize and the byte ranges already written to the .part file.
+    digest is the finished file's digest once a SegmentedDownloader has completed it.
+    """
+    def __init__(self, file_path, filesize, url="", itag=None, video_id=None):
+        self.file_path = file_path
+        self.part_path = file_path + ".part"
+        self.manifest_path = self.part_path + ".json"
+        self.filesize = filesize
+        self.url = url
+        self.itag = itag
+        self.video_id = video_id
+        self.completed = [] # Sorted, non-overlapping [start, end) ranges
+        self.digest = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # Serializes manifest writes from the segment threads
+        self._last_saved = 0.0
+
+    @classmethod
+    def open(cls, file_path, filesize, url="", itag=None, video_id=None):
+        """
+        Returns the partial state for file_path, picking up an earlier attempt when its
+        manifest describes the same stream and its .part file is intact. Otherwise any
+        stale state is discarded and a fresh, preallocated .part file is created.
+        """
+        state = cls(file_path, filesize, url, itag, video_id)
+        if not state.load():
+            with open(state.part_path, "wb") as f:
+                preallocate(f.fileno(), filesize)
+            state.completed = []
+            state.save()
+        return state
+
+    def load(self):
+        """Loads completed ranges from an existing manifest. Returns False if there is nothing usable."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            part_size = os.path.getsize(self.part_path)
+        except (OSError, ValueError):
+            return False
+        if (manifest.get("filesize") != self.filesize or part_size != self.filesize
+                or manifest.get("itag") != self.itag or manifest.get("video_id") != self.video_id):
+            return False # Different stream (or a truncated .part file): start over
+        for start, end in manifest.get("completed", []):
+            start, end = max(0, int(start)), min(self.filesize, int(end))
+            if start < end:
+                self._add_range(start, end)
+        return True
+
+    def save(self):
+        """Writes the manifest atomically, so a crash never leaves a half-written one behind."""
+        with self._lock:
+            manifest = {"url": self.url, "itag": self.itag, "video_id": self.video_id,
+                        "filesize": self.filesize, "completed": [list(r) for r in self.completed]}
+            self._last_saved = time.monotonic()
+        tmp_path = self.manifest_path + ".tmp"
+        with self._save_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+
+    def mark_done(self, start, end):
+        """Records that bytes [start, end) are on disk; saves the manifest every MANIFEST_SAVE_INTERVAL seconds."""
+        with self._lock:
+            self._add_range(start, end)
+            due = time.monotonic() - self._last_saved >= MANIFEST_SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def _add_range(self, start, end):
+        """Inserts [start, end) into self.completed, merging touching ranges. Caller holds the lock."""
+        merged = []
+        for r_start, r_end in self.completed:
+            if r_end < start or r_start > end:
+                merged.append((r_start, r_end))
+            else:
+                start, end = min(start, r_start), max(end, r_end)
+        merged.append((start, end))
+        merged.sort()
+        self.completed = merged
+
+    @property
+    def completed_bytes(self):
+        with self._lock:
+            return sum(end - start for start, end in self.completed)
+
+    def missing(self):
+        """Returns the [start, end) ranges that still have to be downloaded."""
+        with self._lock:
+            gaps, position = [], 0
+            for start, end in self.completed:
+                if start > position:
+                    gaps.append((position, start))
+                position = max(position, end)
+            if position < self.filesize:
+                gaps.append((position, self.filesize))
+            return gaps
+
+    def finish(self):
+        """Checks that the whole file is present, then moves the .part file into place."""
+        if self.missing() or os.path.getsize(self.part_path) != self.filesize:
+            raise IOError(f"Incomplete download: {self.completed_bytes} of {self.filesize} bytes present.")
+        os.replace(self.part_path, self.file_path)
+        self.discard()
+
+    def discard(self):
+        """Removes the manifest (and the .part file, if it is still there)."""
+        for leftover in (self.part_path, self.manifest_path):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+
+class SegmentedDownloader:
+    """
+    Downloads a file of known size over several parallel HTTP range requests.
+    Segments hand their bytes to a FileWriter thread that writes them in place into the
+    preallocated .part file of a PartialDownload, so they can finish in any order and an
+    interrupted download only has to fetch the ranges that are still missing; a range
+    counts as done once it is on disk (synced first with fsync 'checkpoint', see writer).
+    throttle(nbytes), if given, is called after every chunk and blocks to keep the
+    download under its bandwidth cap. With metrics (a Metrics registry), received bytes
+    are counted in downloaded_bytes_total and the writer times its writes. With retry (a
+    RetryPolicy), a range request that fails with a transient error is sent again from the
+    last byte written, after the policy's backoff; breaker (a CircuitBreaker) holds requests back while it is open, and
+    on_retry(offset, attempt, delay, error) is called before each backoff. Requests go
+    through opener (a urllib OpenerDirector, e.g. httppool.build_opener()) if given, and
+    urllib.request.urlopen otherwise.
+    """
+    def __init__(self, segments=DOWNLOAD_SEGMENTS, request_size=RANGE_REQUEST_SIZE,
+                 chunk_size=READ_CHUNK_SIZE, timeout=HTTP_TIMEOUT, throttle=None, metrics=None,
+                 retry=None, breaker=None, on_retry=None, fsync="off", opener=None):
+        self.segments = max(1, segments)
+        self.request_size = request_size
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.throttle = throttle
+        self.metrics = metrics
+        self.retry = retry
+        self.breaker = breaker
+        self.on_retry = on_retry
+        self.fsync = fsync
+        self.urlopen = opener.open if opener is not None else urllib.request.urlopen
+        self.headers = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+
+    def split(self, ranges):
+        """
+        Splits [start, end) ranges into roughly self.segments pieces of similar size. Pieces
+        are a multiple of HASH_BLOCK_SIZE long, so each hashed block comes from one piece.
+        """
+        total = sum(end - start for start, end in ranges)
+        if not total:
+            return []
+        step = max(self.chunk_size, -(-total // self.segments)) # Ceiling division
+        step = -(-step // HASH_BLOCK_SIZE) * HASH_BLOCK_SIZE
+        return [(start, min(start + step, end)) for range_start, end in ranges for start in range(range_start, end, step)]
+
+    def download(self, url, state, on_progress=None, control=None):
+        """
+        Downloads the missing ranges of state from url and moves the finished file into
+        place, setting state.digest; only ranges written by an earlier attempt are read back
+        to compute it. on_progress(bytes_downloaded, filesize) is called from the worker threads
+        after every chunk that is received; bytes from an earlier attempt count as downloaded.
+        If a DownloadControl is given, every segment checks it between chunks: pausing
+        closes the connections (the bytes so far stay in the .part file) until resumed, and
+        cancelling stops all segments, closes the file and raises DownloadCancelled.
+        """
+        if not state.filesize:
+            raise ValueError("A segmented download needs the file size up front.")
+
+        received = [state.completed_bytes]
+        received_lock = threading.Lock()
+
+        def on_chunk(length):
+            with received_lock:
+                received[0] += length
+                downloaded = received[0]
+            if on_progress:
+                on_progress(downloaded, state.filesize)
+
+        fd = os.open(state.part_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        hasher = BlockHasher(state.filesize)
+        writer = FileWriter(fd, lambda offset, length: state.mark_done(offset, offset + length), self.fsync,
+                            metrics=self.metrics, hasher=hasher)
+
+        def on_pause():
+            writer.flush()
+            state.save()
+
+        try:
+            try:
+                pieces = self.split(state.missing())
+                if pieces:
+                    with ThreadPoolExecutor(max_workers=min(self.segments, len(pieces))) as executor:
+                        futures = [executor.submit(self.fetch_range, url, writer, start, end, on_chunk, control, on_pause)
+                                   for start, end in pieces]
+                        for future in futures:
+                            future.result() # Re-raises the first failed segment
+            finally:
+                writer.close() # Writes out what is still buffered, also when a segment failed
+            state.digest = hasher.hexdigest(fd)
+            if self.metrics is not None:
+                self.metrics.inc("hash_reread_bytes_total", hasher.reread_bytes)
+        except DownloadCancelled:
+            os.close(fd)
+            fd = None
+            if control.keeps_partial:
+                state.save()
+            else:
+                state.discard()
+            raise
+        finally:
+            if fd is not None:
+                os.close(fd)
+                state.save() # Keep the finished ranges even if a segment failed
+
+        state.finish()
+        return state.file_path
+
+    def fetch_range(self, url, writer, start, end, on_chunk, control=None, on_pause=None):
+        """
+        Fetches bytes [start, end) of url and hands them to writer (a FileWriter) for the
+        same offsets of the file; on_chunk(length) is called after every chunk.
+        While control is paused the connection is closed, on_pause() is called once and the
+        range continues with a new request after resume(). Transient errors are retried
+        (see the class docstring); the attempts start over whenever a request made progress.
+        """
+        offset = start
+        attempt, failing_since = 0, None
+        while offset < end:
+            if control is not None:
+                if control.paused and on_pause:
+                    on_pause()
+                control.checkpoint()
+            if self.breaker is not None:
+                self.breaker.wait(control)
+            request_start = offset
+            request_end = min(offset + self.request_size, end)
+            try:
+                with self.urlopen(self.range_request(url, offset, request_end), timeout=self.timeout) as response:
+                    # A full 200 response is only acceptable when it is exactly the range we asked for
+                    if response.status != 206 and response.headers.get("Content-Length") != str(request_end - offset):
+                        raise RangeNotSupportedError(f"Server answered a range request with HTTP {response.status}.")
+                    while offset < request_end:
+                        if control is not None and (control.paused or control.cancelled):
+                            break # Drop the connection; the outer loop waits or raises
+                        chunk = response.read(min(self.chunk_size, request_end - offset))
+                        if not chunk:
+                            raise ConnectionError(f"Connection closed at byte {offset}, expected data up to {request_end}.")
+                        writer.write(offset, chunk) # Blocks while the disk is behind
+                        if self.metrics is not None:
+                            self.metrics.inc("downloaded_bytes_total", len(chunk))
+                        on_chunk(len(chunk))
+                        offset += len(chunk)
+                        if self.throttle:
+                            self.throttle(len(chunk))
+            except Exception as e:
+                if self.breaker is not None:
+                    self.breaker.record(e)
+                if offset > request_start or failing_since is None:
+                    attempt, failing_since = 0, time.monotonic()
+                attempt += 1
+                delay = self.retry.next_delay(attempt, failing_since, e) if self.retry else None
+                if delay is None:
+                    raise
+                if self.on_retry:
+                    self.on_retry(offset, attempt, delay, e)
+                sleep(delay, control)
+                continue
+            if self.breaker is not None:
+                self.breaker.record()
+
+    def range_request(self, url, start, end):
+        """Builds the request for bytes [start, end) of url."""
+        if (urlsplit(url).hostname or "").endswith("googlevideo.com"):
+            # YouTube's media servers take the range as a query parameter (like pytubefix does)
+            return urllib.request.Request(f"{url}&range={start}-{end - 1}", headers=self.headers)
+        return urllib.request.Request(url, headers={**self.headers, "Range": f"bytes={start}-{end - 1}"})
+
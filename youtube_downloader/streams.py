@@ -0,0 +1,138 @@
+"""
+URL parsing, stream descriptions and quality selection: the helpers the engine, the job
+queue, quality policies and the front ends share. Nothing in this module imports
+pytubefix, so the command line can parse URLs and qualities without loading it.
+"""
+import re
+
+
+def is_youtube_url(url):
+    """Basic check that url looks like a YouTube video or playlist URL."""
+    return any(marker in url for marker in ("youtube.com/watch?v=", "youtube.com/playlist?list=",
+                                            "youtu.be/", "music.youtube.com/watch?v="))
+
+
+def is_playlist_url(url):
+    """True for playlist pages (a 'list' parameter without a specific video)."""
+    return playlist_id_from_url(url) is not None and video_id_from_url(url) is None
+
+
+def sanitize_filename(title):
+    """Sanitizes a string to be used as a filename."""
+    # Remove invalid characters
+    s = re.sub(r'[\\/:*?"<>|]', '', title)
+    # Replace multiple spaces/underscores with a single underscore
+    s = re.sub(r'\s+', '_', s)
+    s = re.sub(r'_+', '_', s)
+    # Remove leading/trailing underscores
+    s = s.strip('_')
+    # Limit length to avoid very long filenames
+    s = s[:100] 
+    return s
+
+
+def video_id_from_url(url):
+    """Extracts the 11-character video ID from a watch, youtu.be, shorts or embed URL, or returns None."""
+    match = re.search(r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([0-9A-Za-z_-]{11})", url)
+    return match.group(1) if match else None
+
+
+def playlist_id_from_url(url):
+    """Extracts the playlist ID from a URL's 'list' parameter, or returns None."""
+    match = re.search(r"[?&]list=([0-9A-Za-z_-]+)", url)
+    return match.group(1) if match else None
+
+
+def describe_streams(streams):
+    """Turns pytubefix Stream objects into plain, cacheable dicts."""
+    return [{"itag": s.itag,
+             "mime_type": s.mime_type,
+             "type": s.type,
+             "subtype": s.subtype,
+             "progressive": s.is_progressive,
+             "resolution": s.resolution if s.includes_video_track else None,
+             "fps": getattr(s, "fps", None) if s.includes_video_track else None,
+             "video_codec": s.video_codec,
+             "abr": s.abr if s.includes_audio_track else None,
+             "audio_codec": s.audio_codec,
+             "filesize": s.filesize or 0} for s in streams]
+
+
+def quality_number(label):
+    """Returns the leading number of a quality label such as '720p' or '128kbps' (0 if there is none)."""
+    match = re.match(r"\d+", label or "")
+    return int(match.group()) if match else 0
+
+
+def stream_options_for(download_type, streams, adaptive=False):
+    """
+    Builds the (itag, description) quality choices for a download type from stream
+    descriptors (see describe_streams), best quality first. With adaptive=True, video
+    resolutions that have no progressive stream (typically 1080p and up) are offered as
+    an adaptive video + audio pair whose itag is 'VIDEO+AUDIO' (see parse_selection).
+    """
+    if download_type == "audio":
+        audio = [s for s in streams if s["type"] == "audio" and s["subtype"] == "mp4" and s["abr"]]
+        audio.sort(key=lambda s: quality_number(s["abr"]), reverse=True)
+        return [(s["itag"], f"{s['abr']} - {s['filesize'] / (1024 * 1024):.2f} MB") for s in audio]
+    video = [s for s in streams if s["progressive"] and s["subtype"] == "mp4" and s["resolution"]]
+    video.sort(key=lambda s: quality_number(s["resolution"]), reverse=True)
+    if download_type == "playlist":
+        options = [(s["itag"], f"{s['resolution']} - {s['mime_type']}") for s in video]
+    else:
+        options = [(s["itag"], f"{s['resolution']} - {s['filesize'] / (1024 * 1024):.2f} MB") for s in video]
+    if adaptive:
+        options = sorted(options + adaptive_options_for(download_type, streams, {s["resolution"] for s in video}),
+                         key=lambda option: quality_number(option[1]), reverse=True)
+    return options
+
+
+def adaptive_options_for(download_type, streams, skip_resolutions=()):
+    """(VIDEO+AUDIO itag, description) choices pairing each adaptive MP4 video resolution with the best MP4 audio."""
+    audio = [s for s in streams if s["type"] == "audio" and not s["progressive"] and s["subtype"] == "mp4" and s["abr"]]
+    if not audio:
+        return []
+    best_audio = max(audio, key=lambda s: quality_number(s["abr"]))
+    best_video = {} # resolution -> stream; prefer higher frame rates, then H.264 for compatibility
+    for s in streams:
+        if s["type"] == "video" and not s["progressive"] and s["subtype"] == "mp4" and s["resolution"] \
+                and s["resolution"] not in skip_resolutions:
+            rank = (s["fps"] or 0, (s["video_codec"] or "").startswith("avc1"))
+            current = best_video.get(s["resolution"])
+            if current is None or rank > (current["fps"] or 0, (current["video_codec"] or "").startswith("avc1")):
+                best_video[s["resolution"]] = s
+    options = []
+    for s in best_video.values():
+        itag = f"{s['itag']}+{best_audio['itag']}"
+        if download_type == "playlist":
+            options.append((itag, f"{s['resolution']} - {s['mime_type']} + {best_audio['mime_type']}"))
+        else:
+            size = (s["filesize"] + best_audio["filesize"]) / (1024 * 1024)
+            options.append((itag, f"{s['resolution']} - {size:.2f} MB (video + audio, merged)"))
+    return options
+
+
+def parse_selection(itag):
+    """Splits a quality choice into (video_itag, audio_itag); audio_itag is None for a single stream."""
+    video_itag, _, audio_itag = str(itag).partition("+")
+    return int(video_itag), int(audio_itag) if audio_itag else None
+
+
+def select_quality(options, quality):
+    """
+    Returns the itag of the option in options (as built by stream_options_for) that matches
+    quality: an exact description, a label such as '720p' or '128kbps', or 'best'.
+    A label that isn't available falls back to the best option below it. None if nothing fits.
+    """
+    if not options:
+        return None
+    if not quality or quality == "best":
+        return options[0][0]
+    for itag, desc in options:
+        if desc == quality or desc.split(' ')[0] == quality or str(itag) == quality:
+            return itag
+    wanted = quality_number(quality)
+    for itag, desc in options: # Options are ordered best first
+        if quality_number(desc) <= wanted:
+            return itag
+    return None
@@ -0,0 +1,163 @@
+"""
+Bandwidth shaping: token buckets for a global cap shared by every running download,
+per-job caps, and a time-of-day schedule for the global cap.
+"""
+import re
+import threading
+import time
+import weakref
+from datetime import datetime
+
+from .control import DownloadCancelled
+
+# Longest single sleep (seconds) while throttled, so a cancelled download stops promptly.
+THROTTLE_SLICE = 0.2
+# Bytes a bucket may send in one go after being idle, in seconds' worth of its rate.
+BURST_SECONDS = 1.0
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_rate(text):
+    """
+    Parses a rate such as '20M', '512K', '1.5MB/s' or '300000' into bytes per second
+    (K/M/G are binary units, like the MB figures in the progress readout).
+    Returns None, meaning unlimited, for '', '0', 'off' and 'none'.
+    """
+    text = str(text).strip().upper().replace(" ", "")
+    if text in ("", "0", "OFF", "NONE", "UNLIMITED"):
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([KMG]?)(?:I?B)?(?:/S)?", text)
+    if not match:
+        raise ValueError(f"Invalid rate '{text}'; use e.g. 20M, 512K or 0 for unlimited.")
+    rate = float(match.group(1)) * _UNITS[match.group(2)]
+    return int(rate) or None
+
+
+def format_rate(rate):
+    return "unlimited" if not rate else f"{rate / (1024 * 1024):.2f} MB/s"
+
+
+class TokenBucket:
+    """
+    Token bucket that lets callers go into debt: reserve(n) always succeeds and returns
+    how long the caller must wait before sending n bytes. Concurrent callers queue up
+    behind each other, so the combined rate never exceeds the bucket's rate.
+    """
+    def __init__(self, rate=None):
+        self.rate = rate # Bytes per second; None means unlimited
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            if rate != self.rate:
+                self._refill()
+                self.rate = rate
+                self._tokens = min(self._tokens, 0.0) if rate else 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.rate * BURST_SECONDS, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, nbytes):
+        """Takes nbytes from the bucket and returns the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            if not self.rate:
+                return 0.0
+            self._tokens -= nbytes
+            return max(0.0, -self._tokens / self.rate)
+
+
+class BandwidthSchedule:
+    """
+    Time-of-day caps for the global rate, e.g. '09:00-18:00=20M' (20 MB/s during business
+    hours, the regular limit otherwise). Rules are separated by commas; a rule whose end is
+    before its start runs past midnight. The first matching rule wins.
+    """
+    def __init__(self, rules=()):
+        self.rules = list(rules) # [(start_minute, end_minute, rate)]
+
+    @classmethod
+    def parse(cls, text):
+        rules = []
+        for part in filter(None, (part.strip() for part in (text or "").split(","))):
+            match = re.fullmatch(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)", part)
+            if not match:
+                raise ValueError(f"Invalid schedule rule '{part}'; use e.g. 09:00-18:00=20M.")
+            start_h, start_m, end_h, end_m = (int(group) for group in match.groups()[:4])
+            if start_h > 24 or end_h > 24 or start_m > 59 or end_m > 59:
+                raise ValueError(f"Invalid time in schedule rule '{part}'.")
+            rules.append((start_h * 60 + start_m, end_h * 60 + end_m, parse_rate(match.group(5))))
+        return cls(rules)
+
+    def __str__(self):
+        return ",".join(f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}="
+                        f"{(rate or 0) / (1024 * 1024):g}M" for start, end, rate in self.rules)
+
+    def rate_at(self, when, default=None):
+        """Returns the rate of the first rule covering when (a datetime), else default."""
+        minute = when.hour * 60 + when.minute
+        for start, end, rate in self.rules:
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return default
+
+
+class BandwidthLimiter:
+    """
+    Caps the download rate of all jobs together (rate, adjusted by schedule) and of each
+    job on its own (job_rate). Both can be changed at any time with set_rate()/
+    set_job_rate()/set_schedule(); running downloads pick the new values up immediately.
+    """
+    def __init__(self, rate=None, job_rate=None, schedule=None):
+        self.rate = rate
+        self.job_rate = job_rate
+        self.schedule = schedule or BandwidthSchedule()
+        self._global = TokenBucket(self.current_rate())
+        self._job_buckets = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def current_rate(self):
+        """The global cap in effect right now, taking the schedule into account."""
+        return self.schedule.rate_at(datetime.now(), self.rate)
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self._global.set_rate(self.current_rate())
+
+    def set_job_rate(self, job_rate):
+        self.job_rate = job_rate
+        with self._lock:
+            buckets = list(self._job_buckets)
+        for bucket in buckets:
+            bucket.set_rate(job_rate)
+
+    def set_schedule(self, schedule):
+        self.schedule = schedule or BandwidthSchedule()
+        self._global.set_rate(self.current_rate())
+
+    def for_job(self, control=None):
+        """
+        Returns throttle(nbytes) for one job: it blocks until nbytes may be used under both
+        the global and the job's cap. Raises DownloadCancelled if control is cancelled
+        while waiting. All downloads of the job (e.g. video and audio parts) share it.
+        """
+        bucket = TokenBucket(self.job_rate)
+        with self._lock:
+            self._job_buckets.add(bucket)
+
+        def throttle(nbytes):
+            if self.schedule.rules:
+                self._global.set_rate(self.current_rate())
+            delay = max(self._global.reserve(nbytes), bucket.reserve(nbytes))
+            deadline = time.monotonic() + delay
+            while (remaining := deadline - time.monotonic()) > 0:
+                if control is not None and control.cancelled:
+                    raise DownloadCancelled("Download cancelled.")
+                time.sleep(min(remaining, THROTTLE_SLICE))
+        return throttle
@@ -0,0 +1,234 @@
+"""
+Disk writer stage for downloads: network threads hand their chunks to a dedicated writer
+thread through a bounded queue, so a slow disk (e.g. NFS) and a slow connection don't
+hold each other up. Contiguous chunks are coalesced into large, aligned writes.
+"""
+import os
+import queue
+import threading
+import time
+
+# Chunks waiting to be written may use at most WRITE_QUEUE_BYTES; past that, downloads
+# block (backpressure) until the disk catches up.
+WRITE_QUEUE_BYTES = 16 * 1024 * 1024
+# Contiguous chunks are gathered until WRITE_BLOCK_SIZE bytes, then written with a single
+# pwritev (no copying them together) ending on a WRITE_ALIGNMENT boundary. Anything still
+# buffered is written once no chunk has arrived for WRITE_IDLE_FLUSH seconds.
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+WRITE_ALIGNMENT = 1024 * 1024
+WRITE_IDLE_FLUSH = 1.0
+# When to fsync: 'off' leaves it to the OS; 'end' syncs a finished file before it is moved
+# into place; 'checkpoint' also syncs every FSYNC_INTERVAL seconds and only then records
+# the synced ranges as done, so a resume manifest never claims bytes a power loss could lose.
+FSYNC_POLICIES = ("off", "end", "checkpoint")
+FSYNC_INTERVAL = 2
+
+
+def preallocate(fd, size):
+    """Reserves size bytes for fd (posix_fallocate where available, else a sparse truncate)."""
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass # Not supported by this filesystem
+    os.ftruncate(fd, size)
+
+
+class FileWriter:
+    """
+    Writes chunks at given offsets of an open file on its own thread.
+    write(offset, data) queues a chunk, blocking while WRITE_QUEUE_BYTES are already
+    waiting; on_written(offset, length) is called from the writer thread once bytes are on
+    disk (and, with fsync 'checkpoint', synced). flush() waits until everything queued so
+    far is written; close() also stops the thread. An error on the writer thread (disk
+    full, ...) is raised by the next write(), flush() or close(). With hasher (e.g. an
+    integrity.BlockHasher), hasher.update(offset, chunks) sees every write as it is made.
+    """
+    def __init__(self, fd, on_written=None, fsync="off", block_size=WRITE_BLOCK_SIZE,
+                 queue_bytes=WRITE_QUEUE_BYTES, metrics=None, hasher=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}'; use one of {', '.join(FSYNC_POLICIES)}.")
+        self.fd = fd
+        self.on_written = on_written
+        self.fsync = fsync
+        self.block_size = block_size
+        self.queue_bytes = queue_bytes
+        self.metrics = metrics
+        self.hasher = hasher
+        self.error = None
+        self._queued_bytes = 0
+        self._space = threading.Condition() # Notified whenever queued bytes have been taken off the queue
+        self._queue = queue.Queue()
+        self._runs = {} # End offset -> (start offset, [chunks], size) of contiguous buffered data
+        self._unsynced = [] # (offset, length) written but not yet reported, with fsync 'checkpoint'
+        self._synced_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, offset, data):
+        with self._space:
+            if self._queued_bytes and self._queued_bytes + len(data) > self.queue_bytes:
+                started = time.perf_counter()
+                while self._queued_bytes and self._queued_bytes + len(data) > self.queue_bytes and self.error is None:
+                    self._space.wait()
+                if self.metrics is not None:
+                    self.metrics.inc("write_stalls_total")
+                    self.metrics.observe("write_backpressure", time.perf_counter() - started)
+            self._raise_error()
+            self._queued_bytes += len(data)
+        self._queue.put((offset, data))
+
+    def flush(self):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._raise_error()
+
+    def close(self, sync=False):
+        """Writes everything still queued (fsyncing if sync or the policy asks for it) and stops the thread."""
+        done = threading.Event()
+        self._queue.put(("close", sync, done))
+        done.wait()
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=WRITE_IDLE_FLUSH)
+            except queue.Empty:
+                self._guard(self._write_all)
+                continue
+            if isinstance(item, threading.Event):
+                self._guard(self._write_all)
+                item.set()
+            elif item[0] == "close":
+                _, sync, done = item
+                self._guard(self._write_all)
+                if sync or self.fsync != "off":
+                    self._guard(self._sync)
+                done.set()
+                return
+            else:
+                offset, data = item
+                self._guard(self._add, offset, data)
+                with self._space:
+                    self._queued_bytes -= len(data)
+                    self._space.notify_all()
+
+    def _guard(self, func, *args):
+        """Runs func unless an earlier write failed; remembers the first error (and drops data after it)."""
+        if self.error is not None:
+            self._runs.clear()
+            return
+        try:
+            func(*args)
+        except Exception as e:
+            self.error = e
+            self._runs.clear()
+
+    def _add(self, offset, data):
+        start, chunks, size = self._runs.pop(offset, None) or (offset, [], 0)
+        chunks.append(data)
+        size += len(data)
+        # Write the part of the run that ends on an alignment boundary once it is big enough
+        aligned = (start + size) // WRITE_ALIGNMENT * WRITE_ALIGNMENT - start
+        if aligned >= self.block_size:
+            head, chunks = split_chunks(chunks, aligned)
+            self._write_at(start, head, aligned)
+            start, size = start + aligned, size - aligned
+        if size:
+            self._runs[start + size] = (start, chunks, size)
+
+    def _write_all(self):
+        runs, self._runs = self._runs, {}
+        for start, chunks, size in sorted(runs.values(), key=lambda run: run[0]):
+            self._write_at(start, chunks, size)
+        if self.fsync == "checkpoint" and self._unsynced:
+            self._sync()
+
+    def _write_at(self, offset, chunks, size):
+        started = time.perf_counter()
+        write_at(self.fd, chunks, offset)
+        if self.metrics is not None:
+            self.metrics.observe("disk_write", time.perf_counter() - started)
+        if self.hasher is not None:
+            self.hasher.update(offset, chunks)
+        if self.fsync == "checkpoint":
+            self._unsynced.append((offset, size))
+            if time.monotonic() - self._synced_at >= FSYNC_INTERVAL:
+                self._sync()
+        elif self.on_written:
+            self.on_written(offset, size)
+
+    def _sync(self):
+        started = time.perf_counter()
+        os.fsync(self.fd)
+        self._synced_at = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.observe("fsync", time.perf_counter() - started)
+        unsynced, self._unsynced = self._unsynced, []
+        if self.on_written:
+            for offset, length in unsynced:
+                self.on_written(offset, length)
+
+
+def split_chunks(chunks, length):
+    """Splits a list of bytes-like chunks after length bytes. Returns (head, tail) without copying."""
+    head = []
+    for index, chunk in enumerate(chunks):
+        if length < len(chunk):
+            view = memoryview(chunk)
+            return head + [view[:length]] if length else head, [view[length:]] + chunks[index + 1:]
+        head.append(chunk)
+        length -= len(chunk)
+    return head, []
+
+
+def write_at(fd, chunks, offset):
+    """Writes chunks back to back at offset of fd without moving a shared file position."""
+    if hasattr(os, "pwritev"):
+        chunks = [memoryview(chunk) for chunk in chunks]
+        while chunks:
+            written = os.pwritev(fd, chunks, offset)
+            offset += written
+            while chunks and written >= len(chunks[0]):
+                written -= len(chunks.pop(0))
+            if written:
+                chunks[0] = chunks[0][written:]
+    elif hasattr(os, "pwrite"):
+        data = memoryview(b"".join(chunks))
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+    else: # Windows has no pwrite; serialize seek + write instead
+        data = b"".join(chunks)
+        with _write_at_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+
+
+def read_at(fd, length, offset):
+    """Reads length bytes at offset of fd (fewer at the end of the file) without moving a shared file position."""
+    data = b""
+    while len(data) < length:
+        if hasattr(os, "pread"):
+            chunk = os.pread(fd, length - len(data), offset + len(data))
+        else:
+            with _write_at_lock:
+                os.lseek(fd, offset + len(data), os.SEEK_SET)
+                chunk = os.read(fd, length - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+_write_at_lock = threading.Lock()